@@ -1,8 +1,17 @@
-from json.TYINGART.web.metadata import metadata_generator, metatadata_handler, load_metadata, save_metadata, metadata_merger, metadata_sorted
-from utils.file import file_traceover
+import argparse
+import os
+import sys
+from typing import Optional
 
-def inspect(directory: str, output_file: str, file_type: str):
-    
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils"))
+
+from metadata import metadata_generator, metatadata_handler, save_metadata, metadata_sorted
+from file import file_traceover
+
+def inspect(directory: str, output_file: Optional[str], file_type: str) -> dict:
+    """
+    扫描目录生成 catalog；output_file 为 None 时只返回，不写文件。
+    """
     entry_list = file_traceover(directory, filter_option=file_type)
 
     print(f"Search completed! Found {len(entry_list)} {file_type} files.")
@@ -23,8 +32,38 @@ def inspect(directory: str, output_file: str, file_type: str):
         elif file_type == "video":
             metadata_dict[entry_metadata["title"]] = entry_metadata
     
-    save_metadata(metadata_sorted(metadata_dict), output_file)
-    print(f"Metadata saved to {output_file}.")
+    metadata_dict = metadata_sorted(metadata_dict)
+    if output_file is not None:
+        save_metadata(metadata_dict, output_file)
+        print(f"Metadata saved to {output_file}.")
+    return metadata_dict
+
+def ingest(argv=None):
+    """
+    一条命令完成 scan → enrich → validate → link，各阶段按输入缓存，重复运行只重算有变化的部分。
+
+    python act.py ingest /mnt/nas/Dancer/耿爽爽/ --type video --catalog gss_video_metadata.json \
+        --spider-catalog TYINGART_VID_LATEST.json --probe --link-root /mnt/nas/jellyfin_links/videos
+    """
+    from ingest import run_ingest
+    from profiling import add_profile_arguments, session_from_args
+
+    parser = argparse.ArgumentParser(prog="act.py ingest", description="Scan, enrich, validate and link a media directory")
+    parser.add_argument("directory")
+    parser.add_argument("--type", dest="file_type", choices=["video", "album"], default="video")
+    parser.add_argument("--catalog", required=True, help="Catalog JSON to update")
+    parser.add_argument("--cache", help="Stage cache directory (default: <catalog>.ingest)")
+    parser.add_argument("--spider-catalog", help="Crawled catalog to merge into scanned entries")
+    parser.add_argument("--probe", action="store_true", help="Fill video runtimes with ffprobe")
+    parser.add_argument("--link-root", help="Generate Jellyfin links under this root")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="Ignore cached stage outputs")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    with session_from_args(args):
+        run_ingest(args.directory, args.file_type, args.catalog, cache_dir=args.cache,
+                   spider_catalog=args.spider_catalog, probe=args.probe, link_root=args.link_root,
+                   workers=args.workers, force=args.force)
 
 """
 standard workflow for future
@@ -37,28 +76,31 @@ standard workflow for future
 
 if __name__ == "__main__":
 
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        ingest(sys.argv[2:])
+        sys.exit(0)
+
     from pathlib import Path
-    inspect(directory="/mnt/nas/Dancer/耿爽爽/",
-            output_file="gss_video_metadata.json",
-            file_type="video")
-
-    data = load_metadata("gss_video_metadata.json")
-
-    i = 235
-    for k, v in data.items():
-        poster_path = v["path"][:-4]+".Cover.jpg"
-        if Path(poster_path).is_file():
-            data[k]["poster"] = poster_path
-        data[k]["model"] = ["耿爽爽"]
-        data[k]["description"] = v["title"]
-        data[k]["series"] = "耿爽爽"
-        data[k]["studio"] = ["Bilibili"]
-        data[k]["code"] = f"BB-{i:03d}"
-        i += 1
-    save_metadata(metadata_sorted(data), "gss_video_metadata.json")
-
-    new = {}
-    for k, v in data.items():
-        new[v["code"]] = v
-
-    save_metadata(metadata_sorted(new), "gss_video_metadata.json")
+    from sidecar import SidecarResolver
+    from transform import KEEP, Sequence, Transform
+
+    scanned = inspect(directory="/mnt/nas/Dancer/耿爽爽/",
+                      output_file=None,
+                      file_type="video")
+
+    sidecars = SidecarResolver(rules={"cover": ["{stem}.Cover.jpg"]})
+
+    def cover(key, entry):
+        poster_path = sidecars.find(Path(entry["path"]), "cover")
+        return str(poster_path) if poster_path else KEEP
+
+    # step 2: curate fields, assign codes and key the catalog by code; the scanned catalog is written once
+    Transform() \
+        .set("poster", cover) \
+        .set("model", ["耿爽爽"]) \
+        .set("description", lambda key, entry: entry["title"]) \
+        .set("series", "耿爽爽") \
+        .set("studio", ["Bilibili"]) \
+        .allocate("code", Sequence("BB-", width=3, start=235)) \
+        .rekey("code") \
+        .run("gss_video_metadata.json", catalog=scanned)
@@ -0,0 +1,80 @@
+"""
+NFO rendering throughput benchmark.
+
+Renders synthetic movie, photoalbum and person entries (including values
+that need XML escaping) and reports entries/sec and MB/sec per schema.
+With --write, the documents are also written through the artifact manifest
+into a temporary directory.
+
+Usage:
+    python scripts/bench_nfo.py
+    python scripts/bench_nfo.py --entries 100000 --write
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+from manifest import ArtifactManifest
+from nfo import movie_nfo, person_nfo, photoalbum_nfo
+
+WORDS = ["Tom", "&", "Jerry", "<b>", "夏", "日", "studio", "R&B", "1 > 0", "plain", "text", "album"]
+
+def words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def synthetic_entries(kind: str, n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        if kind == "person":
+            entries.append({"name": f"Model {i}", "age": rng.randint(18, 40), "studio": [words(rng, 2)],
+                            "real_name": [words(rng, 2)], "SNS": [f"https://example.com/{i}?a=1&b=2"],
+                            "figure": words(rng, 3), "description": words(rng, 30), "look_score": rng.randint(1, 10)})
+        else:
+            entries.append({"code": f"ABC-{i:05d}", "title": words(rng, 6), "description": words(rng, 40),
+                            "model": [words(rng, 2) for _ in range(rng.randint(1, 3))],
+                            "keywords": [words(rng, 1) for _ in range(rng.randint(2, 8))],
+                            "studio": words(rng, 2), "dateadded": "2024-01-01", "thumb": "poster.jpg"})
+    return entries
+
+RENDERERS = {
+    "movie": lambda e: movie_nfo(e),
+    "photoalbum": lambda e: photoalbum_nfo(e, thumb=True),
+    "person": lambda e: person_nfo(e, image=True),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--kinds", nargs="+", default=sorted(RENDERERS), choices=sorted(RENDERERS))
+    parser.add_argument("--write", action="store_true", help="Also write every document through the manifest")
+    args = parser.parse_args()
+
+    print(f"{'schema':>10} {'entries':>8} {'seconds':>8} {'entries/s':>10} {'MB/s':>7}" + (f" {'write s':>8}" if args.write else ""))
+    for kind in args.kinds:
+        entries = synthetic_entries("person" if kind == "person" else "movie", args.entries)
+        render = RENDERERS[kind]
+        start = time.perf_counter()
+        documents = [render(e) for e in entries]
+        elapsed = time.perf_counter() - start
+        size = sum(len(d.encode("utf-8")) for d in documents)
+        line = f"{kind:>10} {len(documents):>8} {elapsed:>8.2f} {len(documents) / elapsed:>10.0f} {size / elapsed / 1e6:>7.1f}"
+        if args.write:
+            with tempfile.TemporaryDirectory() as tmp:
+                manifest = ArtifactManifest(Path(tmp))
+                start = time.perf_counter()
+                for i, document in enumerate(documents):
+                    manifest.write_text(Path(tmp) / f"{i}.nfo", document)
+                manifest.save()
+                line += f" {time.perf_counter() - start:>8.2f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
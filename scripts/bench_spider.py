@@ -0,0 +1,71 @@
+"""
+Offline throughput benchmark for tyingart-style crawls.
+
+Serves a recorded (or synthetic) corpus from a local replay server and runs
+workflow_spider_tyingart against it at several fetch concurrency levels,
+reporting pages/sec and entries/sec.
+
+Usage:
+    python scripts/bench_spider.py
+    python scripts/bench_spider.py --corpus corpus/tyingart --category video --pages 35
+    python scripts/bench_spider.py --latency 0.05 --error-rate 0.02 --workers 1 4 16
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+import spider
+from ratelimit import RateLimiter
+from replay import Corpus, ReplayServer, synthetic_tyingart_corpus
+
+def crawl(website: str, category: str, keywords: list, max_page: int, etype: str, workers: int, output_file: str) -> tuple:
+    """Run the streaming tyingart workflow with `workers` fetch threads. Returns (pages, entries)."""
+    stats = spider.workflow_spider_tyingart(website=website, category=category, max_page=max_page,
+                                            keywords=keywords, etype=etype, output_file=output_file,
+                                            listing_workers=min(workers, 4), fetch_workers=workers)
+    entries = stats["write"]["processed"]
+    return stats["discover"]["processed"] + stats["fetch"]["processed"], entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Recorded corpus directory (default: generate a synthetic one)")
+    parser.add_argument("--category", default="video")
+    parser.add_argument("--etype", default="video", choices=sorted(spider.PARSERS))
+    parser.add_argument("--pages", type=int, default=5, help="Listing pages to crawl")
+    parser.add_argument("--entries-per-page", type=int, default=20, help="Synthetic corpus only")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            corpus = Corpus(args.corpus)
+        else:
+            corpus = synthetic_tyingart_corpus(tmp, args.category, args.pages, args.entries_per_page)
+        keywords = [f"/{args.category}/", f"/{args.category}"]
+
+        print(f"{'workers':>8} {'pages':>7} {'entries':>8} {'seconds':>8} {'pages/s':>8} {'entries/s':>9}")
+        for workers in args.workers:
+            with ReplayServer(corpus, latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, retry_after=0, seed=0) as server:
+                # Let the limiter run at the concurrency under test; the replay server is the bottleneck
+                spider.default_limiter = RateLimiter(rate=1e6, burst=workers, concurrency=workers, max_concurrency=workers)
+                spider.default_session = spider.make_session(pool_size=workers)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    pages, entries = crawl(server.url, args.category, keywords, args.pages, args.etype, workers,
+                                           os.path.join(tmp, f"bench_{workers}.json"))
+                elapsed = time.perf_counter() - start
+            print(f"{workers:>8} {pages:>7} {entries:>8} {elapsed:>8.2f} {pages / elapsed:>8.1f} {entries / elapsed:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Local stand-in for the Jellyfin endpoints used by utils/jellyfin.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class StubJellyfin:
+    """
+    Local stand-in for the Jellyfin endpoints used here, recording every
+    submitted update and item refresh.
+
+    Example:
+        with StubJellyfin(api_key="k") as stub:
+            client = JellyfinClient(stub.url, "k")
+            client.media_updated({"/media/a": "Modified"})
+            stub.updates  # [{"Path": "/media/a", "UpdateType": "Modified"}]
+
+    Args:
+        api_key (str): Expected API key; other keys get 401.
+        fail (int): Number of initial requests answered with 500.
+        port (int): Port to bind, 0 for any free port.
+        persons (dict, optional): Person name -> item id known to the server.
+    """
+
+    def __init__(self, api_key: str = "test", fail: int = 0, port: int = 0, persons: Optional[dict] = None):
+        self.api_key = api_key
+        self.fail = fail
+        self.persons = persons or {}
+        self.requests = 0
+        self.updates = []
+        self.refreshes = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _check(self) -> bool:
+                with server.lock:
+                    server.requests += 1
+                    failing = server.requests <= server.fail
+                if self.headers.get("X-Emby-Token") != server.api_key:
+                    self.send_error(401)
+                    return False
+                if failing:
+                    self.send_error(500)
+                    return False
+                return True
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if not path.startswith("/Persons/"):
+                    self.send_error(404)
+                    return
+                if not self._check():
+                    return
+                item_id = server.persons.get(unquote(path[len("/Persons/"):]))
+                if item_id is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps({"Id": item_id, "Type": "Person"}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                refresh = len(parts) == 3 and parts[0] == "Items" and parts[2] == "Refresh"
+                if url.path != "/Library/Media/Updated" and not refresh:
+                    self.send_error(404)
+                    return
+                if not self._check():
+                    return
+                with server.lock:
+                    if refresh:
+                        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                        server.refreshes.append({"Id": parts[1], **query})
+                    else:
+                        server.updates.extend(json.loads(body).get("Updates", []))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubJellyfin":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+from catalog import ShardedCatalog
+from metadata import load_metadata, save_metadata
+
+
+def test_int_keys_are_stored_as_strings(tmp_path):
+    # spider.CatalogWriter numbers non-incremental crawls with int keys
+    shard_dir = tmp_path / "catalog.shards"
+    ShardedCatalog.from_dict(shard_dir, {})
+    save_metadata({1: {"title": "a", "studio": "X"}, 2: {"title": "b", "studio": "Y"}}, str(shard_dir))
+
+    catalog = load_metadata(str(shard_dir))
+    assert isinstance(catalog, ShardedCatalog)
+    assert "1" in catalog and 1 in catalog
+    assert catalog["2"]["title"] == "b"
+    assert sorted(catalog) == ["1", "2"]
+    assert all(isinstance(info["min_key"], str) for info in catalog.manifest["shards"].values())
+
+    catalog[3] = {"title": "c", "studio": "X"}
+    catalog.save()
+    assert ShardedCatalog(shard_dir).to_dict() == {
+        "1": {"title": "a", "studio": "X"},
+        "2": {"title": "b", "studio": "Y"},
+        "3": {"title": "c", "studio": "X"},
+    }
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+from ingest import run_ingest
+
+
+def make_videos(root, names):
+    series = root / "media" / "Studio" / "Series"
+    series.mkdir(parents=True)
+    for name in names:
+        (series / f"{name}.mp4").write_bytes(b"\0")
+    return root / "media"
+
+
+def test_rerun_on_code_keyed_catalog(tmp_path):
+    media = make_videos(tmp_path, ["vid1", "vid2"])
+    catalog_file = tmp_path / "catalog.json"
+
+    run_ingest(str(media), "video", str(catalog_file))
+    catalog = json.loads(catalog_file.read_text(encoding="utf-8"))
+    assert sorted(catalog) == ["vid1", "vid2"]
+
+    # What act.py's Transform().allocate("code", ...).rekey("code") leaves behind
+    rekeyed = {}
+    for i, key in enumerate(sorted(catalog), 1):
+        entry = dict(catalog[key], code=f"BB-{i:03d}", description="curated")
+        rekeyed[entry["code"]] = entry
+    catalog_file.write_text(json.dumps(rekeyed, ensure_ascii=False), encoding="utf-8")
+
+    link_root = tmp_path / "links"
+    stats = run_ingest(str(media), "video", str(catalog_file), link_root=str(link_root))
+    catalog = json.loads(catalog_file.read_text(encoding="utf-8"))
+    assert sorted(catalog) == ["BB-001", "BB-002"]
+    assert catalog["BB-001"]["description"] == "curated"
+    assert stats["invalid"] == 0
+    assert stats["link"]["linked"] == 2
+    assert sorted(name for name in os.listdir(link_root) if not name.startswith(".")) == \
+        ["BB-001 - vid1", "BB-002 - vid2"]
+
+    # Nothing changed: no duplicates, nothing relinked
+    stats = run_ingest(str(media), "video", str(catalog_file), link_root=str(link_root))
+    assert sorted(json.loads(catalog_file.read_text(encoding="utf-8"))) == ["BB-001", "BB-002"]
+    assert stats["link"]["linked"] == 0
+
+
+def test_new_video_in_code_keyed_catalog_uses_crawled_code(tmp_path):
+    media = make_videos(tmp_path, ["vid1", "vid2"])
+    path = str(media / "Studio" / "Series" / "vid1.mp4")
+    catalog_file = tmp_path / "catalog.json"
+    catalog_file.write_text(json.dumps({"BB-001": {"title": "vid1", "code": "BB-001", "path": path}}),
+                            encoding="utf-8")
+    spider_file = tmp_path / "spider.json"
+    spider_file.write_text(json.dumps({"1": {"title": "vid2", "code": "BB-002"}}), encoding="utf-8")
+
+    run_ingest(str(media), "video", str(catalog_file), spider_catalog=str(spider_file))
+    catalog = json.loads(catalog_file.read_text(encoding="utf-8"))
+    assert sorted(catalog) == ["BB-001", "BB-002"]
+    assert catalog["BB-002"]["title"] == "vid2"
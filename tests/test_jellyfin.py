@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+from changes import ChangeSet
+from jellyfin import PERSON_REFRESH, JellyfinClient, refresh_changes, refresh_people
+from jellyfin_stub import StubJellyfin
+from people_sync import PEOPLE_CHANGES_NAME, sync_people
+
+
+def test_media_updated_maps_paths_and_batches():
+    with StubJellyfin(api_key="k") as stub:
+        client = JellyfinClient(stub.url, "k", path_map={"/mnt/nas/": "/media/"}, batch_size=2)
+        accepted = client.media_updated({"/mnt/nas/links/a": "Created", "/mnt/nas/links/b": "Modified",
+                                         "/other/c": "Deleted"})
+        client.close()
+    assert accepted == ["/mnt/nas/links/a", "/mnt/nas/links/b", "/other/c"]
+    assert stub.requests == 2
+    assert stub.updates == [{"Path": "/media/links/a", "UpdateType": "Created"},
+                            {"Path": "/media/links/b", "UpdateType": "Modified"},
+                            {"Path": "/other/c", "UpdateType": "Deleted"}]
+
+
+def test_wrong_api_key_is_rejected():
+    with StubJellyfin(api_key="k") as stub:
+        client = JellyfinClient(stub.url, "wrong")
+        with pytest.raises(Exception):
+            client.media_updated({"/a": "Modified"})
+        client.close()
+    assert stub.updates == []
+
+
+def test_refresh_changes_clears_only_accepted_paths(tmp_path):
+    root = tmp_path / "videos"
+    change_set = ChangeSet(root)
+    change_set.created(root / "A-1 - a")
+    change_set.touched(root / "A-2 - b")
+    change_set.save()
+
+    with StubJellyfin(api_key="k", fail=1) as stub:
+        client = JellyfinClient(stub.url, "k")
+        # First request fails: nothing is cleared, the changes stay pending for the next run
+        report = refresh_changes(str(root), client)
+        assert report["error"] and report["submitted"] == 0
+        assert len(ChangeSet(root).pending()) == 2
+
+        report = refresh_changes(str(root), client)
+        client.close()
+    assert report == {"pending": 2, "submitted": 2, "error": None}
+    assert sorted(u["UpdateType"] for u in stub.updates) == ["Created", "Modified"]
+    assert ChangeSet(root).pending() == {}
+
+
+def test_people_sync_refreshes_people_by_item(tmp_path):
+    models = tmp_path / "models"
+    for name in ("Alice", "Émile"):
+        (models / name).mkdir(parents=True)
+        (models / name / "poster.jpg").write_bytes(b"\xff\xd8\xff")
+        (models / name / f"{name}.nfo").write_text("<person/>", encoding="utf-8")
+    people = tmp_path / "metadata" / "People"
+
+    sync_people(str(models), str(people), workers=2)
+    # The change set stays with the tool's output, not in Jellyfin's metadata directory
+    assert (models / PEOPLE_CHANGES_NAME).exists()
+    assert not any(name.startswith(".") for name in os.listdir(people))
+
+    with StubJellyfin(api_key="k", persons={"Alice": "a1"}) as stub:
+        client = JellyfinClient(stub.url, "k")
+        report = refresh_people(str(models), client)
+        client.close()
+    assert report == {"pending": 2, "refreshed": 1, "unknown": 1, "error": None}
+    assert stub.refreshes == [{"Id": "a1", **PERSON_REFRESH}]
+    # People metadata directories are not submitted as library paths
+    assert stub.updates == []
+    with StubJellyfin(api_key="k") as stub:
+        client = JellyfinClient(stub.url, "k")
+        assert refresh_people(str(models), client)["pending"] == 0
+        client.close()
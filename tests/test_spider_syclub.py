@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+import browser
+import spider
+from replay import Corpus, ReplayServer, synthetic_syclub_corpus
+
+
+def test_parse_page_from_corpus(tmp_path):
+    corpus = synthetic_syclub_corpus(str(tmp_path), "http://syclub.test", pages=1, posts_per_page=2, js_every=2)
+    _, _, body = corpus.lookup("/2024/post-1.html")
+    assert spider.syclub_parse_page(body.decode("utf-8")) == \
+        ("作品 1 & 花絮 – SYCLUB", "https://cdn.example.com/v/1.mp4")
+
+    _, _, body = corpus.lookup("/2024/post-2.html")
+    assert spider.syclub_parse_page(body.decode("utf-8")) == ("作品 2 & 花絮 – SYCLUB", None)
+
+
+class RenderingPool:
+    """Stand-in for DriverPool: 'renders' a post by adding the player config."""
+
+    rendered = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @contextmanager
+    def driver(self):
+        class Driver:
+            def get(self, url):
+                RenderingPool.rendered.append(url)
+                number = url.rsplit("-", 1)[-1].split(".")[0]
+                self.page_source = (f"<title>作品 {number}</title><script>video_data = "
+                                    f'[{{"src": "https://cdn.example.com/js/{number}.mp4"}}];</script>')
+        yield Driver()
+
+    def close(self):
+        pass
+
+
+def test_workflow_against_replay_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser, "DriverPool", RenderingPool)
+    server = ReplayServer(Corpus(str(tmp_path / "corpus")), require_cookie="wordpress_logged_in_test")
+    server.corpus = synthetic_syclub_corpus(str(tmp_path / "corpus"), server.url, pages=2, posts_per_page=3,
+                                            js_every=3)
+    metadata_file = tmp_path / "videos.json"
+    with server:
+        spider.workflow_spider_syclub(
+            page_url=server.url + "/category/uncategorized/page/{p}",
+            page_start=1,
+            page_end=3,
+            page_list_file=str(tmp_path / "pages.txt"),
+            connection_failed_file=str(tmp_path / "connection_failures.txt"),
+            failed_pages_file=str(tmp_path / "failed_pages.txt"),
+            metadata_file=str(metadata_file),
+            name="wordpress_logged_in_test",
+            value="token",
+            site=server.url,
+        )
+
+    record = json.loads(metadata_file.read_text(encoding="utf-8"))
+    assert len(record) == 6
+    assert record["作品 1 & 花絮 – SYCLUB"] == "https://cdn.example.com/v/1.mp4"
+    # Only the JavaScript-only posts went through the browser pool
+    assert sorted(RenderingPool.rendered) == [server.url + "/2024/post-3.html", server.url + "/2024/post-6.html"]
+    assert record["作品 3"] == "https://cdn.example.com/js/3.mp4"
+    assert (tmp_path / "connection_failures.txt").read_text() == ""
@@ -0,0 +1,114 @@
+"""
+This module provides a pool of reusable headless Chrome drivers
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlparse
+
+# Placed in the idle queue when a broken driver is discarded: its slot may start a new one
+_FREE_SLOT = object()
+
+class DriverPool:
+    """
+    Pool of headless Chrome WebDriver instances.
+
+    Drivers are started lazily, up to `size`, and reused across pages, so the
+    browser start-up and login cost is paid once per driver instead of once
+    per crawl. Selenium is only imported when the first driver is needed.
+    A driver whose job raised (crashed session, dead chromedriver) is quit
+    and replaced instead of being handed to the next job.
+
+    Args:
+        size (int): Maximum number of concurrent drivers.
+        cookie_url (str, optional): Same-site page visited before adding cookies.
+        cookies (list, optional): Cookie dicts passed to `driver.add_cookie`.
+    """
+
+    def __init__(self, size: int = 2, cookie_url: Optional[str] = None, cookies: Optional[list] = None):
+        self.size = size
+        self.cookie_url = cookie_url
+        self.cookies = cookies or []
+        self.idle = queue.LifoQueue()
+        self.drivers = []
+        self.slots = 0
+        self.lock = threading.Lock()
+
+    def _start(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        driver = webdriver.Chrome(options=options)
+
+        # 设置登录用 Cookie（注意：必须先访问一个同域页面）
+        if self.cookie_url and self.cookies:
+            driver.get(self.cookie_url)
+            domain = urlparse(self.cookie_url).hostname
+            for cookie in self.cookies:
+                driver.add_cookie({"domain": domain, **cookie})
+        return driver
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver, starting a new one if none is idle and the pool is not full."""
+        try:
+            driver = self.idle.get_nowait()
+        except queue.Empty:
+            driver = None
+            with self.lock:
+                if self.slots < self.size:
+                    driver = self._start()
+                    self.drivers.append(driver)
+                    self.slots += 1
+            if driver is None:
+                driver = self.idle.get()
+        if driver is _FREE_SLOT:
+            try:
+                driver = self._start()
+            except Exception:
+                self.idle.put(_FREE_SLOT)
+                raise
+            with self.lock:
+                self.drivers.append(driver)
+        ok = False
+        try:
+            yield driver
+            ok = True
+        finally:
+            if ok:
+                self.idle.put(driver)
+            else:
+                self._discard(driver)
+
+    def _discard(self, driver) -> None:
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"⚠️ Failed to quit driver: {e}")
+        self.idle.put(_FREE_SLOT)
+
+    def close(self) -> None:
+        """Quit every driver started by the pool."""
+        with self.lock:
+            for driver in self.drivers:
+                try:
+                    driver.quit()
+                except Exception as e:
+                    print(f"⚠️ Failed to quit driver: {e}")
+            self.drivers = []
+            self.slots = 0
+        self.idle = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
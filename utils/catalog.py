@@ -0,0 +1,334 @@
+"""
+This module provides a sharded on-disk catalog with a lazily loaded dict view
+
+Layout:
+/<name>.shards
+    manifest.json           {"version", "shard_by", "shards": {"<shard>": {"file", "count", "sha1",
+                                                                       "min_key", "max_key"}}}
+    keys.json               {"<shard>": [keys]}, read only when key ranges overlap
+    /shards
+        <shard>.json        one studio (or series, ...) worth of entries, same format as a catalog
+
+Only the small manifest is read when a catalog is opened; shards are read on
+first access and only the shards whose content changed are written back.
+keys.json is rewritten only when keys are added, removed or moved.
+`metadata.load_metadata` / `save_metadata` accept a shard directory, so code
+written for whole-catalog dicts keeps working.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+from profiling import add_profile_arguments, count, profiled, session_from_args
+
+MANIFEST_NAME = "manifest.json"
+KEYS_NAME = "keys.json"
+SHARDS_DIR = "shards"
+DEFAULT_SHARD = "_"
+
+_UNSAFE = re.compile(r'[\\/:*?"<>|\s]+')
+
+def is_sharded(path: Union[str, Path]) -> bool:
+    """Whether `path` is a shard directory."""
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+def shard_name(value) -> str:
+    """File-safe shard name of a field value (first element of a list)."""
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    if not isinstance(value, str):
+        value = "" if value is None else str(value)
+    return _UNSAFE.sub("_", value).strip("._") or DEFAULT_SHARD
+
+def _dumps(entries: dict) -> str:
+    # Same formatting as metadata.save_metadata
+    return json.dumps(entries, indent=4, ensure_ascii=False)
+
+def _write(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+class ShardedCatalog(MutableMapping):
+    """
+    Catalog stored as one JSON shard per studio (or any other field), used
+    like the dict `load_metadata` returns.
+
+    Entries returned by item access are the stored dicts, so in-place edits
+    are picked up by `save` (shards are compared by content hash). Keys are
+    stored as strings, as a JSON round trip of a flat catalog would.
+
+    Args:
+        root (Path): Shard directory; created by `save` if missing.
+        shard_by (str | Callable, optional): Entry field (or entry -> name
+            function) deciding the shard; defaults to the manifest's, or
+            "studio" for a new catalog.
+        verify (bool): Check each shard against its manifest checksum when it
+            is read.
+    """
+
+    def __init__(self, root: Union[str, Path], shard_by: Union[str, Callable, None] = None, verify: bool = True):
+        self.root = Path(root)
+        self.verify = verify
+        self.lock = threading.RLock()
+        self.manifest = {"version": 1, "shard_by": "studio", "shards": {}}
+        manifest_file = self.root / MANIFEST_NAME
+        if manifest_file.exists():
+            with manifest_file.open(encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        if shard_by is not None:
+            self.manifest["shard_by"] = shard_by if isinstance(shard_by, str) else "custom"
+        self.shard_func = shard_by if callable(shard_by) else None
+        self.loaded = {}
+        self.located = {}
+        self.key_index = None
+        self.manifest_dirty = False
+
+    # === Shards ===
+
+    def shard_of(self, entry: dict) -> str:
+        """Shard an entry belongs to."""
+        if self.shard_func is not None:
+            return shard_name(self.shard_func(entry))
+        return shard_name(entry.get(self.manifest["shard_by"]) if isinstance(entry, dict) else None)
+
+    def shards(self) -> list:
+        with self.lock:
+            return sorted(set(self.manifest["shards"]) | set(self.loaded))
+
+    def shard_path(self, shard: str) -> Path:
+        info = self.manifest["shards"].get(shard)
+        return self.root / (info["file"] if info else f"{SHARDS_DIR}/{shard}.json")
+
+    def _load(self, shard: str) -> dict:
+        with self.lock:
+            entries = self.loaded.get(shard)
+            if entries is not None:
+                return entries
+            info = self.manifest["shards"].get(shard)
+            entries = {}
+            if info is not None:
+                path = self.root / info["file"]
+                raw = path.read_bytes()
+                if self.verify and hashlib.sha1(raw).hexdigest() != info["sha1"]:
+                    # A shard written after the last manifest update: trust the shard
+                    print(f"⚠️ 分片校验和不一致，已按分片内容修正 manifest: {path}")
+                    self.manifest_dirty = True
+                entries = json.loads(raw.decode("utf-8"))
+                count("catalog.shard_loads")
+            self.loaded[shard] = entries
+            for key in entries:
+                self.located[key] = shard
+            return entries
+
+    def _keys(self) -> dict:
+        """key -> shard from keys.json, read on first use ({} if missing)."""
+        if self.key_index is None:
+            self.key_index = {}
+            keys_file = self.root / KEYS_NAME
+            if keys_file.exists():
+                with keys_file.open(encoding="utf-8") as f:
+                    self.key_index = {key: shard for shard, keys in json.load(f).items() for key in keys}
+        return self.key_index
+
+    def _candidates(self, key: str) -> list:
+        """Unloaded shards that may hold `key`."""
+        candidates = sorted(shard for shard, info in self.manifest["shards"].items()
+                            if shard not in self.loaded and info["min_key"] <= key <= info["max_key"])
+        if len(candidates) > 1:
+            # Overlapping ranges: ask the key index instead of reading every candidate
+            shard = self._keys().get(key)
+            if shard in candidates:
+                return [shard]
+        return candidates
+
+    def _locate(self, key: str) -> Optional[str]:
+        # Keys of loaded shards are all in `located`; only unloaded shards need a look
+        with self.lock:
+            shard = self.located.get(key)
+            if shard is not None and key in self.loaded.get(shard, {}):
+                return shard
+            for shard in self._candidates(key):
+                if key in self._load(shard):
+                    return shard
+            return None
+
+    # === Mapping ===
+
+    def __getitem__(self, key: str) -> dict:
+        shard = self._locate(str(key))
+        if shard is None:
+            raise KeyError(key)
+        return self.loaded[shard][key]
+
+    def __setitem__(self, key: str, entry: dict) -> None:
+        key = str(key)
+        with self.lock:
+            old = self._locate(key)
+            new = self.shard_of(entry)
+            if old is not None and old != new:
+                del self.loaded[old][key]
+            self._load(new)[key] = entry
+            self.located[key] = new
+
+    def __delitem__(self, key: str) -> None:
+        key = str(key)
+        with self.lock:
+            shard = self._locate(key)
+            if shard is None:
+                raise KeyError(key)
+            del self.loaded[shard][key]
+            self.located.pop(key, None)
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self.shards():
+            yield from list(self._load(shard))
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(len(self.loaded[s]) if s in self.loaded else self.manifest["shards"][s]["count"]
+                       for s in self.shards())
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, (str, int)) and self._locate(str(key)) is not None
+
+    def shard_items(self, shard: str) -> dict:
+        """Entries of one shard (loaded on demand)."""
+        return self._load(shard)
+
+    def replace(self, data: dict) -> None:
+        """Make the catalog hold exactly `data` (only changed shards get written by `save`)."""
+        with self.lock:
+            grouped = {}
+            for key, entry in data.items():
+                grouped.setdefault(self.shard_of(entry), {})[str(key)] = entry
+            # Shards left out of `data` become empty and are removed on save
+            for shard in set(self.shards()) | set(grouped):
+                self.loaded[shard] = grouped.get(shard, {})
+            self.located = {key: shard for shard, entries in grouped.items() for key in entries}
+
+    # === Persistence ===
+
+    @profiled("catalog.save_shards")
+    def save(self) -> list:
+        """
+        Write the shards whose content changed, then the manifest.
+
+        Returns:
+            list: Names of the shards written (or removed).
+        """
+        with self.lock:
+            written = []
+            shards = self.manifest["shards"]
+            for shard, entries in sorted(self.loaded.items()):
+                info = shards.get(shard)
+                if not entries:
+                    if info is not None:
+                        path = self.root / info["file"]
+                        if path.exists():
+                            path.unlink()
+                        del shards[shard]
+                        written.append(shard)
+                    continue
+                text = _dumps(entries)
+                digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                keys = sorted(entries)
+                record = {"file": f"{SHARDS_DIR}/{shard}.json", "count": len(entries), "sha1": digest,
+                          "min_key": keys[0], "max_key": keys[-1]}
+                if info is None or info["sha1"] != digest:
+                    path = self.root / record["file"]
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    _write(path, text)
+                    written.append(shard)
+                shards[shard] = record
+            if written:
+                self._save_keys(written)
+            # Empty shards are dropped from memory too
+            for shard in [s for s, entries in self.loaded.items() if not entries]:
+                del self.loaded[shard]
+            if written or self.manifest_dirty or not (self.root / MANIFEST_NAME).exists():
+                self.root.mkdir(parents=True, exist_ok=True)
+                self.manifest["shards"] = dict(sorted(shards.items()))
+                _write(self.root / MANIFEST_NAME, json.dumps(self.manifest, indent=1, ensure_ascii=False))
+                self.manifest_dirty = False
+            count("catalog.shards_written", len(written))
+            return written
+
+    def _save_keys(self, written: list) -> None:
+        """Update keys.json for the written shards, if their key sets changed."""
+        index = self._keys()
+        by_shard = {}
+        for key, shard in index.items():
+            by_shard.setdefault(shard, []).append(key)
+        changed = not (self.root / KEYS_NAME).exists()
+        for shard in written:
+            keys = sorted(self.loaded.get(shard, {}))
+            if sorted(by_shard.get(shard, [])) != keys:
+                changed = True
+                by_shard[shard] = keys
+        if not changed:
+            return
+        by_shard = {shard: sorted(keys) for shard, keys in sorted(by_shard.items())
+                    if keys and shard in self.manifest["shards"]}
+        self.key_index = {key: shard for shard, keys in by_shard.items() for key in keys}
+        _write(self.root / KEYS_NAME, json.dumps(by_shard, ensure_ascii=False))
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in self}
+
+    @classmethod
+    def from_dict(cls, root: Union[str, Path], data: dict, shard_by: Union[str, Callable] = "studio"):
+        """Shard a whole-catalog dict into `root` (written immediately)."""
+        catalog = cls(root, shard_by)
+        catalog.replace(data)
+        catalog.save()
+        return catalog
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Convert catalogs between one JSON file and shard directories")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split = sub.add_parser("split", help="catalog.json -> shard directory")
+    split.add_argument("catalog")
+    split.add_argument("output", nargs="?", help="Shard directory (default: <catalog without .json>.shards)")
+    split.add_argument("--by", default="studio", help="Entry field to shard by")
+    join = sub.add_parser("join", help="shard directory -> catalog.json")
+    join.add_argument("shards")
+    join.add_argument("output")
+    verify = sub.add_parser("verify", help="Check shard checksums and counts")
+    verify.add_argument("shards")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with session_from_args(args):
+        if args.command == "split":
+            with open(args.catalog, encoding="utf-8") as f:
+                data = json.load(f)
+            output = args.output or re.sub(r"\.json$", "", args.catalog) + ".shards"
+            catalog = ShardedCatalog.from_dict(output, data, args.by)
+            print(f"✅ {len(data)} 个条目 → {len(catalog.shards())} 个分片: {output}")
+        elif args.command == "join":
+            data = ShardedCatalog(args.shards).to_dict()
+            _write(Path(args.output), _dumps(data))
+            print(f"✅ {len(data)} 个条目 → {args.output}")
+        else:
+            catalog = ShardedCatalog(args.shards, verify=False)
+            bad = 0
+            for shard, info in catalog.manifest["shards"].items():
+                raw = (catalog.root / info["file"]).read_bytes()
+                entries = json.loads(raw.decode("utf-8"))
+                if hashlib.sha1(raw).hexdigest() != info["sha1"] or len(entries) != info["count"]:
+                    bad += 1
+                    print(f"❌ {shard}: 校验失败")
+            print(f"{'✅' if not bad else '⚠️'} {len(catalog.manifest['shards'])} 个分片，{bad} 个异常")
+            return 1 if bad else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
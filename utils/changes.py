@@ -0,0 +1,99 @@
+"""
+This module records which directories of a library root changed
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+CHANGES_NAME = ".changes.json"
+
+# Jellyfin update types, in order of precedence when a path is recorded twice
+CREATED = "Created"
+MODIFIED = "Modified"
+DELETED = "Deleted"
+
+class ChangeSet:
+    """
+    Pending changes of one library root, waiting to be submitted for a
+    targeted refresh.
+
+    Changes accumulate across runs in <root>/.changes.json until they are
+    submitted and cleared, so a failed refresh is retried next time.
+
+    Layout of <root>/.changes.json:
+        {"updated": <unix time>, "paths": {"<absolute dir>": "Created" | "Modified" | "Deleted"}}
+
+    Args:
+        root (Path): Library root, e.g. /mnt/nas/jellyfin_links/videos.
+        name (str): File name inside `root`, for change sets kept apart
+            from the library's own (e.g. People metadata).
+    """
+
+    def __init__(self, root: Path, name: str = CHANGES_NAME):
+        self.root = Path(root)
+        self.file = self.root / name
+        self.lock = threading.Lock()
+        self.paths = {}
+        self.dirty = False
+        if self.file.exists():
+            with self.file.open(encoding="utf-8") as f:
+                self.paths = json.load(f).get("paths", {})
+
+    def add(self, path: Path, kind: str = MODIFIED) -> None:
+        key = os.path.abspath(path)
+        with self.lock:
+            previous = self.paths.get(key)
+            if kind == MODIFIED and previous in (CREATED, MODIFIED):
+                return
+            if kind == CREATED and previous == DELETED:
+                kind = MODIFIED
+            if previous != kind:
+                self.paths[key] = kind
+                self.dirty = True
+
+    def created(self, path: Path) -> None:
+        self.add(path, CREATED)
+
+    def touched(self, path: Path) -> None:
+        self.add(path, MODIFIED)
+
+    def removed(self, path: Path) -> None:
+        self.add(path, DELETED)
+
+    def pending(self) -> dict:
+        with self.lock:
+            return dict(self.paths)
+
+    def discard(self, paths) -> None:
+        """Forget submitted paths."""
+        with self.lock:
+            for path in paths:
+                if self.paths.pop(path, None) is not None:
+                    self.dirty = True
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({"updated": time.time(), "paths": self.paths}, indent=1, ensure_ascii=False,
+                              sort_keys=True)
+            self.dirty = False
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.file.with_name(self.file.name + ".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.file)
+
+_change_sets = {}
+_change_sets_lock = threading.Lock()
+
+def changes_for(root: Path, name: str = CHANGES_NAME) -> ChangeSet:
+    """Shared change set of a library root."""
+    key = (os.path.abspath(root), name)
+    with _change_sets_lock:
+        change_set = _change_sets.get(key)
+        if change_set is None:
+            change_set = _change_sets[key] = ChangeSet(Path(root), name)
+        return change_set
@@ -6,6 +6,8 @@ import os
 import sys
 from typing import List, Optional
 
+from profiling import profiled
+
 # === File Extensions ===
 
 file_extensions = {
@@ -32,6 +34,7 @@ def filter(type: str, file: str) -> bool:
     else:
         return False
 
+@profiled("scan.file_traceover")
 def file_traceover(folder_path: str, filter_option: Optional[str] = None) -> List[dict]:
     """File Traceover
     
@@ -0,0 +1,232 @@
+"""
+This module provides a bounded, cached ffmpeg poster extraction service
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from profiling import profiled
+
+# Legacy seek position, still used when the duration cannot be probed
+DEFAULT_SEEK = 37.0
+
+def video_identity(video: Path) -> Optional[str]:
+    """
+    Identity of a source video: path, size and mtime. Returns None if the
+    file does not exist.
+    """
+    try:
+        st = os.stat(video)
+    except OSError:
+        return None
+    return hashlib.sha1(f"{video}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+def probe_duration(video: Path, timeout: float = 15) -> Optional[float]:
+    """Duration in seconds from ffprobe, or None."""
+    try:
+        result = subprocess.run([
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            str(video)
+        ], capture_output=True, text=True, timeout=timeout)
+        return float(result.stdout.strip())
+    except (subprocess.TimeoutExpired, ValueError, OSError):
+        return None
+
+def seek_position(duration: Optional[float], percent: float = 0.1, preferred: float = DEFAULT_SEEK) -> float:
+    """
+    Seek position for the poster frame.
+
+    `percent` of the duration, but never earlier than `preferred` seconds
+    (intros and black frames) unless the video is too short for that, in
+    which case the middle of the video is used.
+    """
+    if not duration or duration <= 0:
+        return preferred
+    if duration <= preferred:
+        return duration / 2
+    return min(max(duration * percent, preferred), duration - 1)
+
+class FrameCache:
+    """
+    On-disk cache of extracted poster frames, keyed by video identity, so a
+    recreated entry directory gets its poster back without running ffmpeg.
+    Failed videos are remembered too and are not retried until they change.
+
+    Layout:
+    /cache_dir
+        index.json          identity -> {"video", "seek", "error"}
+        /frames
+            <identity>.jpg
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.frames = self.cache_dir / "frames"
+        self.index_file = self.cache_dir / "index.json"
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dirty = False
+        if self.index_file.exists():
+            with self.index_file.open(encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def frame_path(self, identity: str) -> Path:
+        return self.frames / f"{identity}.jpg"
+
+    def get(self, identity: str) -> Optional[dict]:
+        with self.lock:
+            meta = self.index.get(identity)
+        if meta is None:
+            return None
+        if meta.get("error") is None and not self.frame_path(identity).exists():
+            return None
+        return meta
+
+    def put(self, identity: str, video: Path, seek: Optional[float], error: Optional[str] = None) -> dict:
+        meta = {"video": str(video), "seek": seek, "error": error}
+        with self.lock:
+            self.index[identity] = meta
+            self.dirty = True
+        return meta
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.index, indent=4, ensure_ascii=False)
+            self.dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.index_file)
+
+class FrameExtractor:
+    """
+    Poster extraction service.
+
+    At most `workers` ffmpeg processes run at once; each job is killed after
+    `timeout` seconds, so one broken file cannot stall a run. Requests for
+    the same video while its job is running share the job.
+
+    Example:
+        with FrameExtractor(output_dir / ".frame_cache", workers=2) as frames:
+            ok, message = frames.extract(video, entry_dir / "poster.jpg")
+
+    Args:
+        cache_dir (Path): FrameCache directory.
+        workers (int): Concurrent ffmpeg processes.
+        timeout (float): Seconds per ffmpeg job.
+        percent (float): Seek position as a fraction of the duration.
+        retry_failed (bool): Retry videos that failed before.
+    """
+
+    def __init__(self, cache_dir: Path, workers: int = 2, timeout: float = 60, percent: float = 0.1,
+                 retry_failed: bool = False):
+        self.cache = FrameCache(cache_dir)
+        self.timeout = timeout
+        self.percent = percent
+        self.retry_failed = retry_failed
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ffmpeg")
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _run(self, identity: str, video: Path) -> dict:
+        duration = probe_duration(video, timeout=min(self.timeout, 15))
+        seek = seek_position(duration, self.percent)
+        frame = self.cache.frame_path(identity)
+        frame.parent.mkdir(parents=True, exist_ok=True)
+        tmp = frame.with_name(f"{identity}.tmp.jpg")
+        try:
+            result = subprocess.run([
+                "ffmpeg",
+                "-y",  # overwrite output file if it exists
+                "-ss", f"{seek:.3f}",  # seek before -i: fast keyframe seek
+                "-i", str(video),
+                "-frames:v", "1",
+                "-q:v", "2",
+                str(tmp)
+            ], capture_output=True, text=True, timeout=self.timeout)
+            if result.returncode == 0 and tmp.exists() and tmp.stat().st_size:
+                os.replace(tmp, frame)
+                return self.cache.put(identity, video, seek)
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"
+        except subprocess.TimeoutExpired:
+            error = f"timeout after {self.timeout}s"
+        except OSError as e:
+            # ffmpeg itself is unavailable: not a property of the video, do not cache
+            return {"video": str(video), "seek": seek, "error": str(e)}
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return self.cache.put(identity, video, seek, error)
+
+    def submit(self, video: Path) -> Optional[Future]:
+        """
+        Schedule extraction of `video` unless its frame is cached.
+
+        Returns:
+            Future: Resolves to the cache record, or None when the video does not exist.
+        """
+        video = Path(video)
+        identity = video_identity(video)
+        if identity is None:
+            return None
+        meta = self.cache.get(identity)
+        if meta is not None and (meta.get("error") is None or not self.retry_failed):
+            future = Future()
+            future.set_result(meta)
+            future.identity = identity
+            return future
+        with self.lock:
+            future = self.pending.get(identity)
+            if future is None:
+                future = self.executor.submit(self._run, identity, video)
+                future.identity = identity
+                self.pending[identity] = future
+                future.add_done_callback(lambda f: self._done(identity))
+        return future
+
+    def _done(self, identity: str) -> None:
+        with self.lock:
+            self.pending.pop(identity, None)
+
+    @profiled("frames.extract")
+    def extract(self, video: Path, target: Path) -> tuple:
+        """
+        Install the poster frame of `video` at `target`, extracting it if needed.
+        Does not print: the caller reports the message.
+
+        Returns:
+            tuple: (ok, message)
+        """
+        from poster_fetcher import install_poster
+
+        future = self.submit(video)
+        if future is None:
+            return False, f"❌ 视频不存在，无法截图: {video}"
+        meta = future.result()
+        if meta.get("error") is not None:
+            return False, f"⚠️ ffmpeg 截图失败: {video.name} - {meta['error']}"
+        install_poster(self.cache.frame_path(future.identity), target)
+        return True, f"🎞️ 自动从视频生成 poster ({meta['seek']:.0f}s): {target.name}"
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        self.cache.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
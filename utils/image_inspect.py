@@ -0,0 +1,390 @@
+"""
+This module reads image dimensions, EXIF orientation and capture dates from
+file headers, in a process pool, for album `imgs` entries
+
+Only the headers are read (JPEG segments up to the frame header, PNG IHDR,
+GIF screen descriptor, WebP chunk header); pixel data is never decoded.
+Results are cached by file identity (path, size, mtime), so reruns over an
+unchanged tree only stat the files.
+
+Each `imgs` entry gains:
+    "width", "height"       stored dimensions in pixels
+    "orientation"           EXIF orientation 1-8 (5-8 are rotated by 90°)
+    "taken"                 EXIF capture time "YYYY-MM-DDTHH:MM:SS", or None
+"""
+
+import argparse
+import json
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from natsort import album_order
+from profiling import add_profile_arguments, profiled, session_from_args
+
+INSPECT_FIELDS = ("width", "height", "orientation", "taken")
+
+# EXIF tags
+_ORIENTATION = 0x0112
+_DATETIME = 0x0132
+_EXIF_IFD = 0x8769
+_DATETIME_ORIGINAL = 0x9003
+
+# JPEG start-of-frame markers (SOF0-SOF15 without DHT, JPG and DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# === Header Parsing ===
+
+def _exif_date(value: bytes) -> Optional[str]:
+    text = value.split(b"\0", 1)[0].decode("ascii", "replace").strip()
+    # "YYYY:MM:DD HH:MM:SS"
+    if len(text) < 19 or text[4] != ":" or text[7] != ":" or not text[:4].isdigit() or text.startswith("0000"):
+        return None
+    return f"{text[:4]}-{text[5:7]}-{text[8:10]}T{text[11:19]}"
+
+def _parse_exif(data: bytes, info: dict) -> None:
+    """Orientation and capture date from a TIFF-structured EXIF block."""
+    if data[:2] == b"II":
+        endian = "<"
+    elif data[:2] == b"MM":
+        endian = ">"
+    else:
+        return
+
+    def ifd(offset):
+        if offset + 2 > len(data):
+            return {}
+        n = struct.unpack_from(endian + "H", data, offset)[0]
+        tags = {}
+        for i in range(n):
+            pos = offset + 2 + 12 * i
+            if pos + 12 > len(data):
+                break
+            tag, kind, count = struct.unpack_from(endian + "HHI", data, pos)
+            if kind == 3:  # SHORT
+                tags[tag] = struct.unpack_from(endian + "H", data, pos + 8)[0]
+            elif kind == 4:  # LONG
+                tags[tag] = struct.unpack_from(endian + "I", data, pos + 8)[0]
+            elif kind == 2:  # ASCII, inline when it fits in 4 bytes
+                start = pos + 8 if count <= 4 else struct.unpack_from(endian + "I", data, pos + 8)[0]
+                tags[tag] = data[start:start + count]
+        return tags
+
+    ifd0 = ifd(struct.unpack_from(endian + "I", data, 4)[0])
+    orientation = ifd0.get(_ORIENTATION)
+    if isinstance(orientation, int) and 1 <= orientation <= 8:
+        info["orientation"] = orientation
+    taken = None
+    if isinstance(ifd0.get(_EXIF_IFD), int):
+        original = ifd(ifd0[_EXIF_IFD]).get(_DATETIME_ORIGINAL)
+        if isinstance(original, bytes):
+            taken = _exif_date(original)
+    if taken is None and isinstance(ifd0.get(_DATETIME), bytes):
+        taken = _exif_date(ifd0[_DATETIME])
+    info["taken"] = taken
+
+def _jpeg_header(f, info: dict) -> None:
+    f.seek(2)
+    while True:
+        b = f.read(1)
+        while b and b != b"\xff":
+            b = f.read(1)
+        while b == b"\xff":
+            b = f.read(1)
+        if not b:
+            return
+        marker = b[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0xD9, 0xDA):
+            return
+        raw = f.read(2)
+        if len(raw) < 2:
+            return
+        length = struct.unpack(">H", raw)[0]
+        if length < 2:
+            # Corrupt segment: the length counts its own two bytes
+            return
+        if marker == 0xE1 and "taken" not in info:
+            data = f.read(length - 2)
+            if data[:6] == b"Exif\0\0":
+                try:
+                    _parse_exif(data[6:], info)
+                except struct.error:
+                    pass
+            continue
+        if marker in _SOF_MARKERS:
+            data = f.read(5)
+            if len(data) == 5:
+                info["height"], info["width"] = struct.unpack(">HH", data[1:5])
+            return
+        f.seek(length - 2, 1)
+
+def read_header(path: str) -> dict:
+    """
+    Dimensions, orientation and capture date of an image from its header.
+
+    Returns:
+        dict: {"format", "width", "height", "orientation", "taken"}; width
+            and height are None if the format is not recognised.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    info = {}
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head[:2] == b"\xff\xd8":
+            info["format"] = "jpeg"
+            _jpeg_header(f, info)
+        elif head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+            info["format"] = "png"
+            info["width"], info["height"] = struct.unpack(">II", head[16:24])
+        elif head[:6] in (b"GIF87a", b"GIF89a"):
+            info["format"] = "gif"
+            info["width"], info["height"] = struct.unpack("<HH", head[6:10])
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            info["format"] = "webp"
+            chunk = head[12:16]
+            if chunk == b"VP8 " and len(head) >= 30:
+                w, h = struct.unpack("<HH", head[26:30])
+                info["width"], info["height"] = w & 0x3FFF, h & 0x3FFF
+            elif chunk == b"VP8L" and len(head) >= 25:
+                bits = struct.unpack("<I", head[21:25])[0]
+                info["width"], info["height"] = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            elif chunk == b"VP8X":
+                info["width"] = int.from_bytes(head[24:27], "little") + 1
+                info["height"] = int.from_bytes(head[27:30], "little") + 1
+        else:
+            info["format"] = None
+    return {
+        "format": info.get("format"),
+        "width": info.get("width"),
+        "height": info.get("height"),
+        "orientation": info.get("orientation", 1),
+        "taken": info.get("taken"),
+    }
+
+# === Cache ===
+
+class InspectCache:
+    """
+    Header results by file identity.
+
+    Layout of <cache_dir>/index.json:
+        {"<path>": {"size", "mtime_ns", "meta": {...} | null, "error": str | null}}
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / "index.json"
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dirty = False
+        if self.index_file.exists():
+            with self.index_file.open(encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def get(self, path: str) -> Optional[dict]:
+        with self.lock:
+            return self.index.get(path)
+
+    def put(self, path: str, size: int, mtime_ns: int, meta: Optional[dict], error: Optional[str]) -> None:
+        with self.lock:
+            self.index[path] = {"size": size, "mtime_ns": mtime_ns, "meta": meta, "error": error}
+            self.dirty = True
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.index, ensure_ascii=False)
+            self.dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.index_file)
+
+# === Batch Inspection ===
+
+def _inspect_chunk(jobs: List[tuple]) -> List[tuple]:
+    """
+    Process pool job. `jobs` holds (path, cached size, cached mtime_ns);
+    files whose identity still matches are not opened.
+
+    Returns:
+        list: (path, size, mtime_ns, meta, error) with meta None for cache
+            hits and for failures.
+    """
+    results = []
+    for path, size, mtime_ns in jobs:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            results.append((path, None, None, None, f"{type(e).__name__}: {e}"))
+            continue
+        if st.st_size == size and st.st_mtime_ns == mtime_ns:
+            results.append((path, size, mtime_ns, None, None))
+            continue
+        try:
+            results.append((path, st.st_size, st.st_mtime_ns, read_header(path), None))
+        except (OSError, ValueError, struct.error) as e:
+            results.append((path, st.st_size, st.st_mtime_ns, None, f"{type(e).__name__}: {e}"))
+    return results
+
+@profiled("images.inspect_batch")
+def inspect_batch(paths: Iterable[str], cache: InspectCache, workers: Optional[int] = None,
+                  chunksize: int = 256) -> dict:
+    """
+    Header metadata of many images, in chunks across a process pool.
+
+    Args:
+        paths (Iterable[str]): Image paths.
+        cache (InspectCache): Result cache (saved by the caller).
+        workers (int, optional): Processes (default: CPU count); 1 runs inline.
+        chunksize (int): Images per job; large chunks keep pickling overhead low.
+
+    Returns:
+        dict: path -> meta (see `read_header`), None for unreadable files.
+    """
+    paths = list(dict.fromkeys(str(p) for p in paths))
+    jobs = []
+    for path in paths:
+        record = cache.get(path)
+        jobs.append((path, record["size"], record["mtime_ns"]) if record else (path, None, None))
+    chunks = [jobs[i:i + chunksize] for i in range(0, len(jobs), chunksize)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        batches = map(_inspect_chunk, chunks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+        batches = executor.map(_inspect_chunk, chunks)
+
+    results = {}
+    read = failed = 0
+    try:
+        for batch in batches:
+            for path, size, mtime_ns, meta, error in batch:
+                if size is None:
+                    results[path] = None
+                    failed += 1
+                elif meta is None and error is None:
+                    results[path] = cache.get(path)["meta"]
+                else:
+                    cache.put(path, size, mtime_ns, meta, error)
+                    results[path] = meta
+                    read += 1
+                    failed += error is not None
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"🖼️ 图片头信息: {len(paths)} 张，读取 {read} 张，缓存命中 {len(paths) - read - failed} 张，失败 {failed} 张")
+    return results
+
+def inspect_albums(entries: Iterable[dict], cache_dir: Path, workers: Optional[int] = None) -> int:
+    """
+    Fill width, height, orientation and capture date into the `imgs` of
+    album entries. Every readable image gets all of `INSPECT_FIELDS`; a
+    field the header does not carry (e.g. "taken" without EXIF) is None.
+
+    Returns:
+        int: Number of entries that changed.
+    """
+    entries = list(entries)
+    paths = [meta["path"] for entry in entries for meta in (entry.get("imgs") or {}).values()
+             if isinstance(meta, dict) and meta.get("path")]
+    cache = InspectCache(cache_dir)
+    try:
+        results = inspect_batch(paths, cache, workers)
+    finally:
+        cache.save()
+    updated = 0
+    for entry in entries:
+        changed = False
+        for meta in (entry.get("imgs") or {}).values():
+            found = results.get(meta.get("path")) if isinstance(meta, dict) else None
+            if not found or found["width"] is None:
+                continue
+            for field in INSPECT_FIELDS:
+                # Missing fields are written even when None (e.g. no EXIF date)
+                if field not in meta or meta[field] != found[field]:
+                    meta[field] = found[field]
+                    changed = True
+        updated += changed
+    return updated
+
+# === Poster Selection ===
+
+# Jellyfin poster aspect (width / height)
+POSTER_ASPECT = 2 / 3
+MIN_POSTER_SIDE = 600
+
+def display_size(meta: dict) -> Optional[tuple]:
+    """(width, height) as displayed, honouring EXIF rotation; None if unknown."""
+    width, height = meta.get("width"), meta.get("height")
+    if not width or not height:
+        return None
+    if meta.get("orientation", 1) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+def select_poster(entry: dict) -> Optional[str]:
+    """
+    Poster image of an album (a key of entry["imgs"]).
+
+    An image marked `"poster": true` always wins. Otherwise, among the first
+    images in display order, the one closest to the poster aspect is chosen,
+    preferring large images and earlier positions. Without inspected
+    dimensions this is the first image.
+    """
+    imgs = entry.get("imgs") or {}
+    for name, meta in imgs.items():
+        if isinstance(meta, dict) and meta.get("poster") is True:
+            return name
+    order = album_order(entry)
+    if not order:
+        return None
+    # Covers are usually near the start of an album
+    candidates = order[:max(10, len(order) // 5)]
+    best, best_score = order[0], None
+    for position, name in enumerate(candidates):
+        meta = imgs.get(name)
+        size = display_size(meta) if isinstance(meta, dict) else None
+        if size is None:
+            continue
+        width, height = size
+        aspect = width / height
+        score = abs(aspect - POSTER_ASPECT) / POSTER_ASPECT + 0.02 * position
+        if min(width, height) < MIN_POSTER_SIDE:
+            score += 1
+        if best_score is None or score < best_score:
+            best, best_score = name, score
+    return best
+
+def main(argv: Optional[list] = None):
+    from metadata import load_metadata, save_metadata
+
+    parser = argparse.ArgumentParser(description="Read image dimensions, orientation and dates into an album catalog")
+    parser.add_argument("catalog", help="Album catalog JSON, updated in place")
+    parser.add_argument("--cache", help="Cache directory (default: <catalog>.inspect)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    with session_from_args(args):
+        catalog = load_metadata(args.catalog)
+        updated = inspect_albums(catalog.values(), Path(args.cache or f"{args.catalog}.inspect"), args.workers)
+        if updated:
+            save_metadata(catalog, args.catalog)
+        print(f"更新 {updated} 个相册")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
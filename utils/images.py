@@ -0,0 +1,193 @@
+"""
+This module provides batch image transcoding (PNG/WebP -> JPEG) and resizing
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from profiling import profiled
+
+# Bounding boxes of the generated variants; None keeps the original size.
+# Jellyfin posters are 2:3, clients rarely show them larger than 1000x1500.
+SIZES = {
+    "full": None,
+    "poster": (1000, 1500),
+    "thumb": (400, 600),
+}
+
+def transcode_image(source: Path, target: Path, max_size: Optional[Sequence[int]] = None, quality: int = 90) -> bool:
+    """
+    Convert an image to JPEG, optionally downscaled to fit `max_size`.
+
+    JPEG sources are decoded in draft mode at the smallest DCT scale that
+    still covers `max_size`, which skips most of the decoding work for large
+    photos. Transparency is flattened onto white.
+
+    Args:
+        source (Path): Input image.
+        target (Path): JPEG output, written atomically.
+        max_size (tuple, optional): (width, height) bounding box.
+        quality (int): JPEG quality.
+
+    Returns:
+        bool: True on success.
+    """
+    from PIL import Image
+
+    target = Path(target)
+    with Image.open(source) as image:
+        if max_size and image.format == "JPEG":
+            image.draft("RGB", tuple(max_size))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if max_size and (image.width > max_size[0] or image.height > max_size[1]):
+            image.thumbnail(tuple(max_size), Image.LANCZOS)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per process and thread: pool workers and threads may convert the same digest at once
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        image.save(tmp, format="JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp, target)
+    return True
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def variant_path(cache_dir: Path, digest: str, variant: str) -> Path:
+    return Path(cache_dir) / digest[:2] / f"{digest}.{variant}.jpg"
+
+class ImageCache:
+    """
+    On-disk cache of transcoded images, keyed by the hash of the source
+    content, so identical images are converted once however many paths
+    point at them. Source hashes are remembered by (path, size, mtime) to
+    avoid re-reading unchanged sources.
+
+    Layout:
+    /cache_dir
+        index.json          source path -> {"sha1", "size", "mtime_ns"}
+        /<sha1[:2]>/<sha1>.<variant>.jpg
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / "index.json"
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dirty = False
+        if self.index_file.exists():
+            with self.index_file.open(encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def output_path(self, digest: str, variant: str) -> Path:
+        return variant_path(self.cache_dir, digest, variant)
+
+    def known_digest(self, source: Path) -> Optional[str]:
+        """Hash of `source` if it has not changed since it was recorded."""
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        with self.lock:
+            meta = self.index.get(str(source))
+        if meta and meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+            return meta["sha1"]
+        return None
+
+    def record(self, source: Path, digest: str) -> None:
+        st = os.stat(source)
+        with self.lock:
+            self.index[str(source)] = {"sha1": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self.dirty = True
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.index, indent=1, ensure_ascii=False)
+            self.dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.index_file)
+
+def _transcode_job(source: str, digest: Optional[str], cache_dir: str, variants: tuple, quality: int) -> tuple:
+    """Process pool job: hash the source if needed and produce missing variants."""
+    try:
+        digest = digest or file_hash(source)
+        outputs = {}
+        for variant in variants:
+            target = variant_path(cache_dir, digest, variant)
+            if not target.exists():
+                transcode_image(source, target, SIZES[variant], quality)
+            outputs[variant] = str(target)
+        return source, digest, outputs, None
+    except Exception as e:
+        return source, digest, {}, f"{type(e).__name__}: {e}"
+
+@profiled("images.transcode_batch")
+def transcode_batch(sources: Iterable[Path],
+                    cache: ImageCache,
+                    variants: Sequence[str] = ("poster",),
+                    workers: Optional[int] = None,
+                    quality: int = 90) -> dict:
+    """
+    Transcode many images at once in a process pool.
+
+    Sources whose variants are already cached are answered without starting
+    a job; the pool is only created when there is work to do.
+
+    Args:
+        sources (Iterable[Path]): Input images; duplicates are processed once.
+        cache (ImageCache): Output cache.
+        variants (Sequence[str]): Keys of SIZES to produce.
+        workers (int, optional): Worker processes (default: CPU count).
+        quality (int): JPEG quality.
+
+    Returns:
+        dict: source path -> {variant: Path}, or None if the source failed.
+    """
+    variants = tuple(variants)
+    for variant in variants:
+        if variant not in SIZES:
+            raise ValueError(f"Unknown image variant: {variant}")
+
+    results = {}
+    jobs = []
+    for source in dict.fromkeys(str(s) for s in sources):
+        digest = cache.known_digest(source)
+        if digest and all(cache.output_path(digest, v).exists() for v in variants):
+            results[source] = {v: cache.output_path(digest, v) for v in variants}
+        else:
+            jobs.append((source, digest))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_transcode_job, source, digest, str(cache.cache_dir), variants, quality)
+                       for source, digest in jobs]
+            for future in futures:
+                source, digest, outputs, error = future.result()
+                if error:
+                    print(f"❌ 图片转换失败: {source} - {error}")
+                    results[source] = None
+                    continue
+                cache.record(source, digest)
+                results[source] = {v: Path(p) for v, p in outputs.items()}
+        cache.save()
+    return results
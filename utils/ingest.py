@@ -0,0 +1,359 @@
+"""
+This module provides the scan -> enrich -> validate -> link ingest pipeline
+
+Entries stream between the stages through `pipeline.Pipeline`; the catalog is
+read once and written once at the end. Every per-entry stage is cached and
+keyed by a hash of its inputs, so a rerun only recomputes the stages whose
+inputs changed:
+
+    scan        directory listing (always runs, it is what the keys are made of)
+    enrich      poster discovery, ffprobe runtime, spider catalog merge
+    validate    required fields and paths
+    link        Jellyfin link directories (only for entries whose validated
+                metadata changed or whose link directory is missing)
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from file import file_traceover
+from manifest import inputs_hash
+from metadata import (load_metadata, metadata_generator, metadata_sorted, metatadata_handler, normalize_key,
+                      save_metadata)
+from pipeline import Pipeline
+from profiling import count, profiled, stage
+from sidecar import SidecarResolver
+
+# Bump when a stage's logic changes, to invalidate its cached outputs
+STAGE_VERSIONS = {"enrich": 1, "validate": 1, "link": 1}
+
+# === Stage Cache ===
+
+class StageCache:
+    """
+    Cached stage outputs.
+
+    Layout of <cache_dir>/stages.json:
+        {"<stage>": {"<entry key>": {"in": "<inputs hash>", "out": <output>}}}
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.file = self.cache_dir / "stages.json"
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.hits = {}
+        self.misses = {}
+        self.dirty = False
+        if self.file.exists():
+            with self.file.open(encoding="utf-8") as f:
+                self.stages = json.load(f)
+
+    def get(self, stage: str, key: str, digest: str):
+        """Cached output, or None if the inputs changed."""
+        with self.lock:
+            record = self.stages.get(stage, {}).get(key)
+            if record is not None and record["in"] == digest:
+                self.hits[stage] = self.hits.get(stage, 0) + 1
+                return record["out"]
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+            return None
+
+    def put(self, stage: str, key: str, digest: str, output) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, {})[key] = {"in": digest, "out": output}
+            self.dirty = True
+
+    def prune(self, keys: set) -> None:
+        """Drop records of entries that no longer exist."""
+        with self.lock:
+            for records in self.stages.values():
+                for key in [k for k in records if k not in keys]:
+                    del records[key]
+                    self.dirty = True
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.stages, ensure_ascii=False)
+            self.dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.file.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.file)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {stage: {"hits": self.hits.get(stage, 0), "misses": self.misses.get(stage, 0)}
+                    for stage in sorted(set(self.hits) | set(self.misses))}
+
+def file_signature(path: Optional[str]) -> Optional[list]:
+    """(size, mtime) of a file, used in stage keys; None if it does not exist."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+# === Stages ===
+
+def scan(directory: str, file_type: str) -> Iterable[tuple]:
+    """
+    Yield (key, entry) for every video or album under `directory`, keyed
+    like `act.inspect`.
+    """
+    for raw in file_traceover(directory, filter_option=file_type):
+        entry = metatadata_handler(metadata_generator(file_type), raw)
+        if file_type == "album":
+            models = entry["model"]
+            model = "Unknown" if not models else ", ".join(models)
+            yield f"{model}-{entry['title']}", entry
+        else:
+            yield entry["title"], entry
+
+def code_keyed(catalog: dict) -> bool:
+    """Whether the catalog is keyed by code (e.g. after `Transform().rekey("code")`)."""
+    coded = [(key, entry["code"]) for key, entry in catalog.items()
+             if isinstance(entry, dict) and isinstance(entry.get("code"), str) and entry["code"].strip()]
+    return bool(coded) and all(key == code for key, code in coded)
+
+def discover_poster(entry: dict, file_type: str, sidecars: Optional[SidecarResolver] = None) -> str:
+    """Poster next to the source (see `sidecar.DEFAULT_RULES`), or the album's marked image."""
+    sidecars = sidecars if sidecars is not None else SidecarResolver()
+    if entry.get("poster") and sidecars.exists(entry["poster"]):
+        return entry["poster"]
+    if file_type == "album":
+        imgs = entry.get("imgs") or {}
+        for meta in imgs.values():
+            if isinstance(meta, dict) and meta.get("poster"):
+                return meta.get("path", "")
+        return ""
+    if not entry.get("path"):
+        return ""
+    poster = sidecars.poster(Path(entry["path"]))
+    return str(poster) if poster else ""
+
+class SpiderIndex:
+    """
+    Spider catalog indexed by code and normalized title, for merging
+    crawled metadata into locally scanned entries.
+    """
+
+    def __init__(self, catalog: dict):
+        self.by_code = {}
+        self.by_title = {}
+        for metadata in catalog.values():
+            if not isinstance(metadata, dict):
+                continue
+            code = metadata.get("code")
+            if isinstance(code, str) and code.strip():
+                self.by_code[code.strip().upper()] = metadata
+            title = metadata.get("title")
+            if isinstance(title, str) and title.strip():
+                self.by_title[normalize_key(title)] = metadata
+
+    def find(self, entry: dict) -> Optional[dict]:
+        code = entry.get("code")
+        if isinstance(code, str) and code.strip().upper() in self.by_code:
+            return self.by_code[code.strip().upper()]
+        title = entry.get("title")
+        if isinstance(title, str) and title.strip():
+            return self.by_title.get(normalize_key(title))
+        return None
+
+@profiled("ingest.enrich")
+def enrich(entry: dict, file_type: str, probe: bool = False, spider: Optional[SpiderIndex] = None,
+           sidecars: Optional[SidecarResolver] = None) -> dict:
+    """
+    Poster discovery, ffprobe runtime (videos, optional) and spider merge.
+    Fields already set locally win over crawled ones.
+    """
+    entry = dict(entry)
+    if spider is not None:
+        crawled = spider.find(entry)
+        if crawled:
+            for field, value in crawled.items():
+                if value not in ("", [], {}, None) and entry.get(field) in ("", [], {}, None):
+                    entry[field] = value
+    poster = discover_poster(entry, file_type, sidecars)
+    if poster:
+        entry["poster"] = poster
+    if probe and file_type == "video" and entry.get("path") and not entry.get("runtime"):
+        from frame_extractor import probe_duration
+        duration = probe_duration(Path(entry["path"]))
+        if duration:
+            entry["runtime"] = round(duration / 60)
+    return entry
+
+REQUIRED_FIELDS = {
+    "video": ["title", "code", "path"],
+    "album": ["title", "code", "imgs"],
+}
+
+@profiled("ingest.validate")
+def validate(entry: dict, file_type: str) -> list:
+    """Problems that keep an entry from being linked; empty when it is fine."""
+    problems = [f"missing {field}" for field in REQUIRED_FIELDS.get(file_type, []) if not entry.get(field)]
+    if file_type == "video" and entry.get("path") and not os.path.isfile(entry["path"]):
+        problems.append(f"source not found: {entry['path']}")
+    return problems
+
+# === Pipeline ===
+
+def run_ingest(directory: str,
+               file_type: str,
+               catalog_file: str,
+               cache_dir: Optional[str] = None,
+               spider_catalog: Optional[str] = None,
+               probe: bool = False,
+               link_root: Optional[str] = None,
+               workers: int = 4,
+               force: bool = False) -> dict:
+    """
+    Scan `directory`, enrich and validate every entry, write the catalog once
+    and (optionally) generate Jellyfin links for the entries that changed.
+
+    Args:
+        directory (str): Media directory to scan.
+        file_type (str): "video" or "album".
+        catalog_file (str): Catalog JSON to update. Scanned entries are
+            matched to existing ones by source path and keep their catalog
+            key and curated fields; new entries are keyed by code when the
+            catalog is keyed by code, otherwise like `act.inspect`.
+        cache_dir (str, optional): Stage cache (default: <catalog>.ingest/).
+        spider_catalog (str, optional): Crawled catalog to merge in.
+        probe (bool): Fill video runtimes with ffprobe.
+        link_root (str, optional): Jellyfin link root; skip linking when None.
+        workers (int): Threads for the enrich stage.
+        force (bool): Ignore cached stage outputs.
+
+    Returns:
+        dict: Statistics per stage.
+    """
+    start = time.perf_counter()
+    cache = StageCache(Path(cache_dir or f"{catalog_file}.ingest"))
+    catalog = load_metadata(catalog_file) if os.path.exists(catalog_file) else {}
+    spider = None
+    spider_sig = None
+    if spider_catalog:
+        spider = SpiderIndex(load_metadata(spider_catalog))
+        spider_sig = file_signature(spider_catalog)
+
+    # Existing entries are found by source path, whatever the catalog is keyed by
+    by_path = {entry["path"]: key for key, entry in catalog.items()
+               if isinstance(entry, dict) and entry.get("path")}
+    by_code = code_keyed(catalog)
+
+    def keyed(items):
+        for key, scanned in items:
+            yield by_path.get(scanned.get("path"), key), scanned
+
+    def final_key(key, entry):
+        # New entries of a code-keyed catalog join it under their (crawled) code
+        if key in catalog or not by_code:
+            return key
+        code = entry.get("code")
+        if isinstance(code, str) and code.strip() and code not in catalog:
+            return code
+        return key
+
+    # One listing per media directory for every poster lookup
+    sidecars = SidecarResolver()
+    results = {}
+    invalid = {}
+    lock = threading.Lock()
+
+    def enrich_stage(item):
+        key, scanned = item
+        current = dict(catalog.get(key) or {})
+        # Curated fields in the catalog win over freshly scanned ones
+        merged = metatadata_handler(dict(scanned), {k: v for k, v in current.items() if v not in ("", [], {}, None)})
+        poster = discover_poster(merged, file_type, sidecars)
+        digest = inputs_hash([STAGE_VERSIONS["enrich"], merged, probe, spider_sig, poster,
+                              file_signature(merged.get("path"))])
+        output = None if force else cache.get("enrich", key, digest)
+        if output is None:
+            output = enrich(merged, file_type, probe, spider, sidecars)
+            cache.put("enrich", key, digest, output)
+        yield final_key(key, output), output
+
+    def validate_stage(item):
+        key, entry = item
+        digest = inputs_hash([STAGE_VERSIONS["validate"], entry, file_signature(entry.get("path"))])
+        problems = None if force else cache.get("validate", key, digest)
+        if problems is None:
+            problems = validate(entry, file_type)
+            cache.put("validate", key, digest, problems)
+        yield key, entry, problems
+
+    def collect_stage(item):
+        key, entry, problems = item
+        with lock:
+            results[key] = entry
+            if problems:
+                invalid[key] = problems
+        return None
+
+    pipeline = Pipeline(maxsize=256)
+    pipeline.stage("enrich", enrich_stage, workers=workers)
+    pipeline.stage("validate", validate_stage)
+    pipeline.stage("collect", collect_stage)
+    with stage("ingest.pipeline"):
+        stats = pipeline.run(keyed(scan(directory, file_type)))
+    count("ingest.entries", len(results))
+
+    # One write: scanned entries merged into the catalog, unscanned ones kept as they are
+    updated = dict(catalog)
+    updated.update(results)
+    updated = metadata_sorted(updated)
+    if inputs_hash(updated) != inputs_hash(metadata_sorted(catalog)):
+        save_metadata(updated, catalog_file)
+        print(f"💾 catalog 已更新: {catalog_file}")
+    else:
+        print(f"⏸️ catalog 未变化: {catalog_file}")
+
+    for key, problems in sorted(invalid.items()):
+        print(f"⚠️ {key}: {', '.join(problems)}")
+
+    stats["link"] = {"linked": 0}
+    if link_root:
+        from links_generator import entry_dir_name, media_entry_generator
+        pending = []
+        for key, entry in results.items():
+            if key in invalid:
+                continue
+            digest = inputs_hash([STAGE_VERSIONS["link"], entry])
+            dir_name = entry_dir_name(entry, file_type)
+            present = dir_name is not None and os.path.isdir(os.path.join(link_root, dir_name))
+            if force or not present or cache.get("link", key, digest) is None:
+                pending.append((key, digest, entry))
+        count("ingest.link_pending", len(pending))
+        if pending:
+            Path(link_root).mkdir(parents=True, exist_ok=True)
+            with stage("ingest.link"):
+                outcomes = media_entry_generator([entry for _, _, entry in pending], Path(link_root),
+                                                 entry_type=file_type, overwrite=True, workers=workers)
+            for (key, digest, _), outcome in zip(pending, outcomes):
+                if outcome["status"] == "ok":
+                    cache.put("link", key, digest, True)
+        stats["link"] = {"linked": len(pending)}
+
+    cache.prune(set(updated))
+    cache.save()
+    stats["cache"] = cache.stats()
+    stats["entries"] = len(results)
+    stats["invalid"] = len(invalid)
+    stats["elapsed"] = round(time.perf_counter() - start, 3)
+    print(f"完成 {len(results)} 个条目（无效 {len(invalid)} 个，链接 {stats['link']['linked']} 个），"
+          f"用时 {stats['elapsed']}s，缓存 {stats['cache']}")
+    return stats
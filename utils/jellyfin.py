@@ -0,0 +1,180 @@
+"""
+This module provides a minimal Jellyfin client for targeted library refreshes
+"""
+
+import argparse
+import json
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from changes import DELETED, changes_for
+from profiling import add_profile_arguments, session_from_args
+
+# Query of /Items/{id}/Refresh: re-read the local person.nfo and poster.jpg
+# without replacing them from online providers
+PERSON_REFRESH = {"MetadataRefreshMode": "FullRefresh", "ImageRefreshMode": "FullRefresh",
+                  "ReplaceAllMetadata": "false", "ReplaceAllImages": "false"}
+
+class JellyfinClient:
+    """
+    Submits changed paths to Jellyfin's `/Library/Media/Updated` endpoint,
+    which refreshes only the folders containing those paths instead of
+    scanning whole libraries. People, whose metadata lives outside the
+    libraries, are refreshed item by item.
+
+    Args:
+        url (str): Server URL, e.g. http://jellyfin:8096.
+        api_key (str): API key (Dashboard -> API Keys).
+        path_map (dict, optional): Local path prefix -> path prefix as seen by
+            the server, e.g. {"/mnt/nas/": "/media/"}.
+        timeout (int): Request timeout (seconds).
+        batch_size (int): Paths per request.
+    """
+
+    def __init__(self, url: str, api_key: str, path_map: Optional[dict] = None, timeout: int = 10,
+                 batch_size: int = 200):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.path_map = path_map or {}
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        self.session.headers.update({"X-Emby-Token": api_key, "Content-Type": "application/json"})
+
+    def server_path(self, path: str) -> str:
+        for local, remote in self.path_map.items():
+            if path.startswith(local):
+                return remote + path[len(local):]
+        return path
+
+    def media_updated(self, updates: dict) -> list:
+        """
+        Report changed paths.
+
+        Args:
+            updates (dict): Local path -> "Created" | "Modified" | "Deleted".
+
+        Returns:
+            list: Local paths that were accepted.
+        """
+        accepted = []
+        items = sorted(updates.items())
+        for i in range(0, len(items), self.batch_size):
+            batch = items[i:i + self.batch_size]
+            body = {"Updates": [{"Path": self.server_path(path), "UpdateType": kind} for path, kind in batch]}
+            response = self.session.post(f"{self.url}/Library/Media/Updated", data=json.dumps(body),
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            accepted.extend(path for path, _ in batch)
+        return accepted
+
+    def person_id(self, name: str) -> Optional[str]:
+        """Item id of a person, or None if Jellyfin does not know them yet."""
+        response = self.session.get(f"{self.url}/Persons/{quote(name, safe='')}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get("Id")
+
+    def refresh_item(self, item_id: str, params: Optional[dict] = None) -> None:
+        response = self.session.post(f"{self.url}/Items/{item_id}/Refresh", params=params or PERSON_REFRESH,
+                                     timeout=self.timeout)
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.session.close()
+
+def refresh_changes(root: str, client: JellyfinClient, dry_run: bool = False) -> dict:
+    """
+    Submit the pending changes of a library root and clear the ones accepted.
+
+    Returns:
+        dict: {"pending", "submitted", "error"}
+    """
+    change_set = changes_for(root)
+    pending = change_set.pending()
+    report = {"pending": len(pending), "submitted": 0, "error": None}
+    if not pending:
+        print(f"✅ 没有待刷新的路径: {root}")
+        return report
+    if dry_run:
+        for path, kind in sorted(pending.items()):
+            print(f"🔍 {kind:<8} {client.server_path(path)}")
+        return report
+    accepted = []
+    try:
+        accepted = client.media_updated(pending)
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+        print(f"❌ Jellyfin 刷新提交失败: {report['error']}")
+    change_set.discard(accepted)
+    change_set.save()
+    report["submitted"] = len(accepted)
+    print(f"📡 已提交 {len(accepted)}/{len(pending)} 个路径到 Jellyfin")
+    return report
+
+def refresh_people(state_dir: str, client: JellyfinClient, dry_run: bool = False) -> dict:
+    """
+    Refresh the people recorded by `people_sync.sync_people` through the
+    item-refresh endpoint and clear the ones done. People Jellyfin does not
+    know yet are cleared too: their metadata is read when they first appear.
+
+    Returns:
+        dict: {"pending", "refreshed", "unknown", "error"}
+    """
+    from people_sync import people_changes
+
+    change_set = people_changes(state_dir)
+    pending = {path: kind for path, kind in change_set.pending().items() if kind != DELETED}
+    report = {"pending": len(pending), "refreshed": 0, "unknown": 0, "error": None}
+    if not pending:
+        print(f"✅ 没有待刷新的人物: {state_dir}")
+        return report
+    if dry_run:
+        for path in sorted(pending):
+            print(f"🔍 refresh {os.path.basename(path)}")
+        return report
+    done = []
+    try:
+        for path in sorted(pending):
+            item_id = client.person_id(os.path.basename(path))
+            if item_id is None:
+                report["unknown"] += 1
+            else:
+                client.refresh_item(item_id)
+                report["refreshed"] += 1
+            done.append(path)
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+        print(f"❌ Jellyfin 人物刷新失败: {report['error']}")
+    change_set.discard(done + [path for path, kind in change_set.pending().items() if kind == DELETED])
+    change_set.save()
+    print(f"📡 已刷新 {report['refreshed']}/{len(pending)} 个人物（Jellyfin 中尚不存在 {report['unknown']} 个）")
+    return report
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Submit pending link changes to Jellyfin for a targeted refresh")
+    parser.add_argument("roots", nargs="*", help="Library roots with a .changes.json")
+    parser.add_argument("--people", action="append", default=[], metavar="STATE_DIR",
+                        help="Refresh the people recorded by people_sync in STATE_DIR")
+    parser.add_argument("--url", default=os.environ.get("JELLYFIN_URL", "http://localhost:8096"))
+    parser.add_argument("--api-key", default=os.environ.get("JELLYFIN_API_KEY", ""))
+    parser.add_argument("--map", action="append", default=[], metavar="LOCAL=SERVER",
+                        help="Path prefix mapping, e.g. /mnt/nas/=/media/")
+    parser.add_argument("--dry-run", action="store_true")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    path_map = dict(m.split("=", 1) for m in args.map)
+    client = JellyfinClient(args.url, args.api_key, path_map)
+    try:
+        with session_from_args(args):
+            reports = [refresh_changes(root, client, args.dry_run) for root in args.roots]
+            reports += [refresh_people(state_dir, client, args.dry_run) for state_dir in args.people]
+    finally:
+        client.close()
+    return 1 if any(r["error"] for r in reports) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+"""
+This module provides garbage collection of stale Jellyfin link directories
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+from changes import changes_for
+from manifest import manifest_for
+from profiling import profiled
+
+QUARANTINE_DIR = ".quarantine"
+
+def entry_dirs(output_dir: Path) -> List[str]:
+    """
+    Names of the entry directories under `output_dir`, from one listing.
+    Hidden directories (caches, quarantine) and plain files are skipped.
+    """
+    try:
+        with os.scandir(output_dir) as it:
+            return [e.name for e in it if not e.name.startswith(".") and e.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+def find_orphans(output_dir: Path, expected: Iterable[str]) -> List[Path]:
+    """Entry directories under `output_dir` whose name is not expected."""
+    expected = set(expected)
+    return sorted(Path(output_dir) / name for name in entry_dirs(output_dir) if name not in expected)
+
+@profiled("links.gc")
+def reconcile_link_dirs(output_dir: Path,
+                        expected: Iterable[str],
+                        dry_run: bool = True,
+                        quarantine: bool = True,
+                        max_ratio: float = 0.5) -> dict:
+    """
+    Remove entry directories that no longer correspond to a catalog entry.
+
+    Args:
+        output_dir (Path): Output root, e.g. /mnt/nas/jellyfin_links/videos.
+        expected (Iterable[str]): Directory names built from the catalog.
+        dry_run (bool): Only report the orphans.
+        quarantine (bool): Move orphans to <output_dir>/.quarantine/<timestamp>/
+            instead of deleting them.
+        max_ratio (float): Refuse to touch more than this fraction of the
+            entry directories (protects against an empty or wrong catalog).
+
+    Returns:
+        dict: {"expected", "orphans", "removed", "aborted"}
+    """
+    output_dir = Path(output_dir)
+    expected = set(expected)
+    present = entry_dirs(output_dir)
+    orphans = sorted(output_dir / name for name in present if name not in expected)
+    report = {"expected": len(expected), "orphans": [str(p) for p in orphans], "removed": [], "aborted": None}
+    if not orphans:
+        print("✅ 没有过期的条目目录")
+        return report
+
+    if not expected or len(orphans) > max_ratio * len(present):
+        report["aborted"] = f"{len(orphans)}/{len(present)} directories would be removed"
+        print(f"⛔ 放弃清理: {report['aborted']}（catalog 是否正确？）")
+        return report
+
+    if dry_run:
+        for path in orphans:
+            print(f"🔍 过期目录: {path.name}")
+        print(f"共 {len(orphans)} 个过期目录（dry run，未修改）")
+        return report
+
+    target_root = output_dir / QUARANTINE_DIR / time.strftime("%Y%m%d-%H%M%S")
+    manifest = manifest_for(output_dir)
+    for path in orphans:
+        try:
+            if quarantine:
+                target_root.mkdir(parents=True, exist_ok=True)
+                os.rename(path, target_root / path.name)
+                print(f"📦 移入隔离区: {path.name}")
+            else:
+                shutil.rmtree(path)
+                print(f"🗑️ 删除过期目录: {path.name}")
+        except OSError as e:
+            print(f"⚠️ 清理失败: {path.name} - {e}")
+            continue
+        manifest.forget_tree(path)
+        changes_for(output_dir).removed(path)
+        report["removed"].append(str(path))
+    manifest.save()
+    changes_for(output_dir).save()
+    print(f"已清理 {len(report['removed'])} 个过期目录")
+    return report
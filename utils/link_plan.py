@@ -0,0 +1,350 @@
+"""
+This module provides plan/apply support for Jellyfin link directories.
+
+A handler describes the desired content of one entry directory; the planner
+compares it against a single scan of that directory and produces the create,
+replace and delete operations needed, which are then applied (or printed in
+dry-run mode) in one go.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from changes import changes_for
+from linking import Linker, default_linker
+from manifest import manifest_for
+from profiling import profiled
+
+# === Directory Snapshots ===
+
+class DirSnapshot:
+    """
+    One `os.scandir` of a directory.
+
+    File type and inode come from the directory listing itself, so looking up
+    any number of names costs no further syscalls.
+
+    Attributes:
+        path (Path): Scanned directory.
+        exists (bool): Whether the directory existed.
+        dev (int): Device of the directory (shared by its plain entries).
+        entries (dict): name -> (inode, is_symlink, is_file, is_dir)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = {}
+        try:
+            self.dev = os.stat(self.path).st_dev
+            with os.scandir(self.path) as it:
+                for e in it:
+                    self.entries[e.name] = (e.inode(), e.is_symlink(),
+                                            e.is_file(follow_symlinks=False), e.is_dir(follow_symlinks=False))
+            self.exists = True
+        except (FileNotFoundError, NotADirectoryError):
+            self.dev = None
+            self.exists = False
+
+    def get(self, name: str) -> Optional[tuple]:
+        return self.entries.get(name)
+
+    def identity(self, name: str) -> Optional[tuple]:
+        """(dev, inode) of a plain file in the directory, or None."""
+        info = self.entries.get(name)
+        if info is None or info[1] or not info[2]:
+            return None
+        return self.dev, info[0]
+
+class SourceIndex:
+    """
+    Cache of source directory snapshots, shared across entries so every
+    source directory is listed once per run instead of stat-ing each file.
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def snapshot(self, directory: Path) -> DirSnapshot:
+        key = str(directory)
+        with self.lock:
+            snap = self.snapshots.get(key)
+        if snap is None:
+            snap = DirSnapshot(directory)
+            with self.lock:
+                snap = self.snapshots.setdefault(key, snap)
+        return snap
+
+    def identity(self, path: Path) -> Optional[tuple]:
+        """(dev, inode) of a source file, or None if it does not exist."""
+        path = Path(path)
+        return self.snapshot(path.parent).identity(path.name)
+
+    def exists(self, path: Path) -> bool:
+        return self.identity(path) is not None
+
+# === Plan ===
+
+Content = Union[str, Callable[[], str]]
+
+class LinkPlan:
+    """
+    Operations needed to bring one entry directory to its desired state.
+
+    Operations (tuples, applied in order):
+        ("mkdir",)
+        ("link", src, name)          place a source file (hard link, reflink, symlink or copy)
+        ("relink", src, name)        replace an existing file with the source
+        ("unlink", name, reason)     delete a stale file or symlink
+        ("write", name, content, label, entry)
+        ("extract", video, name)     generate a poster frame with ffmpeg
+        ("download", url, name)      install a downloaded poster
+        ("skip", name, reason)
+        ("missing", src, name)
+
+    Args:
+        entry_dir (Path): Target entry directory.
+        overwrite (bool): Replace existing files that differ from the desired state.
+        sources (SourceIndex, optional): Shared source index.
+        linker (Linker, optional): Link strategy (default: shared `default_linker`).
+    """
+
+    def __init__(self, entry_dir: Path, overwrite: bool, sources: Optional[SourceIndex] = None,
+                 linker: Optional[Linker] = None):
+        self.entry_dir = Path(entry_dir)
+        self.overwrite = overwrite
+        self.sources = sources if sources is not None else SourceIndex()
+        self.linker = linker if linker is not None else default_linker
+        self.state = DirSnapshot(self.entry_dir)
+        self.ops = []
+        self.desired = set()
+        self.applying = False
+        if not self.state.exists:
+            self.ops.append(("mkdir",))
+
+    def link(self, src: Path, name: str) -> None:
+        self.desired.add(name)
+        src_id = self.sources.identity(src)
+        if src_id is None:
+            self.ops.append(("missing", Path(src), name))
+            return
+        current = self.state.get(name)
+        if current is None:
+            self.ops.append(("link", Path(src), name))
+        elif self.state.identity(name) == src_id or (self._placed_without_hardlink(src_id[0], current)
+                                                     and self.linker.same(src, self.entry_dir / name)):
+            self.ops.append(("skip", name, "unchanged"))
+        elif self.overwrite:
+            self.ops.append(("relink", Path(src), name))
+        else:
+            self.ops.append(("skip", name, "exists"))
+
+    def _placed_without_hardlink(self, src_dev: int, current: tuple) -> bool:
+        """Whether an existing entry may be a symlink/reflink/copy of a source on `src_dev`."""
+        return current[1] or src_dev != self.state.dev or self.linker.strategy(src_dev, self.state.dev) != "hardlink"
+
+    def write(self, name: str, content: Content, label: str, entry: dict) -> None:
+        self.desired.add(name)
+        if self.state.get(name) is not None and not self.overwrite:
+            self.ops.append(("skip", name, "exists"))
+        else:
+            self.ops.append(("write", name, content, label, entry))
+
+    def extract(self, video: Path, name: str) -> None:
+        self.desired.add(name)
+        self.ops.append(("extract", Path(video), name))
+
+    def download(self, url: str, name: str) -> None:
+        self.desired.add(name)
+        if self.state.get(name) is not None and not self.overwrite:
+            self.ops.append(("skip", name, "exists"))
+        else:
+            self.ops.append(("download", url, name))
+
+    def remove_symlinks(self, names: list) -> None:
+        for name in names:
+            info = self.state.get(name)
+            if info is not None and info[1] and name not in self.desired:
+                self.ops.append(("unlink", name, "old symlink"))
+
+    def remove_matching(self, predicate: Callable[[str], bool]) -> None:
+        """Delete existing names accepted by `predicate` that are not desired."""
+        for name, info in sorted(self.state.entries.items()):
+            if name not in self.desired and not info[3] and predicate(name):
+                self.ops.append(("unlink", name, "stale"))
+
+    def present(self, name: str) -> bool:
+        """Whether `name` exists now or will be created by the plan."""
+        if self.state.get(name) is not None:
+            return True
+        if self.applying:
+            return False
+        for op in self.ops:
+            if op[0] == "write" and op[1] == name:
+                return True
+            if op[0] in ("link", "relink", "download") and op[2] == name:
+                return True
+        return False
+
+    def changes(self) -> list:
+        return [op for op in self.ops if op[0] not in ("skip", "missing")]
+
+    def describe(self) -> list:
+        """Human readable operations, used for dry runs."""
+        lines = []
+        for op in self.ops:
+            kind = op[0]
+            if kind == "mkdir":
+                lines.append(f"mkdir   {self.entry_dir}")
+            elif kind in ("link", "relink"):
+                lines.append(f"{kind:<7} {self.entry_dir / op[2]} <- {op[1]}")
+            elif kind == "unlink":
+                lines.append(f"delete  {self.entry_dir / op[1]} ({op[2]})")
+            elif kind == "write":
+                lines.append(f"write   {self.entry_dir / op[1]} (if changed)")
+            elif kind == "extract":
+                lines.append(f"ffmpeg  {self.entry_dir / op[2]} <- {op[1]}")
+            elif kind == "download":
+                lines.append(f"poster  {self.entry_dir / op[2]} <- {op[1]}")
+            elif kind == "missing":
+                lines.append(f"missing {op[1]}")
+        return lines
+
+# === Apply ===
+
+def entry_label(entry: dict) -> str:
+    return entry.get("code") or entry.get("name") or entry.get("title") or "?"
+
+def write_artifact(path: Path, text: str, overwrite: bool, output_dir: Path, entry: dict, label: str) -> bool:
+    """
+    Write a generated file (.nfo, .strm, ...). Identical content is not
+    rewritten, so the mtime stays and Jellyfin does not rescan it; the
+    content hash is recorded in the manifest of the output root.
+
+    Args:
+        path (Path): File to write.
+        text (str): New content.
+        overwrite (bool): Replace an existing file (when its content differs).
+        output_dir (Path): Output root holding the manifest.
+        entry (dict): Catalog entry the file is generated from.
+        label (str): Kind of file, for log messages.
+
+    Returns:
+        bool: True if the file was actually written.
+    """
+    existed = path.exists()
+    if existed and not overwrite:
+        print(f"⏭️ 跳过已有 {label}: {path.name}")
+        return False
+    manifest = manifest_for(output_dir)
+    if manifest.write_text(path, text, inputs=entry, entry=entry_label(entry)):
+        print(f"{'♻️ 覆盖写入' if existed else '📝 写入完成'} {label}: {path.name}")
+        return True
+    print(f"⏸️ 内容未变化 {label}: {path.name}")
+    return False
+
+def _file_state(path: Path) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+@profiled("links.apply")
+def apply_plan(plan: LinkPlan, output_dir: Path, dry_run: bool = False,
+               extractor: Optional[Callable] = None, installer: Optional[Callable] = None) -> None:
+    """
+    Apply a plan.
+
+    Args:
+        plan (LinkPlan): Plan to apply.
+        output_dir (Path): Output root (location of the artifact manifest and change set).
+        dry_run (bool): Only print the operations.
+        extractor (Callable): extractor(video, target) -> (ok, message), for "extract" operations.
+        installer (Callable): installer(url, target) -> (ok, message), for "download" operations.
+
+    The entry directory is recorded in the output root's change set as
+    created or modified when any operation changed it.
+    """
+    if dry_run:
+        for line in plan.describe():
+            print(f"🔍 {line}")
+        return
+
+    entry_dir = plan.entry_dir
+    created = (0, False, True, False)
+    dst_dev = plan.state.dev
+    made = False
+    changed = False
+    plan.applying = True
+
+    def place(src, name):
+        src_id = plan.sources.identity(src)
+        return plan.linker.link(src, entry_dir / name, src_id[0] if src_id else None, dst_dev)
+
+    for op in plan.ops:
+        kind = op[0]
+        if kind == "mkdir":
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            dst_dev = os.stat(entry_dir).st_dev
+            made = True
+        elif kind == "link":
+            try:
+                method = place(op[1], op[2])
+                plan.state.entries[op[2]] = created
+                changed = True
+                print(f"🔗 创建链接 ({method}): {op[2]}")
+            except OSError as e:
+                print(f"⚠️ 创建链接失败: {op[2]} - {e}")
+        elif kind == "relink":
+            target = entry_dir / op[2]
+            try:
+                target.unlink()
+                plan.state.entries.pop(op[2], None)
+                method = place(op[1], op[2])
+                plan.state.entries[op[2]] = created
+                changed = True
+                print(f"♻️ 覆盖链接 ({method}): {op[2]}")
+            except OSError as e:
+                print(f"⚠️ 覆盖链接失败: {op[2]} - {e}")
+        elif kind == "unlink":
+            try:
+                (entry_dir / op[1]).unlink()
+                plan.state.entries.pop(op[1], None)
+                manifest_for(output_dir).forget(entry_dir / op[1])
+                changed = True
+                print(f"🧹 删除{'旧软链接' if op[2] == 'old symlink' else '过期文件'}: {op[1]}")
+            except FileNotFoundError:
+                pass
+        elif kind == "write":
+            _, name, content, label, entry = op
+            text = content() if callable(content) else content
+            changed |= write_artifact(entry_dir / name, text, True, output_dir, entry, label)
+            plan.state.entries[name] = created
+        elif kind == "extract":
+            if extractor is not None:
+                before = _file_state(entry_dir / op[2])
+                ok, message = extractor(op[1], entry_dir / op[2])
+                print(message)
+                if ok:
+                    plan.state.entries[op[2]] = created
+                    changed |= _file_state(entry_dir / op[2]) != before
+        elif kind == "download":
+            if installer is not None:
+                before = _file_state(entry_dir / op[2])
+                ok, message = installer(op[1], entry_dir / op[2])
+                print(message)
+                if ok:
+                    plan.state.entries[op[2]] = created
+                    changed |= _file_state(entry_dir / op[2]) != before
+        elif kind == "skip":
+            print(f"⏭️ 跳过{'（未变化）' if op[2] == 'unchanged' else '已有'}: {op[1]}")
+        elif kind == "missing":
+            print(f"⚠️ 缺失源文件: {op[1]}")
+
+    if made:
+        changes_for(output_dir).created(entry_dir)
+    elif changed:
+        changes_for(output_dir).touched(entry_dir)
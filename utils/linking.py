@@ -0,0 +1,145 @@
+"""
+This module provides the link strategy for placing media in link directories
+"""
+
+import errno
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Optional, Sequence
+
+# Preferred order: zero-copy first, full copy last
+STRATEGIES = ("hardlink", "reflink", "symlink", "copy")
+
+# Errors meaning "this method does not work between these two filesystems"
+# (EINVAL / ENOTTY are what the FICLONE ioctl returns without reflink
+# support); the fallback is remembered for the device pair.
+_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.EINVAL, errno.ENOTTY}
+
+# Errors that may concern a single file (fs.protected_hardlinks, ownership):
+# fall back for that file only.
+_FILE_REFUSED = {errno.EPERM, errno.EACCES}
+
+# ioctl request to clone a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+def _hardlink(src: Path, dst: Path) -> None:
+    os.link(src, dst)
+
+def _reflink(src: Path, dst: Path) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported on this platform")
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+    st = os.stat(src)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def _symlink(src: Path, dst: Path) -> None:
+    os.symlink(src, dst)
+
+def _copy(src: Path, dst: Path) -> None:
+    shutil.copy2(src, dst)
+
+_METHODS = {"hardlink": _hardlink, "reflink": _reflink, "symlink": _symlink, "copy": _copy}
+
+class Linker:
+    """
+    Places source files into link directories with the cheapest method the
+    filesystems allow.
+
+    The method is decided once per (source device, target device) pair:
+    the first file linked between two devices probes the strategies in
+    order, and the one that works is reused for every later file of that
+    pair. A hard link between different devices is never attempted. A
+    method refused for one file only (EPERM, EACCES) is skipped for that
+    file without changing the method of the pair.
+
+    Args:
+        strategies (Sequence[str]): Allowed methods, in order of preference.
+    """
+
+    def __init__(self, strategies: Sequence[str] = STRATEGIES):
+        for name in strategies:
+            if name not in _METHODS:
+                raise ValueError(f"Unknown link strategy: {name}")
+        self.strategies = tuple(strategies)
+        self.pairs = {}
+        self.lock = threading.Lock()
+
+    def strategy(self, src_dev: int, dst_dev: int) -> Optional[str]:
+        """Method chosen for a device pair, or None if not probed yet."""
+        with self.lock:
+            return self.pairs.get((src_dev, dst_dev))
+
+    def _candidates(self, src_dev: int, dst_dev: int) -> list:
+        candidates = [s for s in self.strategies if s != "hardlink" or src_dev == dst_dev]
+        known = self.strategy(src_dev, dst_dev)
+        if known is not None:
+            # Start at the known method; fall further back only if it stops working
+            return candidates[candidates.index(known):]
+        return candidates
+
+    def link(self, src: Path, dst: Path, src_dev: Optional[int] = None, dst_dev: Optional[int] = None) -> str:
+        """
+        Place `src` at `dst` (which must not exist).
+
+        Args:
+            src (Path): Source file.
+            dst (Path): Target path inside a link directory.
+            src_dev (int, optional): Device of the source, if already known.
+            dst_dev (int, optional): Device of the target directory, if already known.
+
+        Returns:
+            str: Method used.
+
+        Raises:
+            OSError: When no allowed method works.
+        """
+        if src_dev is None:
+            src_dev = os.stat(src).st_dev
+        if dst_dev is None:
+            dst_dev = os.stat(Path(dst).parent).st_dev
+        last_error = None
+        file_only = False
+        for name in self._candidates(src_dev, dst_dev):
+            try:
+                _METHODS[name](src, dst)
+            except OSError as e:
+                if e.errno in _FILE_REFUSED:
+                    file_only = True
+                elif e.errno not in _UNSUPPORTED:
+                    raise
+                last_error = e
+                continue
+            if not file_only:
+                with self.lock:
+                    self.pairs[(src_dev, dst_dev)] = name
+            return name
+        raise last_error or OSError(errno.EXDEV, "no link strategy available", str(dst))
+
+    def same(self, src: Path, dst: Path) -> bool:
+        """
+        Whether `dst` already holds `src` as placed by a non-hardlink method:
+        a symlink to it, or a copy/reflink with the same size and mtime.
+        """
+        try:
+            if os.path.islink(dst):
+                return os.readlink(dst) == str(src)
+            s, d = os.stat(src), os.stat(dst)
+        except OSError:
+            return False
+        return s.st_size == d.st_size and s.st_mtime_ns == d.st_mtime_ns
+
+    def report(self) -> dict:
+        with self.lock:
+            return {f"{a}->{b}": name for (a, b), name in self.pairs.items()}
+
+default_linker = Linker()
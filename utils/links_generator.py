@@ -1,52 +1,176 @@
+import io
 import json
 from pathlib import Path
 import os
 import re
-
-def smart_numeric_sort_key(name: str):
-    base = Path(name).stem
-
-    # 1. 括号内的数字 → 最高优先级
-    paren_match = re.search(r'\((\d+)\)', base)
-    if paren_match:
-        return int(paren_match.group(1))
-
-    # 2. 纯数字开头（没有括号）→ 第二优先级
-    pure_number_match = re.fullmatch(r'\d+', base)
-    if pure_number_match:
-        return int(pure_number_match.group(0))
-
-    # 3. 字母+数字（如 DSC089731）→ 提取数字部分
-    tail_number_match = re.search(r'(\d+)', base)
-    if tail_number_match:
-        return int(tail_number_match.group(1))
-
-    # 4. fallback → 字母排序
-    # return base.lower()
-    raise ValueError(f"Unrecognized image filename format: {name}")
-
-def convert_png_to_jpg(png_path: Path, jpg_path: Path):
+import sys
+import threading
+import time
+
+from changes import changes_for
+from link_gc import reconcile_link_dirs
+from image_inspect import select_poster
+from link_plan import LinkPlan, SourceIndex, apply_plan, entry_label
+from manifest import manifest_for
+from metadata import save_metadata
+from natsort import album_order, ensure_album_order
+from nfo import movie_nfo, person_nfo, photoalbum_nfo
+from profiling import count, profile_session, profiled, stage
+from sidecar import SidecarResolver, sidecar_suffix
+
+def convert_png_to_jpg(png_path: Path, jpg_path: Path, max_size=None):
     """
-    将 PNG 文件转换为 JPG 文件，使用 Pillow。
-    :param png_path: PNG 文件路径
+    将 PNG/WebP 等图片转换为 JPG 文件，使用 Pillow。
+    批量转换（一组 poster）请使用 images.transcode_batch。
+    :param png_path: 源图片路径
     :param jpg_path: JPG 输出文件路径
+    :param max_size: 可选的 (宽, 高) 上限，例如 images.SIZES["poster"]
     """
-    from PIL import Image
+    from images import transcode_image
     if not png_path.exists():
         print(f"❌ 源文件不存在: {png_path}")
         return
     try:
-        image = Image.open(png_path).convert("RGB")
-        jpg_path.parent.mkdir(parents=True, exist_ok=True)
-        image.save(jpg_path, format="JPEG", quality=90)
+        transcode_image(png_path, jpg_path, max_size)
         print(f"✅ PNG 转 JPG 成功: {jpg_path}")
     except Exception as e:
         print(f"❌ 转换失败: {e}")
 
-def media_entry_generator(entries, base_output_dir, entry_type="video", overwrite=False):
-    handler = get_handler_by_type(entry_type)
-    for entry in entries:
-        handler(entry, base_output_dir, overwrite)
+class _ThreadLocalStdout:
+    """
+    stdout 代理：线程设置了缓冲区时写入缓冲区，否则写入原始 stdout。
+    用于并行生成时按条目收集日志，避免多个线程的输出交错。
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_entry(handler, entry, base_output_dir, overwrite, capture=None) -> dict:
+    """
+    执行单个条目的 handler，返回结构化结果。
+    :param capture: _ThreadLocalStdout 实例；提供时把该条目的输出收集到结果的 log 中
+    :return: {"entry", "status", "error", "elapsed", "log", "changed"}
+    """
+    start = time.perf_counter()
+    result = {"entry": entry_label(entry), "status": "ok", "error": None, "elapsed": 0.0, "log": []}
+    before = len(manifest_for(base_output_dir).changed(result["entry"]))
+    buffer = io.StringIO() if capture is not None else None
+    if capture is not None:
+        capture.local.buffer = buffer
+    try:
+        with stage("links.entry"):
+            handler(entry, base_output_dir, overwrite)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        count("links.entry_errors")
+    finally:
+        if capture is not None:
+            capture.local.buffer = None
+            result["log"] = buffer.getvalue().splitlines()
+        result["elapsed"] = time.perf_counter() - start
+    result["changed"] = manifest_for(base_output_dir).changed(result["entry"])[before:]
+    return result
+
+
+def media_entry_generator(entries, base_output_dir, entry_type="video", overwrite=False, poster_workers=8,
+                          workers=1, ffmpeg_workers=2, ffmpeg_timeout=60, verbose=False, dry_run=False):
+    """
+    为每个条目生成 Jellyfin 链接目录。
+    每个条目先扫描一次目标目录并生成操作计划（创建/替换/删除），再批量执行。
+    :param workers: I/O 线程数；大于 1 时并行处理条目，每个条目的输出被收集到结果中
+    :param ffmpeg_workers: 同时运行的 ffmpeg 进程上限（仅视频）
+    :param ffmpeg_timeout: 单个 ffmpeg 截图任务的超时（秒）
+    :param verbose: 并行模式下是否打印每个条目的完整日志
+    :param dry_run: 只打印计划中的操作，不修改文件
+    :return: 每个条目的结构化结果列表
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+
+    entries = list(entries)
+    # 同一次运行共享源目录快照，每个源目录只列一次
+    sources = SourceIndex()
+    handler = partial(get_handler_by_type(entry_type), dry_run=dry_run, sources=sources)
+    if entry_type == "video":
+        # 封面/字幕等在内存中按视频名查找，复用同一份源目录快照
+        handler = partial(handler, sidecars=SidecarResolver(sources=sources))
+    if entry_type == "model" and not dry_run:
+        # 先并发下载所有人物 poster，再逐个生成目录
+        from poster_fetcher import PosterCache, fetch_posters
+        cache = PosterCache(Path(base_output_dir) / ".poster_cache")
+        urls = [e.get("poster_url") or e.get("poster") for e in entries]
+        posters = fetch_posters(urls, cache, workers=poster_workers, refresh=overwrite)
+        handler = partial(handler, posters=posters)
+    if entry_type == "album" and not dry_run:
+        # PNG/WebP 封面图在一个进程池批量中转换为 JPEG，按内容哈希缓存
+        posters = convert_album_posters(entries, Path(base_output_dir) / ".image_cache")
+        handler = partial(handler, posters=posters)
+
+    frames = None
+    if entry_type == "video" and not dry_run:
+        # ffmpeg 截图交给独立的有界进程池，结果按源视频缓存
+        from frame_extractor import FrameExtractor
+        frames = FrameExtractor(Path(base_output_dir) / ".frame_cache", workers=ffmpeg_workers,
+                                timeout=ffmpeg_timeout)
+        handler = partial(handler, frames=frames)
+
+    if workers <= 1:
+        try:
+            results = [run_entry(handler, entry, base_output_dir, overwrite) for entry in entries]
+        finally:
+            if frames is not None:
+                frames.close()
+    else:
+        original_stdout = sys.stdout
+        capture = sys.stdout = _ThreadLocalStdout(original_stdout)
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="links") as executor:
+                futures = [executor.submit(run_entry, handler, entry, base_output_dir, overwrite, capture)
+                           for entry in entries]
+                for n, future in enumerate(futures, 1):
+                    result = future.result()
+                    results.append(result)
+                    mark = "✅" if result["status"] == "ok" else "❌"
+                    print(f"{mark} [{n}/{len(entries)}] {result['entry']} ({result['elapsed']:.2f}s)"
+                          + (f" - {result['error']}" if result["error"] else ""))
+                    if verbose:
+                        for line in result["log"]:
+                            print(f"    {line}")
+        finally:
+            sys.stdout = original_stdout
+            if frames is not None:
+                frames.close()
+
+    if not dry_run:
+        manifest_for(base_output_dir).save()
+        change_set = changes_for(base_output_dir)
+        change_set.save()
+        print(f"📋 待 Jellyfin 刷新的目录: {len(change_set.pending())}（{change_set.file}）")
+    failed = [r for r in results if r["status"] != "ok"]
+    changed = [r for r in results if r["changed"]]
+    print(f"完成 {len(results)} 个条目，变更 {len(changed)} 个，失败 {len(failed)} 个")
+    for r in changed:
+        print(f"✏️ {r['entry']}: {', '.join(r['changed'])}")
+    for r in failed:
+        print(f"❌ {r['entry']}: {r['error']}")
+    return results
 
 
 def get_handler_by_type(entry_type):
@@ -60,230 +184,148 @@ def get_handler_by_type(entry_type):
         raise ValueError(f"不支持的 entry_type: {entry_type}")
 
 
+# 相册内按顺序编号的图片名，例如 001.jpg
+ALBUM_IMAGE_NAME = re.compile(r"\d{3}\.[A-Za-z0-9]+")
+
+
+def entry_dir_name(entry, entry_type):
+    """
+    条目在输出目录中的目录名；无法确定时返回 None。
+    """
+    import unicodedata
+
+    if entry_type == "model":
+        name = entry.get("name")
+        return unicodedata.normalize("NFC", name) if name else None
+    code = unicodedata.normalize("NFC", entry.get("code") or "")
+    title = unicodedata.normalize("NFC", entry.get("title") or "")
+    if entry_type == "album":
+        model = entry.get("model", "")
+        if isinstance(model, list):
+            model = ", ".join(model)
+        model = unicodedata.normalize("NFC", model or "")
+        return f"{model} - {title} - {code}".strip()
+    if not code:
+        return None
+    return f"{code} - {title}".strip()
+
+
+def prune_link_dirs(entries, base_output_dir, entry_type="video", dry_run=True, quarantine=True, force=False):
+    """
+    删除（或移入隔离区）目录名已不在 catalog 中的旧条目目录，例如 code/title 修改后留下的目录。
+    :param dry_run: 只报告，不修改
+    :param quarantine: 移到 <output>/.quarantine/<时间戳>/ 而不是直接删除
+    :param force: 允许一次删除超过一半的目录
+    :return: reconcile_link_dirs 的报告
+    """
+    expected = {entry_dir_name(entry, entry_type) for entry in entries}
+    expected.discard(None)
+    return reconcile_link_dirs(Path(base_output_dir), expected, dry_run=dry_run, quarantine=quarantine,
+                               max_ratio=1.0 if force else 0.5)
+
+
+# 可以直接链接为 poster.jpg 的图片格式
+JPEG_SUFFIXES = {".jpg", ".jpeg"}
+
+
+def album_poster_source(entry, verbose=True):
+    """
+    相册的封面图：优先取标记为 poster 的图片，否则按尺寸/方向自动选图（无尺寸信息时为第一张图）。
+    :return: 源图片路径；没有可用图片时返回 None
+    """
+    imgs = entry.get("imgs", {})
+    for fname, meta in imgs.items():
+        if isinstance(meta, dict) and meta.get("poster") is True:
+            return Path(meta.get("path"))
+
+    if imgs:
+        chosen = select_poster(entry)
+        chosen_path = imgs[chosen].get("path") if isinstance(imgs.get(chosen), dict) else imgs.get(chosen)
+        if isinstance(chosen_path, (str, bytes, os.PathLike)):
+            if verbose:
+                print(f"📌 自动选用 poster: {chosen_path}")
+            return Path(chosen_path)
+    return None
+
+
+def convert_album_posters(entries, cache_dir, workers=None):
+    """
+    把所有相册中非 JPEG（PNG/WebP 等）的封面图一次性批量转换为 poster 尺寸的 JPEG。
+    :return: {源图片路径: 转换后的 JPEG 路径}；转换失败的图片不在其中
+    """
+    from images import ImageCache, transcode_batch
+
+    sources = []
+    for entry in entries:
+        source = album_poster_source(entry, verbose=False)
+        if source is not None and source.suffix.lower() not in JPEG_SUFFIXES:
+            sources.append(source)
+    if not sources:
+        return {}
+    results = transcode_batch(sources, ImageCache(cache_dir), ("poster",), workers=workers)
+    return {source: outputs["poster"] for source, outputs in results.items() if outputs}
+
+
 # 专辑/相册类型处理
-def handle_album_entry(entry, output_dir, overwrite):
-    import shutil
+@profiled("links.plan.album")
+def plan_album_entry(entry, output_dir, overwrite, sources=None, posters=None) -> LinkPlan:
+    """
+    :param posters: convert_album_posters 的结果；非 JPEG 封面图链接其转换后的 JPEG
+    """
     import unicodedata
 
     code = entry.get("code", "")
     title = entry.get("title", "")
     code = unicodedata.normalize("NFC", code)
     title = unicodedata.normalize("NFC", title or "")
-    model = entry.get("model", "")
-    if isinstance(model, list):
-        model = ", ".join(model)
-    model = unicodedata.normalize("NFC", model or "")
     base_name = code
-    dir_name = f"{model} - {title} - {code}".strip()
+    dir_name = entry_dir_name(entry, "album")
     entry_dir = output_dir / dir_name
-    entry_dir.mkdir(parents=True, exist_ok=True)
+    plan = LinkPlan(entry_dir, overwrite, sources)
 
-    # 处理图片软链接
+    # 处理图片链接（顺序优先取 metadata 中缓存的 order）
     imgs = entry.get("imgs", {})
     sorted_items = []
-    for fname, meta in imgs.items():
-        try:
-            sort_key = smart_numeric_sort_key(fname)
-            path_str = meta["path"] if isinstance(meta, dict) and "path" in meta else meta
-            sorted_items.append((sort_key, fname, path_str))
-        except (ValueError, KeyError, TypeError) as e:
-            print(f"⚠️ 跳过无法排序或无效的文件: {fname} - {e}")
-    sorted_items.sort()
-    for i, (_, fname, src_path) in enumerate(sorted_items, 1):
-        if isinstance(src_path, dict):
-            actual_src_path = src_path.get("path")
-        else:
-            actual_src_path = src_path
-        if not isinstance(actual_src_path, (str, bytes, os.PathLike)):
-            print(f"⚠️ 非法路径类型，跳过: {fname} - {actual_src_path}")
+    for fname in album_order(entry):
+        meta = imgs[fname]
+        sorted_items.append((fname, meta.get("path") if isinstance(meta, dict) else meta))
+    for i, (fname, src_path) in enumerate(sorted_items, 1):
+        if not isinstance(src_path, (str, bytes, os.PathLike)):
+            print(f"⚠️ 非法路径类型，跳过: {fname} - {src_path}")
             continue
-        src = Path(actual_src_path)
-        if not src.exists():
-            print(f"⚠️ 缺失图片文件: {actual_src_path}")
-            continue
-        target_name = f"{i:03d}{Path(fname).suffix.lower()}"
-        link_path = entry_dir / target_name
-        if link_path.exists():
-            if overwrite and not link_path.is_file():
-                link_path.unlink()
-                os.link(src, link_path)
-                print(f"♻️ 覆盖软链接: {link_path.name}")
-            else:
-                print(f"⏭️ 已存在，跳过: {link_path.name}")
-        else:
-            os.link(src, link_path)
-            print(f"🔗 创建软链接: {link_path.name}")
-
-    # 处理封面 poster
-    poster_source = None
-    for fname, meta in imgs.items():
-        if isinstance(meta, dict) and meta.get("poster") is True:
-            poster_source = Path(meta.get("path"))
-            break
-
-    # 如果所有 imgs 的 poster 都是 false，则选第一个图作为临时 poster
-    if not poster_source and sorted_items:
-        first_src_path = sorted_items[0][2]
-        if isinstance(first_src_path, dict):
-            first_src_path = first_src_path.get("path")
-        if isinstance(first_src_path, (str, bytes, os.PathLike)):
-            poster_source = Path(first_src_path)
-            print(f"📌 自动选用第一张图作为 poster: {poster_source}")
-    
-    poster_target = entry_dir / "poster.jpg"
+        plan.link(Path(src_path), f"{i:03d}{Path(fname).suffix.lower()}")
+
+    # 相册图片减少时删除多余的编号图片
+    plan.remove_matching(lambda name: ALBUM_IMAGE_NAME.fullmatch(name) is not None)
+
+    # 处理封面 poster（标记的图片，或自动选图）
+    poster_source = album_poster_source(entry) if sorted_items else None
+    if poster_source and poster_source.suffix.lower() not in JPEG_SUFFIXES and posters:
+        converted = posters.get(str(poster_source))
+        if converted is not None:
+            poster_source = converted
+
     if poster_source:
-        if poster_source.exists():
-            if poster_target.exists():
-                if overwrite:
-                    poster_target.unlink()
-                    os.link(poster_source, poster_target)
-                    print(f"♻️ 覆盖写入 poster.jpg")
-                else:
-                    print(f"⏭️ 跳过已有 poster.jpg")
-            else:
-                if poster_target.exists():
-                    poster_target.unlink()
-                os.link(poster_source, poster_target)
-                print(f"✅ poster.jpg 写入完成")
-        else:
-            print(f"⚠️ 指定的 poster 文件不存在: {poster_source}")
+        plan.link(poster_source, "poster.jpg")
     else:
         print("⚠️ 未指定 poster 或未找到对应图")
 
-    # 写入 .nfo
-    nfo_path = entry_dir / f"{base_name}.nfo"
-    description = entry.get("description", "").strip()
-    models = entry.get("model")
-    if isinstance(models, str):
-        models = [models]
-    keywords = entry.get("keywords") or []
-    if isinstance(keywords, str):
-        keywords = [keywords]
-    studio = entry.get("studio", "")
-    nfo_lines = [
-        "<photoalbum>",
-        f"  <title>{title}</title>",
-        f"  <originaltitle>{code}</originaltitle>",
-        f"  <plot>{description}</plot>",
-        f"  <studio>{studio}</studio>",
-    ]
-    for kw in keywords:
-        nfo_lines.append(f"  <tag>{kw.strip()}</tag>")
-    for m in models:
-        nfo_lines.extend([
-            "  <actor>",
-            f"    <name>{m}</name>",
-            f"    <role>Model</role>",
-            "  </actor>"
-        ])
-    if Path(entry_dir / "poster.jpg").exists():
-        nfo_lines.append("  <thumb>poster.jpg</thumb>")
-    nfo_lines.append(f"  <id>{code}</id>")
-    nfo_lines.append("</photoalbum>")
-
-    if nfo_path.exists():
-        if overwrite and not nfo_path.is_file():
-            nfo_path.unlink()
-        with nfo_path.open("w", encoding="utf-8") as f:
-            f.write("\n".join(nfo_lines))
-            print(f"♻️ 覆盖写入 album nfo: {nfo_path.name}")
-    else:
-        with nfo_path.open("w", encoding="utf-8") as f:
-            f.write("\n".join(nfo_lines))
-            print(f"📝 album nfo 写入完成: {nfo_path.name}")
+    # 写入 .nfo（执行时生成，thumb 取决于 poster 是否已就绪）
+    def render_nfo():
+        return photoalbum_nfo(dict(entry, code=code, title=title), thumb=plan.present("poster.jpg"))
 
+    plan.write(f"{base_name}.nfo", render_nfo, "album nfo", entry)
+    return plan
 
-def generate_movie_nfo_lines(entry: dict) -> list[str]:
-    from datetime import datetime
-    today = datetime.today().strftime('%Y-%m-%d')
 
-    code = entry.get("code", "")
-    title = entry.get("title", "")
-    description = entry.get("description", "").strip()
-    series = code.split("-")[0] if isinstance(code, str) and "-" in code else (code or "")
-    models = entry.get("model") or []
-    keywords = entry.get("keywords") or []
-
-    if isinstance(models, str):
-        models = [models]
-    if isinstance(keywords, str):
-        keywords = [keywords]
-
-    nfo_lines = [
-        "<movie>",
-        f"  <title>{code} - {title}</title>",
-        f"  <originaltitle>{code}</originaltitle>",
-        f"  <sorttitle>{code}</sorttitle>",
-        f"  <plot>{description}</plot>",
-        f"  <outline>{description}</outline>",
-        f"  <premiered>{today}</premiered>",
-        f"  <dateadded>{today}</dateadded>",
-        f"  <tag>{series}</tag>",
-    ]
-
-    optional_fields = {
-        "tagline": entry.get("tagline"),
-        "runtime": entry.get("runtime"),
-        "year": entry.get("year"),
-        "director": entry.get("director"),
-        "credits": entry.get("credits"),
-        "writer": entry.get("writer"),
-        "country": entry.get("country"),
-        "countrycode": entry.get("countrycode"),
-        "language": entry.get("language"),
-        "rating": entry.get("rating"),
-        "aspectratio": entry.get("aspectratio"),
-    }
-
-    for tag, value in optional_fields.items():
-        if value:
-            nfo_lines.append(f"  <{tag}>{value}</{tag}>")
-
-    for kw in keywords:
-        if kw:
-            nfo_lines.append(f"  <genre>{kw}</genre>")
-
-    for name in models:
-        if name:
-            nfo_lines.extend([
-                "  <actor>",
-                f"    <name>{name}</name>",
-                f"    <role>Model</role>",
-                "  </actor>"
-            ])
-
-    studios = entry.get("studio")
-    if studios:
-        if isinstance(studios, str):
-            studios = [studios]
-        for s in studios:
-            if s:
-                nfo_lines.append(f"  <studio>{s}</studio>")
-                nfo_lines.append(f"  <genre>{s}</genre>")
-    
-    
-    prefix = code.split("-")[0] if "-" in code else ""
-    if prefix:
-        if prefix != series:
-            nfo_lines.append(f"  <tag>{prefix}</tag>")
-        nfo_lines.append(f"  <tag>{prefix}</tag>")
-        nfo_lines.append(f"  <genre>{prefix}</genre>")
-
-    if entry.get("thumb") == "poster.jpg":
-        nfo_lines.append("  <thumb>poster.jpg</thumb>")
-
-    nfo_lines.extend([
-        f"  <uniqueid type=\"manual\">{code}</uniqueid>",
-        f"  <id>{code}</id>",
-        "  <lockdata>true</lockdata>",
-        "</movie>"
-    ])
-    return nfo_lines
-
-
-def handle_video_entry(entry, output_dir, overwrite):
+def handle_album_entry(entry, output_dir, overwrite, dry_run=False, sources=None, posters=None):
+    plan = plan_album_entry(entry, output_dir, overwrite, sources, posters)
+    apply_plan(plan, output_dir, dry_run)
+
+
+@profiled("links.plan.video")
+def plan_video_entry(entry, output_dir, overwrite, sources=None, sidecars=None):
     import unicodedata
-    import shutil
 
     VOLUME_PREFIX = "/Volumes/PRIVATE_COLLECTION/"
     MOUNT_PREFIX = "/mnt/nas/"
@@ -296,237 +338,136 @@ def handle_video_entry(entry, output_dir, overwrite):
     check_path = Path(raw_path) if raw_path else None
     video_path = raw_path.replace(VOLUME_PREFIX, MOUNT_PREFIX) if raw_path else None
 
-    poster = entry.get("poster")
     if not video_path:
         print(f"跳过无效条目: {entry}")
-        return
+        return None
+
+    sources = sources if sources is not None else SourceIndex()
+    sidecars = sidecars if sidecars is not None else SidecarResolver(sources=sources)
+    if not sources.exists(check_path):
+        print(f"❌ 源视频文件不存在（原始路径）: {check_path}")
+        return None
 
     base_name = code
-    dir_name = f"{code} - {title}".strip()
+    dir_name = entry_dir_name(entry, "video")
     entry_dir = output_dir / dir_name
-    entry_dir.mkdir(parents=True, exist_ok=True)
+    plan = LinkPlan(entry_dir, overwrite, sources)
 
     # 删除旧软链接文件
-    for ext in [".mp4", ".avi", ".mov", ".mkv"]:
-        old_link = entry_dir / f"{base_name}{ext}"
-        if old_link.exists() and old_link.is_symlink():
-            old_link.unlink()
-            print(f"🧹 删除旧软链接: {old_link.name}")
+    plan.remove_symlinks([f"{base_name}{ext}" for ext in [".mp4", ".avi", ".mov", ".mkv"]])
 
     # .strm 文件
     video_target = Path(video_path)
-    strm_path = entry_dir / f"{base_name}.strm"
-    if not check_path or not check_path.exists():
-        print(f"❌ 源视频文件不存在（原始路径）: {check_path}")
-        return
-    if strm_path.exists():
-        if overwrite:
-            if not strm_path.is_file():
-                strm_path.unlink()
-            with strm_path.open("w", encoding="utf-8") as f:
-                f.write(str(video_target))
-            print(f"♻️ 覆盖写入 .strm: {strm_path.name}")
-        else:
-            print(f"⏭️ 跳过已有 .strm: {strm_path.name}")
-    else:
-        with strm_path.open("w", encoding="utf-8") as f:
-            f.write(str(video_target))
-        print(f"✅ .strm 文件创建: {strm_path.name} → {video_target}")
+    plan.write(f"{base_name}.strm", str(video_target), ".strm", entry)
 
-    # poster 硬链接或复制
+    # poster 硬链接：先用条目指定的 poster，否则按命名规则在源目录快照中查找（不逐个 stat）
     poster_raw = entry.get("poster")
     print(f"🎯 poster_raw (原始): {poster_raw}")
+    found = sidecars.sidecars(check_path)
     poster_source = None
     if poster_raw:
         check_poster = Path(poster_raw)
-        if check_poster.exists():
+        if sources.exists(check_poster):
             poster_source = check_poster
-        else:
+        elif check_poster.parent != check_path.parent or not check_poster.suffix:
             parent_dir = check_poster.parent if check_poster.suffix else check_poster
-            for ext in [".jpg", ".jpeg", ".JPG", ".JPEG"]:
-                candidate = parent_dir / f"poster{ext}"
-                if candidate.exists():
-                    poster_source = candidate
-                    break
+            poster_source = sidecars.find(parent_dir / check_path.name, "poster")
+    if poster_source is None:
+        poster_source = (found.get("cover") or found.get("poster") or [None])[0]
     print(f"🎯 poster_source (确定路径): {poster_source}")
-    poster_link = entry_dir / "poster.jpg"
-    if poster_source and poster_source.exists():
-        if poster_link.exists():
-            if overwrite:
-                try:
-                    poster_link.unlink()
-                except Exception as e:
-                    print(f"⚠️ 无法删除旧 poster 文件: {e}")
-                try:
-                    os.link(poster_source, poster_link)
-                    print(f"♻️ 覆盖写入 poster: {poster_link.name}")
-                except FileExistsError:
-                    print(f"⚠️ poster 覆盖失败，目标已存在: {poster_link}")
-            else:
-                print(f"⏭️ 跳过已有 poster: {poster_link.name}")
-        else:
-            try:
-                os.link(poster_source, poster_link)
-                print(f"✅ 创建 poster 链接: {poster_link.name}")
-            except Exception as e:
-                print(f"⚠️ 创建 poster 链接失败: {e}")
+    if poster_source:
+        plan.link(poster_source, "poster.jpg")
+    elif plan.present("poster.jpg") and not overwrite:
+        print("⏭️ 跳过已有 poster: poster.jpg")
     else:
         print(f"⚠️ 找不到 poster（尝试 jpg/jpeg 均失败）: {poster_raw}")
         # 使用 ffmpeg 从视频中截取封面图像
-        poster_candidate = entry_dir / "poster.jpg"
-        try:
-            import subprocess
-            result = subprocess.run([
-                "ffmpeg",
-                "-y",  # overwrite output file if it exists
-                "-ss", "00:00:37",  # seek to 37 seconds
-                "-i", str(video_target),
-                "-frames:v", "1",
-                "-q:v", "2",
-                str(poster_candidate)
-            ], capture_output=True, text=True)
-            if result.returncode == 0 and poster_candidate.exists():
-                print(f"🎞️ 自动从视频生成 poster: {poster_candidate.name}")
-            else:
-                print(f"⚠️ ffmpeg 截图失败: {result.stderr}")
-        except Exception as e:
-            print(f"❌ 自动生成 poster 失败: {e}")
-
-    # nfo 文件
-    nfo_path = entry_dir / f"{base_name}.nfo"
-    # 生成 nfo_lines，自动判断 poster.jpg 是否存在
-    nfo_entry = dict(entry)
-    if (entry_dir / "poster.jpg").exists():
-        nfo_entry["thumb"] = "poster.jpg"
-    nfo_lines = generate_movie_nfo_lines(nfo_entry)
-
-    if nfo_path.exists():
-        if overwrite:
-            if not nfo_path.is_file():
-                nfo_path.unlink()
-            with nfo_path.open("w", encoding="utf-8") as f:
-                f.write("\n".join(nfo_lines))
-            print(f"♻️ 覆盖写入 nfo: {nfo_path.name}")
-        else:
-            print(f"⏭️ 跳过已有 nfo: {nfo_path.name}")
-    else:
-        with nfo_path.open("w", encoding="utf-8") as f:
-            f.write("\n".join(nfo_lines))
-        print(f"📝 nfo 生成完成: {nfo_path.name}")
+        plan.extract(video_target, "poster.jpg")
+
+    # 背景图和外挂字幕随视频一起链接，字幕按 <code>.<语言>.srt 命名
+    if found.get("fanart"):
+        plan.link(found["fanart"][0], "fanart.jpg")
+    for subtitle in found.get("subtitle", []):
+        plan.link(subtitle, f"{base_name}{sidecar_suffix(check_path, subtitle)}")
+
+    # nfo 文件（执行时生成，thumb 取决于 poster 是否已就绪）
+    def render_nfo():
+        nfo_entry = dict(entry)
+        if not nfo_entry.get("dateadded"):
+            # 使用源文件的修改日期，保证重复生成时 nfo 内容稳定
+            from datetime import datetime
+            nfo_entry["dateadded"] = datetime.fromtimestamp(check_path.stat().st_mtime).strftime('%Y-%m-%d')
+        if plan.present("poster.jpg"):
+            nfo_entry["thumb"] = "poster.jpg"
+        return movie_nfo(nfo_entry)
+
+    plan.write(f"{base_name}.nfo", render_nfo, "nfo", entry)
+    return plan
+
+
+def handle_video_entry(entry, output_dir, overwrite, frames=None, dry_run=False, sources=None, sidecars=None):
+    """
+    :param frames: 共享的 FrameExtractor；未提供时为该条目单独创建
+    :param sidecars: 共享的 SidecarResolver；未提供时为该条目单独创建
+    """
+    plan = plan_video_entry(entry, output_dir, overwrite, sources, sidecars)
+    if plan is None:
+        return
 
-def handle_model_entry(entry, output_dir, overwrite):
+    if frames is not None or dry_run:
+        apply_plan(plan, output_dir, dry_run, extractor=frames.extract if frames else None)
+        return
+    from frame_extractor import FrameExtractor
+    with FrameExtractor(output_dir / ".frame_cache", workers=1) as frames:
+        apply_plan(plan, output_dir, dry_run, extractor=frames.extract)
+
+@profiled("links.plan.model")
+def plan_model_entry(entry, output_dir, overwrite, sources=None):
     import unicodedata
-    import requests
-    from PIL import Image
-    from io import BytesIO
 
     name = entry.get("name")
     if not name:
         print("⚠️ 跳过无名人物 entry")
-        return
+        return None
     name = unicodedata.normalize("NFC", name)
     model_dir = output_dir / name
-    model_dir.mkdir(parents=True, exist_ok=True)
+    plan = LinkPlan(model_dir, overwrite, sources)
 
-    # 下载 poster
+    # 下载 poster（执行时优先使用 media_entry_generator 预先并发下载的缓存）
     poster_url = entry.get("poster_url") or entry.get("poster")
-    poster_path = model_dir / "poster.jpg"
     if poster_url:
-        if poster_path.exists():
-            if overwrite:
-                if not poster_path.is_file():
-                    poster_path.unlink()
-                try:
-                    response = requests.get(poster_url, timeout=10)
-                    response.raise_for_status()
-                    image = Image.open(BytesIO(response.content)).convert("RGB")
-                    image.save(poster_path, format="JPEG", quality=90)
-                    print(f"♻️ 覆盖写入 poster: {poster_path}")
-                except Exception as e:
-                    print(f"❌ 下载 poster 失败: {e}")
-            else:
-                print(f"⏭️ 跳过已有 poster: {poster_path.name}")
-        else:
-            try:
-                response = requests.get(poster_url, timeout=10)
-                response.raise_for_status()
-                image = Image.open(BytesIO(response.content)).convert("RGB")
-                image.save(poster_path, format="JPEG", quality=90)
-                print(f"✅ 下载 poster 成功: {poster_path}")
-            except Exception as e:
-                print(f"❌ 下载 poster 失败: {e}")
+        plan.download(poster_url, "poster.jpg")
     else:
         print("⚠️ 无 poster_url 提供")
 
-    # 写入 nfo
-    nfo_path = model_dir / f"{name}.nfo"
-    nfo_lines = ["<person>"]
-    nfo_lines.append(f"  <name>{name}</name>")
-    nfo_lines.append(f"  <type>actor</type>")
+    # 写入 nfo（执行时生成，image 取决于 poster 是否已就绪）
+    def render_nfo():
+        return person_nfo(dict(entry, name=name), image=plan.present("poster.jpg"))
 
-    known_keys = {"name", "type", "poster", "poster_url"}
-    extra_lines = []
+    plan.write(f"{name}.nfo", render_nfo, "model nfo", entry)
+    return plan
 
-    for key, value in entry.items():
-        if key in known_keys:
-            continue
-        if key == "age":
-            try:
-                birthyear = int(value)
-                birthyear = 2025 - birthyear if birthyear < 1900 else birthyear
-                nfo_lines.append(f"  <birthyear>{birthyear}</birthyear>")
-            except:
-                continue
-        elif key == "studio" and isinstance(value, list):
-            for studio in value:
-                nfo_lines.append(f"  <studio>{studio}</studio>")
-        elif key == "real_name" and isinstance(value, list):
-            for aka in value:
-                nfo_lines.append(f"  <aka>{aka}</aka>")
-        elif key == "SNS" and isinstance(value, list):
-            for url in value:
-                nfo_lines.append(f"  <socials>{url}</socials>")
-        elif key.endswith("_score") and isinstance(value, (int, float)):
-            nfo_lines.append(f"  <tag>{key}:{value}</tag>")
-        elif key == "figure":
-            extra_lines.append(f"Figure: {value}")
-        elif key in {"description", "comments", "overview"} and isinstance(value, str) and value.strip():
-            extra_lines.append(value.strip())
-        else:
-            # catch-all for unexpected fields
-            if isinstance(value, list):
-                for v in value:
-                    extra_lines.append(f"{key}: {v}")
-            elif isinstance(value, dict):
-                extra_lines.append(f"{key}: {json.dumps(value, ensure_ascii=False)}")
-            elif isinstance(value, str) and value.strip():
-                extra_lines.append(f"{key}: {value.strip()}")
-            elif isinstance(value, (int, float)):
-                extra_lines.append(f"{key}: {value}")
-
-    if extra_lines:
-        joined = " | ".join(extra_lines)
-        nfo_lines.append(f"  <overview>{joined}</overview>")
-
-    if poster_path.exists():
-        nfo_lines.append("  <image>poster.jpg</image>")
-
-    # nfo_lines.append("<lockdata>true</lockdata>")
-    nfo_lines.append("</person>")
-
-    if nfo_path.exists():
-        if overwrite:
-            if not nfo_path.is_file():
-                nfo_path.unlink()
-            with nfo_path.open("w", encoding="utf-8") as f:
-                f.write("\n".join(nfo_lines))
-            print(f"♻️ 覆盖写入 nfo: {nfo_path.name}")
-        else:
-            print(f"⏭️ 跳过已有 nfo: {nfo_path.name}")
-    else:
-        with nfo_path.open("w", encoding="utf-8") as f:
-            f.write("\n".join(nfo_lines))
-        print(f"📝 model nfo 生成完成: {nfo_path.name}")
+
+def handle_model_entry(entry, output_dir, overwrite, posters=None, dry_run=False, sources=None):
+    from poster_fetcher import PosterCache, fetch_posters, install_poster
+
+    plan = plan_model_entry(entry, output_dir, overwrite, sources)
+    if plan is None:
+        return
+
+    def installer(poster_url, poster_path):
+        fetched = posters
+        if fetched is None or poster_url not in fetched:
+            cache = PosterCache(output_dir / ".poster_cache")
+            fetched = fetch_posters([poster_url], cache, workers=1, refresh=overwrite)
+        cached = fetched.get(poster_url)
+        if cached is None:
+            return False, f"❌ 下载 poster 失败: {poster_url}"
+        if install_poster(cached, poster_path):
+            return True, f"✅ poster 写入完成: {poster_path}"
+        return True, f"⏭️ poster 未变化: {poster_path.name}"
+
+    apply_plan(plan, output_dir, dry_run, installer=installer)
 
 
 
@@ -544,7 +485,19 @@ if __name__ == "__main__":
         data = json.load(f)
     entries = [v for k, v in data.items()]
     print(f"共找到 {len(entries)} 个条目")
-    media_entry_generator(entries, output_dir, entry_type=entry_type, overwrite=True)
+    if entry_type == "album":
+        # 把图片顺序缓存到相册 metadata，之后的运行不再重新排序
+        updated = sum(ensure_album_order(entry) for entry in entries)
+        if updated:
+            save_metadata(data, str(json_path))
+            print(f"已缓存 {updated} 个相册的图片顺序")
+    # PROFILE=links_profile python utils/links_generator.py 输出各阶段耗时、文件系统调用次数和内存峰值
+    with profile_session(os.environ.get("PROFILE")):
+        media_entry_generator(entries, output_dir, entry_type=entry_type, overwrite=True, workers=8, ffmpeg_workers=2)
+        # 报告已不在 catalog 中的旧目录；确认后改为 dry_run=False 移入隔离区
+        prune_link_dirs(entries, output_dir, entry_type=entry_type, dry_run=True)
+    # 只刷新有变化的目录，而不是整个媒体库扫描：
+    # python utils/jellyfin.py /mnt/nas/jellyfin_links/videos --url http://jellyfin:8096 --api-key ... --map /mnt/nas/=/media/
 
     # json_path = Path("TYINGART_MODEL_LATEST.json")
     # output_dir = Path("/Volumes/PRIVATE_COLLECTION/jellyfin_links/models")
@@ -553,6 +506,9 @@ if __name__ == "__main__":
     # entries = [v for k, v in data.items()]
     # print(f"共找到 {len(entries)} 个条目")
     # media_entry_generator(entries, output_dir, entry_type="model", overwrite=False)
+    # from people_sync import sync_people
+    # sync_people(str(output_dir))  # 增量同步到 Jellyfin metadata/People
+    # 只刷新有变化的人物: python utils/jellyfin.py --people /Volumes/PRIVATE_COLLECTION/jellyfin_links/models --url ... --api-key ...
 
     # 用法示例：PNG 转换为 JPG
     # convert_png_to_jpg(Path("kokomi.png"), Path("poster.jpg"))
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+This module provides a content-hash manifest for generated link artifacts
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+MANIFEST_NAME = ".manifest.json"
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+def inputs_hash(inputs) -> str:
+    """Stable hash of JSON-serializable inputs (e.g. a catalog entry)."""
+    return content_hash(json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str))
+
+class ArtifactManifest:
+    """
+    Records the hash of every generated artifact (.nfo, .strm, ...) under an
+    output root, so regeneration only touches files whose content changed.
+
+    Layout of <root>/.manifest.json:
+        {"<relative path>": {"hash", "inputs", "size", "mtime_ns"}}
+
+    A file is known to be unchanged without reading it when its recorded hash
+    matches and its size/mtime still match the manifest. Files without a
+    record (first run) are compared by content once and then recorded.
+
+    Args:
+        root (Path): Output root, e.g. /mnt/nas/jellyfin_links/videos.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.file = self.root / MANIFEST_NAME
+        self.lock = threading.Lock()
+        self.records = {}
+        self.changes = {}
+        self.dirty = False
+        if self.file.exists():
+            with self.file.open(encoding="utf-8") as f:
+                self.records = json.load(f)
+
+    def _key(self, path: Path) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _unchanged(self, path: Path, digest: str, record: Optional[dict], content: bytes) -> bool:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return False
+        if not path.is_file() or path.is_symlink():
+            return False
+        if record and record.get("hash") == digest and record.get("size") == st.st_size and record.get("mtime_ns") == st.st_mtime_ns:
+            return True
+        if st.st_size != len(content):
+            return False
+        return path.read_bytes() == content
+
+    def write_text(self, path: Path, text: str, inputs=None, entry: Optional[str] = None) -> bool:
+        """
+        Write `text` to `path` unless the file already has exactly this content.
+
+        Args:
+            path (Path): Artifact path under the root.
+            text (str): Full file content.
+            inputs: Inputs the artifact was generated from, recorded as a hash.
+            entry (str, optional): Entry label the change is reported under.
+
+        Returns:
+            bool: True if the file was written.
+        """
+        content = text.encode("utf-8")
+        digest = content_hash(content)
+        key = self._key(path)
+        with self.lock:
+            record = self.records.get(key)
+
+        written = False
+        if not self._unchanged(path, digest, record, content):
+            if path.is_symlink() or (path.exists() and not path.is_file()):
+                path.unlink()
+            with path.open("wb") as f:
+                f.write(content)
+            written = True
+
+        st = path.stat()
+        new_record = {
+            "hash": digest,
+            "inputs": inputs_hash(inputs) if inputs is not None else None,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        with self.lock:
+            if new_record != record:
+                self.records[key] = new_record
+                self.dirty = True
+            if written:
+                self.changes.setdefault(entry or key, []).append(key)
+        return written
+
+    def forget(self, path: Path) -> None:
+        """Drop the record of an artifact that was removed."""
+        with self.lock:
+            if self.records.pop(self._key(path), None) is not None:
+                self.dirty = True
+
+    def forget_tree(self, directory: Path) -> None:
+        """Drop the records of every artifact under a removed directory."""
+        prefix = self._key(directory) + os.sep
+        with self.lock:
+            stale = [key for key in self.records if key.startswith(prefix)]
+            for key in stale:
+                del self.records[key]
+            if stale:
+                self.dirty = True
+
+    def changed(self, entry: str) -> list:
+        with self.lock:
+            return list(self.changes.get(entry, []))
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.records, indent=1, ensure_ascii=False, sort_keys=True)
+            self.dirty = False
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.file.with_name(MANIFEST_NAME + ".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.file)
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def manifest_for(root: Path) -> ArtifactManifest:
+    """Shared manifest instance of an output root."""
+    key = os.path.abspath(root)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = ArtifactManifest(Path(root))
+        return manifest
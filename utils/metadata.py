@@ -8,6 +8,9 @@ import re
 import unicodedata
 from typing import Optional
 
+from catalog import ShardedCatalog, is_sharded
+from profiling import profiled
+
 # === Metadata Template ===
 
 video_metadata_template = {
@@ -56,24 +59,46 @@ model_metadata_template = {
 
 # === Metadata File Handling ===
 
+@profiled("catalog.save")
 def save_metadata(metadata: dict, file_path: Optional[str]) -> None:
     """
-    Save metadata to a JSON file.
+    Save metadata to a JSON file atomically.
+
+    If `file_path` is a shard directory (see catalog.py), only the shards
+    whose entries changed are rewritten.
     
     Args:
-        metadata (dict): Metadata dictionary to save.
+        metadata (dict): Metadata dictionary (or ShardedCatalog) to save.
         file_path (str): Path to the file where metadata will be saved.
     """
     if file_path is None:
         pass
         # raise ValueError("File path cannot be None")
-    
-    with open(file_path, 'w') as f: # type: ignore
+
+    if isinstance(metadata, ShardedCatalog) and os.path.abspath(metadata.root) == os.path.abspath(file_path):
+        metadata.save()
+        return
+    if is_sharded(file_path):
+        catalog = ShardedCatalog(file_path)
+        catalog.replace(metadata)
+        catalog.save()
+        return
+    if isinstance(metadata, ShardedCatalog):
+        metadata = metadata.to_dict()
+
+    # Write to a temporary file first so readers never see a half-written catalog
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as f: # type: ignore
         json.dump(metadata, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, file_path) # type: ignore
 
+@profiled("catalog.load")
 def load_metadata(file_path: str) -> dict:
     """
     Load metadata from a JSON file.
+
+    A shard directory (see catalog.py) is opened as a ShardedCatalog, a
+    dict-like view that reads shards on first access.
     
     Args:
         file_path (str): Path to the file from which metadata will be loaded.
@@ -83,6 +108,8 @@ def load_metadata(file_path: str) -> dict:
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Metadata file {file_path} does not exist")
+    if is_sharded(file_path):
+        return ShardedCatalog(file_path)
     
     with open(file_path, 'r') as f:
         return json.load(f)
@@ -0,0 +1,194 @@
+"""
+This module provides histogram based metrics for the spider
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# === Buckets ===
+
+# Upper bounds in seconds, 1 ms .. 64 s
+LATENCY_BUCKETS = [0.001 * 2 ** i for i in range(17)]
+
+# Upper bounds in bytes, 1 KiB .. 64 MiB
+SIZE_BUCKETS = [1024 * 4 ** i for i in range(9)]
+
+# === Histogram ===
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+
+    Args:
+        bounds (list): Sorted bucket upper bounds; one overflow bucket is added.
+    """
+
+    def __init__(self, bounds: list):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else repr(self.bounds[i])): n
+                        for i, n in enumerate(self.counts) if n},
+        }
+
+# === Registry ===
+
+def _series(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={labels[k]}" for k in sorted(labels)) + "}"
+
+class MetricsRegistry:
+    """
+    Thread-safe collection of histograms and counters.
+
+    Series are keyed by name and labels, e.g. `request.total{host=tyingart.com}`.
+
+    Args:
+        keep (int): Number of raw request records kept for inspection.
+    """
+
+    def __init__(self, keep: int = 1000):
+        self.histograms = {}
+        self.counters = {}
+        self.records = deque(maxlen=keep)
+        self.sources = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, value: Optional[float], bounds: list = LATENCY_BUCKETS, **labels) -> None:
+        if value is None:
+            return
+        key = _series(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(bounds)
+            histogram.observe(value)
+
+    def increment(self, name: str, n: int = 1, **labels) -> None:
+        key = _series(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_request(self, record: dict) -> None:
+        """
+        Aggregate one request record.
+
+        Args:
+            record (dict): Keys "url", "host", "status", "attempt", "dns",
+                "connect", "ttfb", "total" (seconds, None if not applicable)
+                and "bytes".
+        """
+        host = record.get("host", "")
+        for phase in ("dns", "connect", "ttfb", "total"):
+            self.observe(f"request.{phase}", record.get(phase), host=host)
+        self.observe("request.bytes", record.get("bytes"), bounds=SIZE_BUCKETS, host=host)
+        self.increment("request.status", host=host, status=record.get("status") or "error")
+        if record.get("attempt", 1) > 1:
+            self.increment("request.retries", host=host)
+        with self.lock:
+            self.records.append(record)
+
+    def add_source(self, name: str, source: Callable[[], dict]) -> None:
+        """Include the output of `source()` (e.g. limiter metrics) in every snapshot."""
+        self.sources[name] = source
+
+    def to_dict(self, records: bool = False) -> dict:
+        with self.lock:
+            data = {
+                "uptime": time.time() - self.started,
+                "counters": dict(self.counters),
+                "histograms": {k: h.to_dict() for k, h in sorted(self.histograms.items())},
+            }
+            if records:
+                data["records"] = list(self.records)
+        for name, source in self.sources.items():
+            data[name] = source()
+        return data
+
+    def dump_json(self, file_path: str, records: bool = False) -> None:
+        with open(file_path, "w") as f:
+            json.dump(self.to_dict(records), f, indent=4, ensure_ascii=False)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.records.clear()
+            self.started = time.time()
+
+def serve_metrics(registry: MetricsRegistry, port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Expose a registry as JSON on http://host:port/metrics in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: Call `shutdown()` to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = json.dumps(registry.to_dict(records="records" in self.path), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
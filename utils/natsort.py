@@ -0,0 +1,66 @@
+"""
+This module provides natural sort keys for image filenames
+"""
+
+import re
+from typing import Iterable, List
+
+_DIGITS = re.compile(r"(\d+)")
+
+def natural_key(name: str) -> tuple:
+    """
+    Sort key of a filename.
+
+    Names are ordered by their leading index first: the first number in
+    parentheses ("IMG (12).jpg"), otherwise the first number ("DSC089731.jpg").
+    Names without digits come last. Ties are broken by the natural order of
+    the whole stem, e.g. "a2" < "a10", and finally by the name itself.
+
+    Never raises: every name has a key.
+    """
+    stem = name.rsplit(".", 1)[0] if "." in name[1:] else name
+    parts = _DIGITS.split(stem.lower())
+    # parts alternates text / digits, starting and ending with text
+    segments = tuple(int(p) if i % 2 else p for i, p in enumerate(parts))
+    if len(parts) == 1:
+        return (1, 0, segments, name)
+    index = segments[1]
+    for i in range(1, len(parts), 2):
+        if parts[i - 1].endswith("(") and parts[i + 1].startswith(")"):
+            index = segments[i]
+            break
+    return (0, index, segments, name)
+
+def natural_sorted(names: Iterable[str]) -> List[str]:
+    """Sort filenames with `natural_key`."""
+    return sorted(names, key=natural_key)
+
+# === Album Order ===
+
+ORDER_KEY = "order"
+
+def album_order(entry: dict) -> List[str]:
+    """
+    Display order of an album's images (keys of entry["imgs"]).
+
+    The order cached in entry["order"] is used while it still lists exactly
+    the album's images; otherwise the order is computed.
+    """
+    imgs = entry.get("imgs") or {}
+    cached = entry.get(ORDER_KEY)
+    if isinstance(cached, list) and len(cached) == len(imgs) and set(cached) == imgs.keys():
+        return cached
+    return natural_sorted(imgs)
+
+def ensure_album_order(entry: dict) -> bool:
+    """
+    Store the display order in entry["order"].
+
+    Returns:
+        bool: True if the entry was updated.
+    """
+    order = album_order(entry)
+    if entry.get(ORDER_KEY) == order:
+        return False
+    entry[ORDER_KEY] = order
+    return True
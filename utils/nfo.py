@@ -0,0 +1,214 @@
+"""
+This module provides NFO rendering for Jellyfin (movie, photoalbum, person)
+"""
+
+import json
+import re
+from typing import Iterable, Optional
+
+# Characters not allowed in XML 1.0 documents
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_NEEDS_ESCAPE = re.compile("[&<>\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+def xml_text(value) -> str:
+    """Escape a value for use as XML element text."""
+    text = value if isinstance(value, str) else str(value)
+    if _NEEDS_ESCAPE.search(text) is None:
+        return text
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return _INVALID_XML.sub("", text)
+
+def xml_attr(value) -> str:
+    """Escape a value for use inside a double-quoted XML attribute."""
+    return xml_text(value).replace('"', "&quot;")
+
+def as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+class NfoDocument:
+    """
+    Streaming NFO builder: elements are escaped as they are added and the
+    document is joined once, so the caller does a single write.
+
+    Example:
+        doc = NfoDocument("movie")
+        doc.element("title", "Tom & Jerry")
+        text = doc.text()
+
+    Args:
+        root (str): Root element name.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.parts = [f"<{root}>"]
+
+    def element(self, tag: str, value="", indent: int = 1, **attrs) -> "NfoDocument":
+        pad = "  " * indent
+        if attrs:
+            attributes = "".join(f' {k}="{xml_attr(v)}"' for k, v in attrs.items())
+            self.parts.append(f"{pad}<{tag}{attributes}>{xml_text(value)}</{tag}>")
+        else:
+            self.parts.append(f"{pad}<{tag}>{xml_text(value)}</{tag}>")
+        return self
+
+    def elements(self, tag: str, values: Iterable, indent: int = 1) -> "NfoDocument":
+        for value in values:
+            self.element(tag, value, indent)
+        return self
+
+    def actor(self, name, role: str = "Model") -> "NfoDocument":
+        self.parts.append("  <actor>")
+        self.element("name", name, 2)
+        self.element("role", role, 2)
+        self.parts.append("  </actor>")
+        return self
+
+    def text(self) -> str:
+        return "\n".join(self.parts + [f"</{self.root}>"])
+
+# === Schemas ===
+
+MOVIE_OPTIONAL_FIELDS = ["tagline", "runtime", "year", "director", "credits", "writer", "country",
+                         "countrycode", "language", "rating", "aspectratio"]
+
+def movie_nfo(entry: dict, today: Optional[str] = None) -> str:
+    """
+    <movie> NFO of a video entry.
+
+    Args:
+        entry (dict): Catalog entry; `thumb` == "poster.jpg" adds the poster.
+        today (str, optional): Fallback for premiered/dateadded (YYYY-MM-DD).
+    """
+    code = entry.get("code", "") or ""
+    title = entry.get("title", "")
+    description = (entry.get("description") or "").strip()
+    series = code.split("-")[0] if isinstance(code, str) and "-" in code else (code or "")
+
+    doc = NfoDocument("movie")
+    doc.element("title", f"{code} - {title}")
+    doc.element("originaltitle", code)
+    doc.element("sorttitle", code)
+    doc.element("plot", description)
+    doc.element("outline", description)
+    dateadded = entry.get("dateadded")
+    if not dateadded:
+        if today is None:
+            from datetime import datetime
+            today = datetime.today().strftime('%Y-%m-%d')
+        dateadded = today
+    doc.element("premiered", entry.get("premiered") or dateadded)
+    doc.element("dateadded", dateadded)
+    doc.element("tag", series)
+
+    for tag in MOVIE_OPTIONAL_FIELDS:
+        value = entry.get(tag)
+        if value:
+            doc.element(tag, value)
+
+    doc.elements("genre", (kw for kw in as_list(entry.get("keywords")) if kw))
+    for name in as_list(entry.get("model")):
+        if name:
+            doc.actor(name)
+
+    for studio in as_list(entry.get("studio")):
+        if studio:
+            doc.element("studio", studio)
+            doc.element("genre", studio)
+
+    prefix = code.split("-")[0] if "-" in code else ""
+    if prefix:
+        if prefix != series:
+            doc.element("tag", prefix)
+        doc.element("tag", prefix)
+        doc.element("genre", prefix)
+
+    if entry.get("thumb") == "poster.jpg":
+        doc.element("thumb", "poster.jpg")
+
+    doc.element("uniqueid", code, type="manual")
+    doc.element("id", code)
+    doc.element("lockdata", "true")
+    return doc.text()
+
+def photoalbum_nfo(entry: dict, thumb: bool = False) -> str:
+    """
+    <photoalbum> NFO of an album entry.
+
+    Args:
+        entry (dict): Catalog entry.
+        thumb (bool): Reference poster.jpg.
+    """
+    code = entry.get("code", "")
+    doc = NfoDocument("photoalbum")
+    doc.element("title", entry.get("title", ""))
+    doc.element("originaltitle", code)
+    doc.element("plot", (entry.get("description") or "").strip())
+    doc.element("studio", entry.get("studio", ""))
+    doc.elements("tag", (kw.strip() for kw in as_list(entry.get("keywords"))))
+    for name in as_list(entry.get("model")):
+        doc.actor(name)
+    if thumb:
+        doc.element("thumb", "poster.jpg")
+    doc.element("id", code)
+    return doc.text()
+
+PERSON_KNOWN_KEYS = {"name", "type", "poster", "poster_url"}
+
+def person_nfo(entry: dict, image: bool = False, current_year: int = 2025) -> str:
+    """
+    <person> NFO of a model entry. Fields without a dedicated element are
+    collected into <overview>.
+
+    Args:
+        entry (dict): Model entry.
+        image (bool): Reference poster.jpg.
+        current_year (int): Year used to turn an age into a birth year.
+    """
+    doc = NfoDocument("person")
+    doc.element("name", entry.get("name"))
+    doc.element("type", "actor")
+    extra_lines = []
+
+    for key, value in entry.items():
+        if key in PERSON_KNOWN_KEYS:
+            continue
+        if key == "age":
+            try:
+                birthyear = int(value)
+            except (TypeError, ValueError):
+                continue
+            birthyear = current_year - birthyear if birthyear < 1900 else birthyear
+            doc.element("birthyear", birthyear)
+        elif key == "studio" and isinstance(value, list):
+            doc.elements("studio", value)
+        elif key == "real_name" and isinstance(value, list):
+            doc.elements("aka", value)
+        elif key == "SNS" and isinstance(value, list):
+            doc.elements("socials", value)
+        elif key.endswith("_score") and isinstance(value, (int, float)):
+            doc.element("tag", f"{key}:{value}")
+        elif key == "figure":
+            extra_lines.append(f"Figure: {value}")
+        elif key in {"description", "comments", "overview"} and isinstance(value, str) and value.strip():
+            extra_lines.append(value.strip())
+        else:
+            # catch-all for unexpected fields
+            if isinstance(value, list):
+                extra_lines.extend(f"{key}: {v}" for v in value)
+            elif isinstance(value, dict):
+                extra_lines.append(f"{key}: {json.dumps(value, ensure_ascii=False)}")
+            elif isinstance(value, str) and value.strip():
+                extra_lines.append(f"{key}: {value.strip()}")
+            elif isinstance(value, (int, float)):
+                extra_lines.append(f"{key}: {value}")
+
+    if extra_lines:
+        doc.element("overview", " | ".join(extra_lines))
+    if image:
+        doc.element("image", "poster.jpg")
+    return doc.text()
@@ -0,0 +1,199 @@
+"""
+This module syncs model link directories into Jellyfin's People metadata
+
+Layout:
+/source_base                        e.g. /mnt/nas/jellyfin_links/models
+    /<name>
+        poster.jpg
+        <name>.nfo
+    .people_changes.json            People directories to refresh (see jellyfin.refresh_people);
+                                    kept with the tool's output, not in Jellyfin's metadata
+/target_base                        e.g. /var/lib/jellyfin/metadata/People
+    /<Letter>/<name>                first letter or digit of the name
+        poster.jpg
+        person.nfo
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from changes import changes_for
+from profiling import add_profile_arguments, profiled, session_from_args
+
+SOURCE_BASE = "/mnt/nas/jellyfin_links/models"
+PEOPLE_CHANGES_NAME = ".people_changes.json"
+TARGET_BASE = "/var/lib/jellyfin/metadata/People"
+
+def people_letter(name: str) -> str:
+    """
+    Jellyfin People sub-folder of a name: its first letter or digit
+    (upper-cased), skipping leading punctuation; "" when there is none, in
+    which case Jellyfin keeps the person directly under People. Works per
+    Unicode character, not per byte.
+    """
+    for c in unicodedata.normalize("NFC", name).strip():
+        if c.isalnum():
+            return c.upper()
+    return ""
+
+def _digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def sync_file(src: str, dst: str, checksum: bool = False, dry_run: bool = False) -> bool:
+    """
+    Copy `src` to `dst` unless it is already up to date.
+
+    Up to date means same size and mtime (copies keep the source mtime). With
+    `checksum`, files of equal size but different mtime are compared by hash
+    and only get their mtime fixed when the content matches.
+
+    Returns:
+        bool: True if `dst` was (or, in dry-run mode, would be) written.
+    """
+    s = os.stat(src)
+    try:
+        d = os.stat(dst)
+    except FileNotFoundError:
+        d = None
+    if d is not None and d.st_size == s.st_size:
+        if d.st_mtime_ns == s.st_mtime_ns:
+            return False
+        if checksum and _digest(src) == _digest(dst):
+            if not dry_run:
+                os.utime(dst, ns=(s.st_atime_ns, s.st_mtime_ns))
+            return False
+    if dry_run:
+        return True
+    tmp = f"{dst}.tmp"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return True
+
+def person_files(model_dir: str) -> dict:
+    """
+    Files of one model directory to sync, from a single listing:
+    target name -> source path.
+    """
+    name = os.path.basename(model_dir)
+    nfos = []
+    files = {}
+    with os.scandir(model_dir) as it:
+        for e in it:
+            if not e.is_file():
+                continue
+            if e.name == "poster.jpg":
+                files["poster.jpg"] = e.path
+            elif e.name.endswith(".nfo"):
+                nfos.append(e.name)
+    if nfos:
+        # Prefer <name>.nfo as written by handle_model_entry
+        nfo = f"{name}.nfo" if f"{name}.nfo" in nfos else sorted(nfos)[0]
+        files["person.nfo"] = os.path.join(model_dir, nfo)
+    return files
+
+@profiled("people.sync_person")
+def sync_person(model_dir: str, target_base: str, checksum: bool = False, dry_run: bool = False) -> dict:
+    """
+    Sync one model directory.
+
+    Returns:
+        dict: {"name", "target", "created", "changed": [file names]}
+    """
+    name = unicodedata.normalize("NFC", os.path.basename(model_dir))
+    target = os.path.join(target_base, people_letter(name), name)
+    files = person_files(model_dir)
+    created = not os.path.isdir(target)
+    if created and files and not dry_run:
+        os.makedirs(target, exist_ok=True)
+    changed = [dst_name for dst_name, src in sorted(files.items())
+               if sync_file(src, os.path.join(target, dst_name), checksum, dry_run)]
+    return {"name": name, "target": target, "created": created and bool(files), "changed": changed}
+
+def people_changes(state_dir: str):
+    """Change set of People directories waiting for a Jellyfin refresh."""
+    return changes_for(state_dir, PEOPLE_CHANGES_NAME)
+
+def sync_people(source_base: str = SOURCE_BASE,
+                target_base: str = TARGET_BASE,
+                workers: int = 8,
+                checksum: bool = False,
+                dry_run: bool = False,
+                state_dir: Optional[str] = None) -> dict:
+    """
+    Sync every model directory under `source_base` into Jellyfin's People
+    metadata, copying only files that changed. The changed People
+    directories are recorded in <state_dir>/.people_changes.json.
+
+    Args:
+        source_base (str): Model link root.
+        target_base (str): Jellyfin metadata/People directory.
+        workers (int): Parallel copies.
+        checksum (bool): Compare content when size matches but mtime differs.
+        dry_run (bool): Only report what would change.
+        state_dir (str, optional): Where the change set is kept (default: `source_base`).
+
+    Returns:
+        dict: {"people", "created", "changed": {name: [files]}, "targets": {name: target dir},
+               "failed": {name: error}, "elapsed"}
+    """
+    start = time.perf_counter()
+    with os.scandir(source_base) as it:
+        model_dirs = sorted(e.path for e in it if e.is_dir() and not e.name.startswith("."))
+
+    def run(model_dir):
+        try:
+            return sync_person(model_dir, target_base, checksum, dry_run), None
+        except OSError as e:
+            return {"name": os.path.basename(model_dir)}, f"{type(e).__name__}: {e}"
+
+    change_set = people_changes(state_dir or source_base)
+    report = {"people": len(model_dirs), "created": [], "changed": {}, "targets": {}, "failed": {}}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for result, error in executor.map(run, model_dirs):
+            if error:
+                report["failed"][result["name"]] = error
+                print(f"❌ {result['name']}: {error}")
+                continue
+            if result["created"]:
+                report["created"].append(result["name"])
+                if not dry_run:
+                    change_set.created(result["target"])
+            if result["changed"]:
+                report["changed"][result["name"]] = result["changed"]
+                report["targets"][result["name"]] = result["target"]
+                if not dry_run:
+                    change_set.touched(result["target"])
+                print(f"{'🔍' if dry_run else '✏️'} {result['name']}: {', '.join(result['changed'])}")
+    if not dry_run:
+        change_set.save()
+    report["elapsed"] = round(time.perf_counter() - start, 3)
+    print(f"共 {report['people']} 个人物，更新 {len(report['changed'])} 个（新建 {len(report['created'])} 个），"
+          f"失败 {len(report['failed'])} 个，用时 {report['elapsed']}s")
+    return report
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Sync model posters and NFOs into Jellyfin People metadata")
+    parser.add_argument("source", nargs="?", default=SOURCE_BASE)
+    parser.add_argument("target", nargs="?", default=TARGET_BASE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checksum", action="store_true", help="Compare content when only the mtime differs")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--state", help="Directory for the change set (default: source)")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    with session_from_args(args):
+        report = sync_people(args.source, args.target, args.workers, args.checksum, args.dry_run, args.state)
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
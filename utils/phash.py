@@ -0,0 +1,475 @@
+"""
+This module finds near-duplicate album images with perceptual hashes
+
+Every image gets a 64-bit DCT hash (pHash): resized or re-encoded copies of
+an image hash to values a few bits apart. Hashes are computed in a process
+pool, cached by file identity and kept as packed uint64 arrays:
+
+/cache_dir
+    hashes.npy      uint64, one row per file
+    files.json      {"paths": [...], "size": [...], "mtime_ns": [...], "valid": [...]}
+
+Near-duplicate pairs are found with multi-index hashing: for a search
+radius d the 64 bits are split into d // 2 + 1 chunks, and two hashes at
+most d bits apart differ by at most one bit in at least one chunk.
+Candidates come from binary searches in per-chunk sorted tables and are
+verified with a vectorized Hamming distance, so a million images take
+seconds instead of the 5·10¹¹ comparisons of a full scan.
+"""
+
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from profiling import add_profile_arguments, count, profiled, session_from_args
+
+HASH_SIZE = 8
+# Larger radii split the hash into short chunks whose buckets grow with the
+# number of images; beyond this a linear scan is as fast
+MAX_DISTANCE = 11
+
+# === Hashing ===
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+_DCT = _dct_matrix(HASH_SIZE * 4)
+
+def phash_pixels(pixels: np.ndarray) -> int:
+    """pHash of a 32x32 grayscale array."""
+    dct = _DCT @ pixels.astype(np.float32) @ _DCT.T
+    low = dct[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def phash_file(path: str) -> int:
+    """pHash of an image file (JPEGs are decoded at reduced scale)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        image = ImageOps.exif_transpose(image).convert("L")
+        size = HASH_SIZE * 4
+        return phash_pixels(np.asarray(image.resize((size, size), Image.BILINEAR)))
+
+def hamming(a: np.ndarray, b) -> np.ndarray:
+    """Bitwise Hamming distance of uint64 arrays (broadcasting)."""
+    x = np.bitwise_xor(a, b)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.uint8)
+    return _POPCOUNT8[np.ascontiguousarray(x).view(np.uint8).reshape(*x.shape, 8)].sum(axis=-1, dtype=np.uint8)
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# === Store ===
+
+class HashStore:
+    """
+    Hashes by file identity (path, size, mtime), persisted as a packed
+    uint64 array.
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.hash_file = self.cache_dir / "hashes.npy"
+        self.files_file = self.cache_dir / "files.json"
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.paths, self.sizes, self.mtimes, self.valid = [], [], [], []
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.dirty = False
+        if self.files_file.exists() and self.hash_file.exists():
+            with self.files_file.open(encoding="utf-8") as f:
+                files = json.load(f)
+            self.paths, self.sizes = files["paths"], files["size"]
+            self.mtimes, self.valid = files["mtime_ns"], files["valid"]
+            self.hashes = np.load(self.hash_file)
+            self.rows = {path: i for i, path in enumerate(self.paths)}
+
+    def identity(self, path: str) -> tuple:
+        """Recorded (size, mtime_ns), or (None, None)."""
+        row = self.rows.get(path)
+        return (None, None) if row is None else (self.sizes[row], self.mtimes[row])
+
+    def update(self, records: List[tuple]) -> None:
+        """Store (path, size, mtime_ns, hash or None) records."""
+        if not records:
+            return
+        with self.lock:
+            grow = [r for r in records if r[0] not in self.rows]
+            if grow:
+                self.hashes = np.concatenate([self.hashes, np.zeros(len(grow), dtype=np.uint64)])
+                for path, *_ in grow:
+                    self.rows[path] = len(self.paths)
+                    self.paths.append(path)
+                    self.sizes.append(None)
+                    self.mtimes.append(None)
+                    self.valid.append(False)
+            for path, size, mtime_ns, value in records:
+                row = self.rows[path]
+                self.sizes[row], self.mtimes[row] = size, mtime_ns
+                self.valid[row] = value is not None
+                self.hashes[row] = value or 0
+            self.dirty = True
+
+    def lookup(self, paths: List[str]) -> tuple:
+        """(hashes, valid mask) aligned with `paths`."""
+        rows = np.array([self.rows.get(p, -1) for p in paths], dtype=np.int64)
+        known = rows >= 0
+        hashes = np.zeros(len(paths), dtype=np.uint64)
+        hashes[known] = self.hashes[rows[known]]
+        valid = np.zeros(len(paths), dtype=bool)
+        valid[known] = np.array(self.valid, dtype=bool)[rows[known]]
+        return hashes, valid
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            files = {"paths": self.paths, "size": self.sizes, "mtime_ns": self.mtimes, "valid": self.valid}
+            hashes = self.hashes.copy()
+            self.dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_dir / "hashes.tmp.npy"
+        np.save(tmp, hashes)
+        os.replace(tmp, self.hash_file)
+        tmp = self.files_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(files, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.files_file)
+
+def _hash_chunk(jobs: List[tuple]) -> List[tuple]:
+    """
+    Process pool job. `jobs` holds (path, cached size, cached mtime_ns);
+    unchanged files are not opened.
+
+    Returns:
+        list: (path, size, mtime_ns, hash or None, changed)
+    """
+    results = []
+    for path, size, mtime_ns in jobs:
+        try:
+            st = os.stat(path)
+        except OSError:
+            results.append((path, None, None, None, True))
+            continue
+        if st.st_size == size and st.st_mtime_ns == mtime_ns:
+            results.append((path, size, mtime_ns, None, False))
+            continue
+        try:
+            value = phash_file(path)
+        except Exception:
+            value = None
+        results.append((path, st.st_size, st.st_mtime_ns, value, True))
+    return results
+
+@profiled("phash.hash_batch")
+def hash_batch(paths: Iterable[str], store: HashStore, workers: Optional[int] = None, chunksize: int = 256) -> tuple:
+    """
+    Hash images in chunks across a process pool, reusing stored hashes of
+    unchanged files.
+
+    Returns:
+        tuple: (hashes uint64 array, valid mask) aligned with `paths`; files
+            that cannot be read or no longer exist are invalid.
+    """
+    paths = [str(p) for p in paths]
+    unique = list(dict.fromkeys(paths))
+    jobs = [(path, *store.identity(path)) for path in unique]
+    chunks = [jobs[i:i + chunksize] for i in range(0, len(jobs), chunksize)]
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1 and len(chunks) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+        batches = executor.map(_hash_chunk, chunks)
+    else:
+        batches = map(_hash_chunk, chunks)
+    hashed = 0
+    try:
+        for batch in batches:
+            changed = [(path, size, mtime_ns, value) for path, size, mtime_ns, value, is_new in batch
+                       if is_new and size is not None]
+            hashed += len(changed)
+            # Deleted or moved files: invalidate their stored hash so they drop out of the results
+            gone = [(path, None, None, None) for path, size, _, _, is_new in batch
+                    if is_new and size is None and path in store.rows]
+            store.update(changed + gone)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    count("phash.hashed", hashed)
+    print(f"🧮 感知哈希: {len(unique)} 张，计算 {hashed} 张，缓存命中 {len(unique) - hashed} 张")
+    return store.lookup(paths)
+
+# === Search ===
+
+def chunk_layout(max_distance: int) -> List[tuple]:
+    """
+    (shift, width) of the chunks the 64 bits are split into: max_distance // 2
+    + 1 chunks, so two hashes within `max_distance` differ by at most one bit
+    in at least one chunk.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}, got {max_distance}")
+    n = max_distance // 2 + 1
+    widths = [64 // n + (1 if i < 64 % n else 0) for i in range(n)]
+    shifts = [sum(widths[:i]) for i in range(n)]
+    return list(zip(shifts, widths))
+
+class HashIndex:
+    """
+    Multi-index over packed 64-bit hashes for one search radius.
+
+    Each chunk has a sorted table; a hash is found by probing every table
+    with its own chunk and with the chunk's one-bit variants, i.e. about 65
+    binary searches whatever the number of hashes.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes.
+        max_distance (int): Largest Hamming distance searched (0-MAX_DISTANCE).
+    """
+
+    def __init__(self, hashes: np.ndarray, max_distance: int = 5):
+        self.hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+        self.max_distance = max_distance
+        self.layout = chunk_layout(max_distance)
+        self.tables = []
+        for shift, width in self.layout:
+            keys = (self.hashes >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            order = np.argsort(keys, kind="stable")
+            self.tables.append((keys, keys[order], order))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _probe(self, table: tuple, probes: np.ndarray, max_bucket: Optional[int] = None) -> tuple:
+        """
+        (probe positions, matching hash indices) for every probe key.
+        Buckets larger than `max_bucket` are left out.
+        """
+        _, sorted_keys, order = table
+        lo = np.searchsorted(sorted_keys, probes, "left")
+        hi = np.searchsorted(sorted_keys, probes, "right")
+        counts = hi - lo
+        skipped = None
+        if max_bucket is not None:
+            skipped = np.flatnonzero(counts > max_bucket)
+            counts[skipped] = 0
+        left = np.repeat(np.arange(len(probes)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return left, order[np.repeat(lo, counts) + offsets], skipped
+
+    def query(self, value: int) -> tuple:
+        """
+        Hashes within `max_distance` of `value`.
+
+        Returns:
+            tuple: (indices, distances), nearest first.
+        """
+        candidates = []
+        for table, (shift, width) in zip(self.tables, self.layout):
+            key = (value >> shift) & ((1 << width) - 1)
+            probes = np.array([key] + [key ^ (1 << b) for b in range(width)], dtype=np.uint64)
+            candidates.append(self._probe(table, probes)[1])
+        indices = np.unique(np.concatenate(candidates))
+        distances = hamming(self.hashes[indices], np.uint64(value))
+        keep = distances <= self.max_distance
+        indices, distances = indices[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return indices[order], distances[order]
+
+    def pairs(self, max_bucket: int = 5000) -> tuple:
+        """
+        Every pair of hashes within `max_distance`.
+
+        For each chunk and each of its bits, hashes are grouped by the chunk
+        with that bit cleared: two chunks at most one bit apart share such a
+        group. Only pairs within a group are compared.
+
+        Args:
+            max_bucket (int): Groups larger than this (e.g. thousands of
+                blank images) are not expanded into pairs; their hashes are
+                counted as skipped.
+
+        Returns:
+            tuple: (left, right, distances, skipped) with left < right.
+        """
+        found = []
+        skipped = np.zeros(len(self), dtype=bool)
+        for (keys, _, _), (_, width) in zip(self.tables, self.layout):
+            # Radius 0 only needs equal chunks
+            for bit in (range(width) if self.max_distance else [None]):
+                masked = keys if bit is None else keys & ~np.uint64(1 << bit)
+                left, right, big = _group_pairs(masked, max_bucket)
+                skipped[big] = True
+                if not len(left):
+                    continue
+                keep = hamming(self.hashes[left], self.hashes[right]) <= self.max_distance
+                first, second = left[keep], right[keep]
+                found.append(np.minimum(first, second) * len(self) + np.maximum(first, second))
+        if found:
+            codes = np.unique(np.concatenate(found))
+        else:
+            codes = np.zeros(0, dtype=np.int64)
+        left, right = codes // max(len(self), 1), codes % max(len(self), 1)
+        return left, right, hamming(self.hashes[left], self.hashes[right]), int(skipped.sum())
+
+def _group_pairs(keys: np.ndarray, max_bucket: int) -> tuple:
+    """
+    All index pairs sharing a key, vectorized.
+
+    Returns:
+        tuple: (left, right, skipped) with skipped the indices in groups
+            larger than `max_bucket`.
+    """
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    big = sizes > max_bucket
+    skipped = order[np.repeat(big, sizes)] if big.any() else np.zeros(0, dtype=np.int64)
+    keep = (sizes > 1) & ~big
+    starts, sizes = starts[keep], sizes[keep]
+    # Position p of a group pairs with p+1 .. end of the group
+    positions = np.repeat(starts, sizes) + (np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes))
+    counts = np.repeat(starts + sizes, sizes) - positions - 1
+    left = np.repeat(positions, counts)
+    right = left + 1 + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    return order[left], order[right], skipped
+
+# === Catalog Report ===
+
+def album_images(catalogs: dict) -> List[dict]:
+    """Flatten album catalogs ({name: catalog}) into image records."""
+    records = []
+    for catalog_name, catalog in catalogs.items():
+        for key, entry in catalog.items():
+            studio = entry.get("studio")
+            studio = ", ".join(studio) if isinstance(studio, list) else (studio or "")
+            for name, meta in (entry.get("imgs") or {}).items():
+                path = meta.get("path") if isinstance(meta, dict) else meta
+                if isinstance(path, str) and path:
+                    records.append({"catalog": catalog_name, "album": key, "studio": studio, "image": name,
+                                    "path": path})
+    return records
+
+def _clusters(n: int, left: np.ndarray, right: np.ndarray) -> List[List[int]]:
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for i in set(left.tolist()) | set(right.tolist()):
+        groups.setdefault(find(i), []).append(i)
+    return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g[0]))
+
+def find_duplicates(catalogs: dict, cache_dir: Path, max_distance: int = 5, workers: Optional[int] = None,
+                    min_shared: float = 0.5) -> dict:
+    """
+    Near-duplicate images and albums across album catalogs.
+
+    Args:
+        catalogs (dict): Catalog name -> album catalog.
+        cache_dir (Path): Hash cache.
+        max_distance (int): Largest Hamming distance counted as a duplicate.
+        workers (int, optional): Hashing processes (default: CPU count).
+        min_shared (float): Fraction of the smaller album's images that must
+            have a duplicate in the other album to report the album pair.
+
+    Returns:
+        dict: {"images", "hashed", "pairs", "clusters": [[record, ...]],
+               "albums": [{"a", "b", "shared", "ratio", "cross_studio"}], "skipped"}
+    """
+    records = album_images(catalogs)
+    store = HashStore(cache_dir)
+    try:
+        hashes, valid = hash_batch([r["path"] for r in records], store, workers)
+    finally:
+        store.save()
+    rows = np.flatnonzero(valid)
+    index = HashIndex(hashes[rows], max_distance)
+    left, right, distances, skipped = index.pairs()
+    left, right = rows[left], rows[right]
+
+    # Identical paths (one file listed twice) are not duplicates
+    distinct = np.array([records[a]["path"] != records[b]["path"] for a, b in zip(left.tolist(), right.tolist())],
+                        dtype=bool)
+    left, right, distances = left[distinct], right[distinct], distances[distinct]
+
+    album_size = {}
+    for r in records:
+        album_size[(r["catalog"], r["album"])] = album_size.get((r["catalog"], r["album"]), 0) + 1
+    shared = {}
+    for a, b in zip(left.tolist(), right.tolist()):
+        ka, kb = (records[a]["catalog"], records[a]["album"]), (records[b]["catalog"], records[b]["album"])
+        if ka == kb:
+            continue
+        pair = tuple(sorted([ka, kb]))
+        shared.setdefault(pair, set()).add(a if (ka, kb)[0] == pair[0] else b)
+    albums = []
+    studios = {(r["catalog"], r["album"]): r["studio"] for r in records}
+    for (ka, kb), images in shared.items():
+        ratio = len(images) / min(album_size[ka], album_size[kb])
+        if ratio >= min_shared:
+            albums.append({"a": list(ka), "b": list(kb), "shared": len(images), "ratio": round(ratio, 3),
+                           "cross_studio": studios[ka] != studios[kb]})
+    albums.sort(key=lambda x: (-x["ratio"], -x["shared"]))
+
+    return {
+        "images": len(records),
+        "hashed": int(valid.sum()),
+        "pairs": int(len(left)),
+        "clusters": [[records[i] for i in group] for group in _clusters(len(records), left, right)],
+        "albums": albums,
+        "skipped": skipped,
+    }
+
+def main(argv: Optional[list] = None):
+    from metadata import load_metadata
+
+    parser = argparse.ArgumentParser(description="Report near-duplicate images and albums across album catalogs")
+    parser.add_argument("catalogs", nargs="+", help="Album catalog JSON files")
+    parser.add_argument("--cache", default=".phash_cache", help="Hash cache directory")
+    parser.add_argument("--distance", type=int, default=5, help=f"Max Hamming distance (0-{MAX_DISTANCE})")
+    parser.add_argument("--min-shared", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Write the full report as JSON")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    with session_from_args(args):
+        catalogs = {path: load_metadata(path) for path in args.catalogs}
+        report = find_duplicates(catalogs, Path(args.cache), args.distance, args.workers, args.min_shared)
+    print(f"共 {report['images']} 张图片，{report['pairs']} 对相似图片，{len(report['clusters'])} 组，"
+          f"{len(report['albums'])} 对疑似重复相册")
+    for album in report["albums"][:50]:
+        mark = "⚠️ 跨厂牌" if album["cross_studio"] else "🔁"
+        print(f"{mark} {album['a'][1]} ↔ {album['b'][1]}: {album['shared']} 张 ({album['ratio']:.0%})")
+    if report["skipped"]:
+        print(f"⚠️ {report['skipped']} 张图片落入过大的哈希分组（如纯色图），部分比较被跳过")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""
+This module provides a threaded pipeline of stages connected by bounded queues
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+_DONE = object()
+
+class Stage:
+    """
+    One pipeline stage.
+
+    Args:
+        name (str): Stage name used in statistics.
+        func (Callable): Called with each input item; returns an iterable of
+            outputs for the next stage (or None for no output).
+        workers (int): Number of threads running `func`.
+        maxsize (int): Capacity of the queue feeding this stage.
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, maxsize: int = 64):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self.finished = 0
+        self.lock = threading.Lock()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "emitted": self.emitted,
+            "errors": self.errors,
+            "busy": round(self.busy, 3),
+            "max_queue": self.max_depth,
+        }
+
+class Pipeline:
+    """
+    Streaming pipeline: items flow through the stages as soon as they are
+    produced, and bounded queues make fast stages wait for slow ones instead
+    of buffering everything in memory.
+
+    Example:
+        pipeline = Pipeline()
+        pipeline.stage("fetch", fetch, workers=8)
+        pipeline.stage("parse", parse, workers=2)
+        pipeline.stage("write", write)
+        stats = pipeline.run(urls)
+
+    Args:
+        maxsize (int): Default queue capacity for stages.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.stages = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def stage(self, name: str, func: Callable, workers: int = 1, maxsize: Optional[int] = None) -> "Pipeline":
+        self.stages.append(Stage(name, func, workers, maxsize or self.maxsize))
+        return self
+
+    def _put(self, stage: Stage, item) -> None:
+        stage.inbox.put(item)
+        depth = stage.inbox.qsize()
+        if depth > stage.max_depth:
+            stage.max_depth = depth
+
+    def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.inbox.get()
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            emitted = 0
+            try:
+                outputs = stage.func(item)
+                for output in outputs or ():
+                    if following is not None:
+                        self._put(following, output)
+                    emitted += 1
+            except Exception as e:
+                with stage.lock:
+                    stage.errors += 1
+                with self.lock:
+                    self.failures.append((stage.name, item, repr(e)))
+                print(f"❌ [{stage.name}] {item!r:.120} -> {e}")
+            with stage.lock:
+                stage.processed += 1
+                stage.emitted += emitted
+                stage.busy += time.perf_counter() - start
+
+        # The last worker of a stage to finish closes the next stage
+        with stage.lock:
+            stage.finished += 1
+            last = stage.finished == stage.workers
+        if last and following is not None:
+            for _ in range(following.workers):
+                following.inbox.put(_DONE)
+
+    def run(self, source: Iterable) -> dict:
+        """
+        Feed `source` into the first stage and wait for every stage to drain.
+
+        Returns:
+            dict: Per-stage statistics plus "elapsed" seconds and "failures".
+        """
+        if not self.stages:
+            raise ValueError("Pipeline has no stages")
+        start = time.perf_counter()
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        try:
+            for item in source:
+                self._put(first, item)
+        finally:
+            for _ in range(first.workers):
+                first.inbox.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats["elapsed"] = round(time.perf_counter() - start, 3)
+        stats["failures"] = list(self.failures)
+        return stats
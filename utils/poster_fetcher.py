@@ -0,0 +1,187 @@
+"""
+This module provides a concurrent, cached poster download stage
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:3] == JPEG_MAGIC
+
+class PosterCache:
+    """
+    On-disk cache of downloaded posters.
+
+    Originals are stored once per content hash and indexed by URL, together
+    with the validators needed for conditional re-downloads. Non-JPEG
+    originals are converted once, in batches, into an `images.ImageCache`.
+
+    Layout:
+    /cache_dir
+        index.json          url -> {"sha1", "etag", "last_modified"}
+        /blobs
+            <sha1>          original bytes
+        /jpeg               ImageCache of the JPEG conversions (non-JPEG originals only)
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.blobs = self.cache_dir / "blobs"
+        self.index_file = self.cache_dir / "index.json"
+        self.lock = threading.Lock()
+        self.index = {}
+        if self.index_file.exists():
+            with self.index_file.open(encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def get(self, url: str) -> Optional[dict]:
+        with self.lock:
+            meta = self.index.get(url)
+        if meta and (self.blobs / meta["sha1"]).exists():
+            return meta
+        return None
+
+    def put(self, url: str, data: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> dict:
+        digest = hashlib.sha1(data).hexdigest()
+        blob = self.blobs / digest
+        if not blob.exists():
+            self.blobs.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_name(f"{digest}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, blob)
+        meta = {"sha1": digest, "etag": etag, "last_modified": last_modified}
+        with self.lock:
+            self.index[url] = meta
+        return meta
+
+    def jpeg_paths(self, digests: Iterable[str]) -> dict:
+        """
+        JPEG versions of cached originals: the original itself when it already
+        is a JPEG, otherwise a conversion downscaled to poster size. All
+        conversions run in one `images.transcode_batch` call.
+
+        Returns:
+            dict: digest -> JPEG path, or None if the conversion failed.
+        """
+        found = {}
+        convert = []
+        for digest in dict.fromkeys(digests):
+            blob = self.blobs / digest
+            with blob.open("rb") as f:
+                if is_jpeg(f.read(3)):
+                    found[digest] = blob
+                else:
+                    convert.append(digest)
+        if convert:
+            from images import ImageCache, transcode_batch
+            converted = transcode_batch([self.blobs / digest for digest in convert],
+                                        ImageCache(self.cache_dir / "jpeg"), ("poster",))
+            for digest in convert:
+                outputs = converted.get(str(self.blobs / digest))
+                found[digest] = outputs["poster"] if outputs else None
+        return found
+
+    def save(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.index, indent=4, ensure_ascii=False)
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.index_file)
+
+def fetch_posters(urls: Iterable[str],
+                  cache: PosterCache,
+                  workers: int = 8,
+                  refresh: bool = False,
+                  timeout: int = 10) -> dict:
+    """
+    Download posters concurrently over one pooled session.
+
+    Cached URLs are not downloaded again unless `refresh` is set, in which
+    case the request is conditional (ETag / Last-Modified) and an unchanged
+    poster costs a 304.
+
+    Args:
+        urls (Iterable[str]): Poster URLs; duplicates are fetched once.
+        cache (PosterCache): Cache to read from and store into.
+        workers (int): Concurrent downloads.
+        refresh (bool): Revalidate cached posters with the server.
+        timeout (int): Timeout per request (seconds).
+
+    Non-JPEG posters are converted together after the downloads finish.
+
+    Returns:
+        dict: url -> JPEG path in the cache, or None if the download or
+            conversion failed.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def fetch(url):
+        meta = cache.get(url)
+        if meta and not refresh:
+            return url, meta["sha1"]
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and meta:
+                return url, meta["sha1"]
+            response.raise_for_status()
+            meta = cache.put(url, response.content,
+                             response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return url, meta["sha1"]
+        except Exception as e:
+            print(f"❌ 下载 poster 失败: {url} - {e}")
+            if meta:
+                return url, meta["sha1"]
+            return url, None
+
+    unique = list(dict.fromkeys(u for u in urls if u))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            digests = dict(executor.map(fetch, unique))
+    finally:
+        session.close()
+        cache.save()
+    jpegs = cache.jpeg_paths(digest for digest in digests.values() if digest)
+    return {url: jpegs[digest] if digest else None for url, digest in digests.items()}
+
+def install_poster(source: Path, target: Path) -> bool:
+    """
+    Copy a cached JPEG poster byte-for-byte to `target`.
+
+    Args:
+        source (Path): JPEG file from the cache.
+        target (Path): Destination, e.g. <model_dir>/poster.jpg.
+
+    Returns:
+        bool: True if the target was written, False if it already had the same content.
+    """
+    if target.is_file() and target.stat().st_size == source.stat().st_size:
+        if target.read_bytes() == source.read_bytes():
+            return False
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    shutil.copyfile(source, target)
+    return True
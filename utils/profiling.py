@@ -0,0 +1,354 @@
+"""
+This module provides opt-in profiling hooks for whole runs
+
+Hot paths are marked once with `profiled` / `stage` / `count`; while
+profiling is disabled (the default) a hook costs one global flag check.
+
+    with profile_session("run_profile"):      # writes run_profile.json / .txt
+        ...
+
+Every entry point that takes `--profile PATH` (or reads the PROFILE
+environment variable) wraps its run in `profile_session`.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# File-system calls counted when `syscalls` is enabled
+TRACED_CALLS = ["stat", "lstat", "scandir", "listdir", "open", "link", "symlink", "unlink",
+                "replace", "rename", "mkdir", "utime"]
+
+_enabled = False
+
+def _proc_io() -> dict:
+    """Process I/O counters from /proc/self/io (syscr/syscw = read/write syscalls), Linux only."""
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f if ":" in line)}
+    except OSError:
+        return {}
+
+def _peak_rss() -> Optional[int]:
+    """Peak resident set size in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class _Stats:
+    """Accumulated statistics of one stage."""
+
+    __slots__ = ("calls", "total", "max", "errors", "syscalls")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.syscalls = 0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "total": round(self.total, 6), "max": round(self.max, 6),
+                "mean": round(self.total / self.calls, 6) if self.calls else None,
+                "errors": self.errors, "syscalls": self.syscalls}
+
+class Profiler:
+    """
+    Process-wide collector behind the hooks.
+
+    Stage times are inclusive: a nested stage also counts towards its
+    parents. Traced file-system calls are attributed to every stage open in
+    the calling thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        # Read outside the lock: the read itself may be traced
+        io_start = _proc_io()
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+            self.syscalls = {}
+            self.started = time.perf_counter()
+            self.elapsed = None
+            self.io_start = io_start
+            self.io_end = None
+            self.memory_peak = None
+            self.profile_text = None
+            self.profile_top = None
+
+    def enter(self, name: str) -> None:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(name)
+
+    def leave(self, name: str, elapsed: float, failed: bool) -> None:
+        self.local.stack.pop()
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = _Stats()
+            stats.calls += 1
+            stats.total += elapsed
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if failed:
+                stats.errors += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def syscall(self, name: str) -> None:
+        stack = getattr(self.local, "stack", None) or ()
+        with self.lock:
+            self.syscalls[name] = self.syscalls.get(name, 0) + 1
+            for stage_name in set(stack):
+                stats = self.stages.get(stage_name)
+                if stats is None:
+                    stats = self.stages[stage_name] = _Stats()
+                stats.syscalls += 1
+
+    def report(self) -> dict:
+        io_now = _proc_io() if self.io_end is None else None
+        with self.lock:
+            elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+            io_end = self.io_end if self.io_end is not None else io_now
+            data = {
+                "elapsed": round(elapsed, 6),
+                "stages": {name: s.to_dict() for name, s in
+                           sorted(self.stages.items(), key=lambda item: -item[1].total)},
+                "counters": dict(sorted(self.counters.items())),
+                "syscalls": dict(sorted(self.syscalls.items(), key=lambda item: -item[1])),
+                "io": {k: io_end.get(k, 0) - self.io_start.get(k, 0) for k in io_end},
+                "memory": {"peak_rss": _peak_rss(), "peak_traced": self.memory_peak},
+            }
+            if self.profile_top is not None:
+                data["profile"] = self.profile_top
+        return data
+
+PROFILER = Profiler()
+
+# === Hooks ===
+
+def enabled() -> bool:
+    return _enabled
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        PROFILER.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        PROFILER.leave(self.name, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def stage(name: str):
+    """Context manager timing a block as stage `name`."""
+    return _Stage(name) if _enabled else _NO_STAGE
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator timing every call of a function as stage `name` (default: module.function)."""
+
+    def decorator(func):
+        stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name`."""
+    if _enabled:
+        PROFILER.count(name, n)
+
+# === File-System Call Tracing ===
+
+_originals = {}
+
+def _traced(name: str, func: Callable) -> Callable:
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        PROFILER.syscall(name)
+        return func(*args, **kwargs)
+    return wrapper
+
+def _trace_syscalls() -> None:
+    import builtins
+    for name in TRACED_CALLS:
+        owner = builtins if name == "open" else os
+        if (owner, name) not in _originals and hasattr(owner, name):
+            _originals[(owner, name)] = getattr(owner, name)
+            setattr(owner, name, _traced(name, getattr(owner, name)))
+
+def _untrace_syscalls() -> None:
+    for (owner, name), func in _originals.items():
+        setattr(owner, name, func)
+    _originals.clear()
+
+# === Sessions ===
+
+def enable(syscalls: bool = True, memory: bool = False) -> None:
+    """
+    Start collecting (resets previous data).
+
+    Args:
+        syscalls (bool): Count file-system calls made through `os` / `open`.
+        memory (bool): Track the Python heap peak with tracemalloc (slow).
+    """
+    global _enabled
+    PROFILER.reset()
+    if syscalls:
+        _trace_syscalls()
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+    _enabled = True
+
+def disable() -> None:
+    """Stop collecting; the data stays available to `report`."""
+    global _enabled
+    _enabled = False
+    _untrace_syscalls()
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        PROFILER.memory_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    PROFILER.elapsed = time.perf_counter() - PROFILER.started
+    PROFILER.io_end = _proc_io()
+
+def report() -> dict:
+    return PROFILER.report()
+
+def _size(n: Optional[int]) -> str:
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+def text_report(data: Optional[dict] = None) -> str:
+    """Human-readable form of `report()`."""
+    data = data if data is not None else report()
+    lines = [f"elapsed: {data['elapsed']:.3f}s", "",
+             f"{'stage':<40} {'calls':>8} {'total s':>10} {'mean ms':>10} {'max ms':>10} {'syscalls':>9}"]
+    for name, s in data["stages"].items():
+        mean = f"{s['mean'] * 1000:.2f}" if s["mean"] is not None else "-"
+        lines.append(f"{name:<40} {s['calls']:>8} {s['total']:>10.3f} {mean:>10} {s['max'] * 1000:>10.2f} "
+                     f"{s['syscalls']:>9}" + (f"  ({s['errors']} errors)" if s["errors"] else ""))
+    if data["counters"]:
+        lines += ["", "counters:"] + [f"  {k}: {v}" for k, v in data["counters"].items()]
+    if data["syscalls"]:
+        lines += ["", "file-system calls:"] + [f"  {k}: {v}" for k, v in data["syscalls"].items()]
+    if data["io"]:
+        io_data = data["io"]
+        lines += ["", f"io: {io_data.get('syscr', 0)} read / {io_data.get('syscw', 0)} write syscalls, "
+                      f"{_size(io_data.get('rchar'))} read, {_size(io_data.get('wchar'))} written"]
+    memory = data["memory"]
+    lines.append(f"memory: peak rss {_size(memory['peak_rss'])}, peak traced {_size(memory['peak_traced'])}")
+    if PROFILER.profile_text:
+        lines += ["", PROFILER.profile_text]
+    return "\n".join(lines) + "\n"
+
+def write_report(path: str) -> str:
+    """Write <path>.json and <path>.txt; returns <path> without extension."""
+    data = report()
+    base = path[:-5] if path.endswith(".json") else path
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    with open(f"{base}.txt", "w", encoding="utf-8") as f:
+        f.write(text_report(data))
+    return base
+
+@contextmanager
+def profile_session(path: Optional[str], cprofile: bool = False, memory: bool = False, syscalls: bool = True,
+                    top: int = 30):
+    """
+    Profile the enclosed block and write the report to `path` (.json and
+    .txt); does nothing when `path` is empty.
+
+    Args:
+        path (str, optional): Report path without extension.
+        cprofile (bool): Also run cProfile (calling thread only) and include
+            the `top` functions by cumulative time.
+        memory (bool): Track the Python heap peak with tracemalloc.
+        syscalls (bool): Count file-system calls.
+    """
+    if not path:
+        yield
+        return
+    enable(syscalls=syscalls, memory=memory)
+    profile = cProfile.Profile() if cprofile else None
+    if profile is not None:
+        profile.enable()
+    try:
+        with stage("run"):
+            yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(profile, stream=out).sort_stats("cumulative")
+            stats.print_stats(top)
+            PROFILER.profile_text = out.getvalue()
+            PROFILER.profile_top = [
+                {"function": f"{file}:{line}({func})", "calls": nc, "total": round(tt, 6), "cumulative": round(ct, 6)}
+                for (file, line, func), (cc, nc, tt, ct, callers) in
+                sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top]
+            ]
+        disable()
+        base = write_report(path)
+        print(f"📊 profile 已写入 {base}.json / {base}.txt")
+
+def add_profile_arguments(parser) -> None:
+    """Add --profile / --profile-cprofile / --profile-memory to an argparse parser."""
+    parser.add_argument("--profile", metavar="PATH", default=os.environ.get("PROFILE"),
+                        help="Write a timing report to PATH.json / PATH.txt")
+    parser.add_argument("--profile-cprofile", action="store_true", help="Include cProfile's top functions")
+    parser.add_argument("--profile-memory", action="store_true", help="Track the heap peak with tracemalloc")
+
+def session_from_args(args):
+    """`profile_session` configured by the arguments of `add_profile_arguments`."""
+    return profile_session(args.profile, cprofile=args.profile_cprofile, memory=args.profile_memory)
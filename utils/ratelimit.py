@@ -0,0 +1,240 @@
+"""
+This module provides adaptive per-host rate limiting for the spider
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+# === Status Handling ===
+
+# Responses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = {429, 503}
+
+# Responses worth another attempt
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value (str): Header value, either delta-seconds or an HTTP date.
+
+    Returns:
+        float or None: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with jitter.
+
+    Half of the exponential delay is fixed and the other half is random, so
+    retries of concurrent workers spread out without ever becoming zero.
+
+    Args:
+        attempt (int): 1-based attempt number that just failed.
+        base (float): Delay after the first failure (seconds).
+        cap (float): Upper bound of the delay (seconds).
+
+    Returns:
+        float: Seconds to sleep before the next attempt.
+    """
+    delay = min(cap, base * (2 ** max(0, attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# === Limiters ===
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `burst`.
+    Not thread-safe on its own; `HostLimiter` guards it with its lock.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self.refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+class HostLimiter:
+    """
+    Rate and concurrency limiter for a single host.
+
+    Requests are paced by a token bucket and capped by a concurrency window.
+    Both adapt AIMD-style: every successful response increases them
+    additively, every throttling signal (429/503, timeouts, server errors)
+    halves them. A Retry-After header pauses the host for the given time,
+    capped at `max_retry_after` so a bogus header cannot stall it for hours.
+    """
+
+    def __init__(self,
+                 host: str,
+                 rate: float = 2.0,
+                 min_rate: float = 0.1,
+                 max_rate: float = 20.0,
+                 burst: float = 2.0,
+                 concurrency: float = 2.0,
+                 max_concurrency: int = 16,
+                 increase: float = 0.1,
+                 decrease: float = 0.5,
+                 max_retry_after: float = 60.0):
+        self.host = host
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retry_after = max_retry_after
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.cond = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self) -> float:
+        """
+        Block until a request to this host may start.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        with self.cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        self.cond.wait(self.paused_until - now)
+                        continue
+                    if self.in_flight >= max(1, int(self.concurrency)):
+                        self.cond.wait()
+                        continue
+                    wait = self.bucket.wait_time()
+                    if wait > 0:
+                        self.cond.wait(wait)
+                        continue
+                    self.bucket.take()
+                    self.in_flight += 1
+                    self.requests += 1
+                    return time.monotonic() - start
+            finally:
+                self.waiting -= 1
+
+    def retry_delay(self, retry_after: Optional[float]) -> Optional[float]:
+        """Retry-After seconds capped at `max_retry_after` (None stays None)."""
+        return None if retry_after is None else min(retry_after, self.max_retry_after)
+
+    def release(self, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """
+        Report the outcome of a request started with `acquire`.
+
+        Args:
+            status (int): HTTP status code, or None if the request failed without a response.
+            retry_after (float): Seconds from a Retry-After header, if any
+                (capped at `max_retry_after`).
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if status is not None and status < 400:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.increase)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            elif status is None or status in RETRY_STATUSES:
+                if status in THROTTLE_STATUSES:
+                    self.throttled += 1
+                else:
+                    self.errors += 1
+                self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+                self.concurrency = max(1.0, self.concurrency * self.decrease)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + self.retry_delay(retry_after))
+            self.cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self.cond:
+            return {
+                "rate": round(self.bucket.rate, 3),
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "paused": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            }
+
+class RateLimiter:
+    """
+    Registry of `HostLimiter` instances, created on first use per host.
+
+    Args:
+        **defaults: Keyword arguments passed to every new `HostLimiter`.
+    """
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.overrides = {}
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def configure(self, host: str, **options) -> None:
+        """Override limiter options for one host (before its first request)."""
+        with self.lock:
+            self.overrides[host] = options
+            self.hosts.pop(host, None)
+
+    def host(self, url: str) -> HostLimiter:
+        """Return the limiter responsible for the host of `url`."""
+        host = urlparse(url).netloc.lower() or url
+        with self.lock:
+            limiter = self.hosts.get(host)
+            if limiter is None:
+                options = dict(self.defaults)
+                options.update(self.overrides.get(host, {}))
+                limiter = self.hosts[host] = HostLimiter(host, **options)
+            return limiter
+
+    def metrics(self) -> dict:
+        """Current rate and queue depth of every known host."""
+        with self.lock:
+            hosts = list(self.hosts.values())
+        return {limiter.host: limiter.metrics() for limiter in hosts}
@@ -0,0 +1,335 @@
+"""
+This module provides record/replay support for exercising the spider offline
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+# === Corpus ===
+
+def corpus_key(url: str) -> str:
+    """
+    Host-independent key of a URL, so a corpus recorded from a live site can
+    be served from any local address.
+
+    Args:
+        url (str): Absolute URL or path.
+
+    Returns:
+        str: Path plus query string, e.g. "/video?page=3".
+    """
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    return f"{path}?{parsed.query}" if parsed.query else path
+
+class Corpus:
+    """
+    Directory of recorded responses.
+
+    Layout:
+    /corpus
+        index.json      key -> {"file", "status", "content_type"}
+        /pages
+            <sha1>.body
+
+    Args:
+        directory (str): Corpus directory, created if missing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pages_dir = os.path.join(directory, "pages")
+        self.index_file = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r") as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return corpus_key(url) in self.index
+
+    def record(self, url: str, body: bytes, status: int = 200, content_type: str = "text/html; charset=utf-8") -> None:
+        """Store one response body under the key of `url`."""
+        key = corpus_key(url)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".body"
+        os.makedirs(self.pages_dir, exist_ok=True)
+        with open(os.path.join(self.pages_dir, name), "wb") as f:
+            f.write(body)
+        with self.lock:
+            self.index[key] = {"file": name, "status": status, "content_type": content_type}
+
+    def lookup(self, url: str) -> Optional[tuple]:
+        """
+        Args:
+            url (str): URL or path to look up.
+
+        Returns:
+            tuple or None: (status, content_type, body) if recorded.
+        """
+        meta = self.index.get(corpus_key(url))
+        if meta is None:
+            return None
+        with open(os.path.join(self.pages_dir, meta["file"]), "rb") as f:
+            body = f.read()
+        return meta["status"], meta["content_type"], body
+
+    def save(self) -> None:
+        """Write the index to disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            with open(self.index_file, "w") as f:
+                json.dump(self.index, f, indent=4, ensure_ascii=False)
+
+class RecordingSession:
+    """
+    Wraps a requests session and records every response into a corpus.
+
+    Pass it as `session=` to `fetch_with_retry`, or assign it to
+    `spider.default_session` to record a whole workflow.
+
+    Args:
+        corpus (Corpus): Corpus to record into.
+        session (requests.Session, optional): Session performing the real requests.
+    """
+
+    def __init__(self, corpus: Corpus, session=None):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.corpus = corpus
+        self.session = session
+
+    def get(self, url, **kwargs):
+        res = self.session.get(url, **kwargs)
+        if res.status_code < 400:
+            self.corpus.record(url, res.content, res.status_code,
+                               res.headers.get("Content-Type", "text/html; charset=utf-8"))
+        return res
+
+    def close(self):
+        self.corpus.save()
+        self.session.close()
+
+# === Replay Server ===
+
+class ReplayServer:
+    """
+    Local HTTP server replaying a corpus.
+
+    Args:
+        corpus (Corpus): Recorded responses to serve.
+        latency (float): Base delay added to every response (seconds).
+        jitter (float): Random extra delay up to this many seconds.
+        error_rate (float): Probability of answering with `error_status` instead.
+        error_status (int): Status used for injected errors (e.g. 503 or 429).
+        retry_after (int, optional): Retry-After header sent with injected errors.
+        port (int): Port to bind, 0 for any free port.
+        seed (int, optional): Seed for reproducible latency and error injection.
+        require_cookie (str, optional): Answer 403 to requests without this
+            cookie, like pages behind a login.
+    """
+
+    def __init__(self,
+                 corpus: Corpus,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 retry_after: Optional[int] = None,
+                 port: int = 0,
+                 seed: Optional[int] = None,
+                 require_cookie: Optional[str] = None):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.require_cookie = require_cookie
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.hits = 0
+        self.errors = 0
+        self.misses = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.random_lock:
+                    delay = server.latency + server.random.uniform(0, server.jitter)
+                    inject = server.random.random() < server.error_rate
+                if delay:
+                    time.sleep(delay)
+
+                if inject:
+                    server.errors += 1
+                    self.send_response(server.error_status)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if server.require_cookie is not None:
+                    cookies = [c.split("=", 1)[0].strip() for c in self.headers.get("Cookie", "").split(";")]
+                    if server.require_cookie not in cookies:
+                        self.send_error(403)
+                        return
+
+                found = server.corpus.lookup(self.path)
+                if found is None:
+                    server.misses += 1
+                    self.send_error(404)
+                    return
+                server.hits += 1
+                status, content_type, body = found
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# === Synthetic Corpus ===
+
+def synthetic_tyingart_corpus(directory: str, category: str = "video", pages: int = 5, entries_per_page: int = 20) -> Corpus:
+    """
+    Generate a corpus shaped like a tyingart listing and its detail pages.
+
+    Listing pages are served at "/<category>?page=N" and link to
+    "/<category>/<code>" detail pages carrying the og/meta tags and model
+    block the extractors look for.
+
+    Args:
+        directory (str): Corpus directory.
+        category (str): Listing path and detail page prefix.
+        pages (int): Number of listing pages.
+        entries_per_page (int): Detail links per listing page.
+
+    Returns:
+        Corpus: The saved corpus.
+    """
+    corpus = Corpus(directory)
+    for p in range(pages):
+        links = []
+        for n in range(entries_per_page):
+            code = f"sy{p * entries_per_page + n:05d}"
+            links.append(f'<li><a href="/{category}/{code}">Entry {code}</a></li>')
+            detail = (
+                "<html><head>"
+                f'<meta property="og:title" content="TY.{code.upper()} Synthetic entry {code} 2024" />'
+                f'<meta property="og:url" content="https://tyingart.com/{category}/{code}" />'
+                f'<meta name="description" content="Description of {code} &amp; more" />'
+                '<meta name="keywords" content="rope,studio,synthetic" />'
+                "</head><body>"
+                '<div class="field-name-taxonomy-vocabulary-2">'
+                '<div class="field-label">出演モデル:&nbsp;</div>'
+                f'<a href="/model/m{n % 7}">Model {n % 7}</a>'
+                "</div>"
+                + "<p>filler</p>" * 200 +
+                "</body></html>"
+            )
+            corpus.record(f"/{category}/{code}", detail.encode("utf-8"))
+        listing = (
+            f"<html><body><a href=\"/{category}\">All</a><ul>"
+            + "".join(links) +
+            "</ul></body></html>"
+        )
+        corpus.record(f"/{category}?page={p}", listing.encode("utf-8"))
+    corpus.save()
+    return corpus
+
+def synthetic_syclub_corpus(directory: str, site: str, pages: int = 2, posts_per_page: int = 5,
+                            js_every: int = 0) -> Corpus:
+    """
+    Generate a corpus shaped like syclub category listings and posts.
+
+    Listing pages are served at "/category/uncategorized/page/N" (N from 1)
+    and link to "<site>/<year>/post-<n>.html" posts whose player config is a
+    server-rendered `video_data = [{"src": ...}];` script. Every `js_every`-th
+    post leaves the config to a script instead, like posts that need the
+    browser fallback.
+
+    Args:
+        directory (str): Corpus directory.
+        site (str): Site root the listing links point to, e.g. `ReplayServer.url`.
+        pages (int): Number of listing pages.
+        posts_per_page (int): Post links per listing page.
+        js_every (int): Make every n-th post JavaScript-only; 0 for none.
+
+    Returns:
+        Corpus: The saved corpus.
+    """
+    site = site.rstrip("/")
+    corpus = Corpus(directory)
+    for p in range(1, pages + 1):
+        links = []
+        for n in range(posts_per_page):
+            number = (p - 1) * posts_per_page + n + 1
+            path = f"/2024/post-{number}.html"
+            links.append(f'<h2><a href="{site}{path}">Post {number}</a></h2>')
+            if js_every and number % js_every == 0:
+                player = '<script src="/wp-content/player.js"></script>'
+            else:
+                player = ("<script>var video_data = "
+                          + json.dumps([{"src": f"https://cdn.example.com/v/{number}.mp4", "type": "video/mp4"}])
+                          + ";</script>")
+            post = (
+                "<html><head>"
+                f"<title>作品 {number} &amp; 花絮 &#8211; SYCLUB</title>"
+                "</head><body>"
+                + "<p>filler</p>" * 100 + player +
+                "</body></html>"
+            )
+            corpus.record(path, post.encode("utf-8"))
+        listing = (
+            f'<html><body><a href="{site}/">Home</a>'
+            + "".join(links) +
+            "</body></html>"
+        )
+        corpus.record(f"/category/uncategorized/page/{p}", listing.encode("utf-8"))
+    corpus.save()
+    return corpus
@@ -0,0 +1,151 @@
+"""
+This module resolves the sidecar files of videos (covers, posters, fanart,
+subtitles) from one listing per media directory
+
+Layout:
+/series
+    video.mp4
+    video.Cover.jpg         cover
+    video-fanart.jpg        fanart
+    video.zh.srt            subtitle
+    poster.jpg              poster shared by every video of the directory
+"""
+
+import fnmatch
+import glob
+import re
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from link_plan import SourceIndex
+
+# kind -> name patterns, tried in order; {stem} is the video name without
+# extension. Patterns are shell-style and matched case-insensitively.
+DEFAULT_RULES = {
+    "cover": ["{stem}.Cover.jpg", "{stem}.Cover.jpeg", "{stem}-cover.jpg", "{stem}.Cover.png"],
+    "poster": ["{stem}-poster.jpg", "{stem}.jpg", "{stem}.jpeg", "{stem}.png",
+               "poster.jpg", "poster.jpeg", "folder.jpg", "cover.jpg"],
+    "fanart": ["{stem}-fanart.jpg", "{stem}.fanart.jpg", "fanart.jpg", "backdrop.jpg"],
+    "subtitle": ["{stem}.srt", "{stem}.*.srt", "{stem}.ass", "{stem}.*.ass", "{stem}.vtt", "{stem}.*.vtt"],
+}
+
+# Kinds that hold one file; the others collect every match
+SINGLE_KINDS = {"cover", "poster", "fanart"}
+
+_WILDCARD = re.compile(r"[*?\[]")
+
+class SidecarDir:
+    """
+    Files of one media directory, indexed by lower-cased name.
+
+    Built from a `DirSnapshot`, so it costs no syscalls beyond the listing
+    the snapshot already made.
+    """
+
+    def __init__(self, path: Path, names: List[str]):
+        self.path = Path(path)
+        self.names = set(names)
+        self.by_lower = {}
+        for name in sorted(names):
+            self.by_lower.setdefault(name.lower(), name)
+        self.lowers = sorted(self.by_lower)
+
+    def match(self, pattern: str) -> List[str]:
+        """File names matching a (lower-cased) shell pattern."""
+        m = _WILDCARD.search(pattern)
+        if m is None:
+            name = self.by_lower.get(pattern)
+            return [name] if name is not None else []
+        # Only names sharing the literal prefix can match
+        prefix = pattern[:m.start()]
+        regex = re.compile(fnmatch.translate(pattern))
+        found = []
+        for lower in self.lowers[bisect_left(self.lowers, prefix):]:
+            if not lower.startswith(prefix):
+                break
+            if regex.match(lower):
+                found.append(self.by_lower[lower])
+        return found
+
+class SidecarResolver:
+    """
+    In-memory sidecar lookup for videos.
+
+    Every media directory is listed once (through a shared `SourceIndex`, so
+    the link planner reuses the same listings) and all lookups in it are
+    answered from memory.
+
+    Args:
+        rules (dict, optional): kind -> name patterns (default: DEFAULT_RULES).
+        sources (SourceIndex, optional): Shared directory snapshots.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, List[str]]] = None, sources: Optional[SourceIndex] = None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.sources = sources if sources is not None else SourceIndex()
+        self.dirs = {}
+        self.lock = threading.Lock()
+
+    def directory(self, path: Path) -> SidecarDir:
+        key = str(path)
+        with self.lock:
+            sidecar_dir = self.dirs.get(key)
+        if sidecar_dir is None:
+            snap = self.sources.snapshot(Path(path))
+            # entries: name -> (inode, is_symlink, is_file, is_dir); symlinks count as files
+            names = [name for name, info in snap.entries.items() if info[2] or (info[1] and not info[3])]
+            sidecar_dir = SidecarDir(path, names)
+            with self.lock:
+                sidecar_dir = self.dirs.setdefault(key, sidecar_dir)
+        return sidecar_dir
+
+    def sidecars(self, video: Path) -> Dict[str, List[Path]]:
+        """
+        Sidecars of a video: kind -> paths, best match first. Kinds without
+        a match are left out.
+        """
+        video = Path(video)
+        sidecar_dir = self.directory(video.parent)
+        stem = glob.escape(video.stem.lower())
+        taken = {video.name}
+        found = {}
+        for kind, patterns in self.rules.items():
+            paths = []
+            for pattern in patterns:
+                for name in sidecar_dir.match(pattern.lower().replace("{stem}", stem)):
+                    if name not in taken:
+                        taken.add(name)
+                        paths.append(sidecar_dir.path / name)
+                if paths and kind in SINGLE_KINDS:
+                    break
+            if paths:
+                found[kind] = paths
+        return found
+
+    def find(self, video: Path, *kinds: str) -> Optional[Path]:
+        """First sidecar of the first kind that has one, e.g. find(video, "cover", "poster")."""
+        found = self.sidecars(video)
+        for kind in kinds:
+            if kind in found:
+                return found[kind][0]
+        return None
+
+    def poster(self, video: Path) -> Optional[Path]:
+        return self.find(video, "cover", "poster")
+
+    def exists(self, path: Path) -> bool:
+        path = Path(path)
+        return path.name in self.directory(path.parent).names
+
+def sidecar_suffix(video: Path, sidecar: Path) -> str:
+    """
+    Part of a sidecar's name after the video stem, e.g. ".zh.srt" for
+    video.zh.srt, so it can be renamed along with the video.
+    """
+    stem = Path(video).stem
+    name = Path(sidecar).name
+    if name.lower().startswith(stem.lower()):
+        return name[len(stem):]
+    return Path(sidecar).suffix
@@ -7,12 +7,26 @@ import requests
 import re
 import json
 from bs4 import BeautifulSoup
-from metadata import load_metadata, save_metadata, metadata_sorted, model_metadata_template, video_metadata_template, album_metadata_template, img_metadata_template
+from metadata import load_metadata, save_metadata, model_metadata_template, video_metadata_template, album_metadata_template, img_metadata_template
+from ratelimit import RateLimiter, RETRY_STATUSES, THROTTLE_STATUSES, backoff_delay, parse_retry_after
+from metrics import MetricsRegistry, serve_metrics
+from pipeline import Pipeline
+import os
+import socket
+import threading
 import time
-import random
+from typing import Optional
+from html import unescape
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
 from functools import wraps
 import logging
+from profiling import profiled, profile_session
 
 # 设置日志配置
 logging.basicConfig(
@@ -31,33 +45,142 @@ def log_call(func):
             raise
     return wrapper
 
+# Connection timings of the current thread's request, filled by TimedHTTPAdapter
+_connection_timing = threading.local()
+
+def _timed_connection(base):
+    class TimedConnection(base):
+        # Resolve the host ourselves so DNS and TCP/TLS setup are timed separately,
+        # then try every address in turn like urllib3's create_connection.
+        # `_dns_host` is only used for the socket; SNI and Host keep `self.host`.
+        def _new_conn(self):
+            start = time.perf_counter()
+            dns_host = self._dns_host
+            try:
+                infos = socket.getaddrinfo(dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            except (socket.gaierror, UnicodeError):
+                # Let urllib3 resolve again and raise its own error
+                return super()._new_conn()
+            finally:
+                _connection_timing.dns = time.perf_counter() - start
+            error = None
+            try:
+                for address in dict.fromkeys(info[4][0] for info in infos):
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except (NewConnectionError, ConnectTimeoutError) as e:
+                        error = e
+            finally:
+                self._dns_host = dns_host
+            if error is None:
+                return super()._new_conn()
+            raise error
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            _connection_timing.connect = time.perf_counter() - start - (getattr(_connection_timing, "dns", None) or 0)
+
+    return TimedConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter recording DNS and connect time of new connections in `_connection_timing`."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("TimedHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": _timed_connection(HTTPConnection)}),
+            "https": type("TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": _timed_connection(HTTPSConnection)}),
+        }
+
+def make_session(cookies: Optional[dict] = None, pool_size: int = 16) -> requests.Session:
+    """
+    Create a pooled, instrumented HTTP session.
+
+    Args:
+        cookies (dict, optional): Cookies to send with every request, e.g. a login cookie.
+        pool_size (int): Maximum number of kept-alive connections per host.
+
+    Returns:
+        requests.Session: Session reusing connections across requests.
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if cookies:
+        session.cookies.update(cookies)
+    return session
+
+# Shared limiter, session and metrics used by every fetch unless passed explicitly
+default_limiter = RateLimiter()
+default_session = make_session()
+spider_metrics = MetricsRegistry()
+spider_metrics.add_source("limiter", lambda: default_limiter.metrics())
+
 @log_call
-def fetch_with_retry(url, retries=2, delay=5, timeout=5):
+@profiled("spider.fetch")
+def fetch_with_retry(url, retries=2, delay=5, timeout=5, limiter=None, session=None):
     """
     Fetches a URL with retry support.
 
+    Requests are paced by a per-host adaptive limiter. Failed attempts back off
+    exponentially with jitter, and 429/503 responses honor Retry-After (capped by the host limiter). Every
+    attempt is recorded in `spider_metrics` (DNS, connect, TTFB, total time,
+    bytes, status and attempt number).
+
     Args:
         url (str): URL to fetch.
         retries (int): Number of retry attempts.
-        delay (int): Delay between retries (seconds).
+        delay (int): Base delay between retries (seconds), doubled per attempt.
         timeout (int): Timeout per request (seconds).
+        limiter (RateLimiter, optional): Limiter to use instead of `default_limiter`.
+        session (requests.Session, optional): Session to use instead of `default_session`.
 
     Returns:
         str or None: HTML content if successful, else None.
     """
+    host = (limiter or default_limiter).host(url)
     for attempt in range(1, retries + 1):
+        status = None
+        retry_after = None
+        waited = host.acquire()
+        _connection_timing.dns = _connection_timing.connect = None
+        record = {"url": url, "host": host.host, "attempt": attempt, "wait": waited,
+                  "status": None, "bytes": 0, "ttfb": None, "total": None}
+        start = time.perf_counter()
         try:
             print(f"Fetching (attempt {attempt}): {url}")
-            res = requests.get(url, timeout=timeout)
+            res = (session or default_session).get(url, timeout=timeout, stream=True)
+            record["ttfb"] = time.perf_counter() - start
+            status = record["status"] = res.status_code
+            record["bytes"] = len(res.content)
+            record["total"] = time.perf_counter() - start
+            if status in THROTTLE_STATUSES:
+                retry_after = host.retry_delay(parse_retry_after(res.headers.get("Retry-After")))
             res.raise_for_status()  # Raises HTTPError for bad responses (4xx, 5xx)
             return res.text
         except RequestException as e:
+            record["error"] = str(e)
             print(f"Attempt {attempt} failed: {e}")
-            if attempt < retries:
-                time.sleep(delay)
-            else:
-                print(f"Failed to fetch {url} after {retries} attempts.")
-                return None
+        finally:
+            host.release(status, retry_after)
+            record["dns"] = getattr(_connection_timing, "dns", None)
+            record["connect"] = getattr(_connection_timing, "connect", None)
+            if record["total"] is None:
+                record["total"] = time.perf_counter() - start
+            spider_metrics.record_request(record)
+
+        if status is not None and status not in RETRY_STATUSES:
+            print(f"Not retrying {url}: HTTP {status}")
+            return None
+        if attempt < retries:
+            time.sleep(retry_after if retry_after is not None else backoff_delay(attempt, base=delay))
+        else:
+            print(f"Failed to fetch {url} after {retries} attempts.")
+            return None
+
 @log_call
 def entry_extract_from_page(url: str, keywords:list, max_page: int=100,) -> list:
     """
@@ -80,33 +203,47 @@ def entry_extract_from_page(url: str, keywords:list, max_page: int=100,) -> list
         html = fetch_with_retry(page_url)
         if not html:
             raise ValueError(f"Failed to connect to {page_url}")
-        soup = BeautifulSoup(html, 'html.parser')
+        with spider_metrics.timer("parse", stage="listing"):
+            entries.extend(entry_parse_page(html, keywords))
+
+    return entries
+
+@profiled("spider.parse.page")
+def entry_parse_page(html: str, keywords: list) -> list:
+    """
+    Parse entry links from a listing page.
+
+    Args:
+        html (str): Listing page HTML.
+        keywords (list): Href prefixes to keep. For example, ["/model/"]
+
+    Returns:
+        list: Lower-case hrefs of matching links.
+    """
+    entries = []
+    soup = BeautifulSoup(html, 'html.parser')
 
-        for link in soup.find_all("a"):
-            href = link.get('href')
-            txt = link.text
+    for link in soup.find_all("a"):
+        href = link.get('href')
 
-            for s in keywords:
-                if str(href).startswith(s):
-                    # print(txt)
-                    entries.append(f"{href.lower()}")
+        for s in keywords:
+            if str(href).startswith(s):
+                entries.append(f"{href.lower()}")
 
     return entries
 
-@log_call
-def album_extract_metadata(url: str) -> dict:
+@profiled("spider.parse.album")
+def album_parse_metadata(html: str, url: str = "") -> dict:
     """
-    Extract metadata from a given URL.
+    Parse metadata from an album page.
 
     Args:
-        url (str): The URL to extract metadata from.
+        html (str): Page HTML.
+        url (str): URL the page was fetched from.
 
     Returns:
         dict: A dictionary containing the extracted metadata.
     """
-    html = fetch_with_retry(url)
-    if not html:
-        raise ValueError(f"Failed to connect to {url}")
     soup = BeautifulSoup(html, 'html.parser')
     metadata = album_metadata_template.copy()
 
@@ -150,12 +287,12 @@ def album_extract_metadata(url: str) -> dict:
     return metadata
 
 @log_call
-def retail_extract_metadata(url: str) -> dict:
+def album_extract_metadata(url: str) -> dict:
     """
-    Extract metadata from a retail URL.
+    Extract metadata from a given URL.
 
     Args:
-        url (str): The retail URL to extract metadata from.
+        url (str): The URL to extract metadata from.
 
     Returns:
         dict: A dictionary containing the extracted metadata.
@@ -163,6 +300,21 @@ def retail_extract_metadata(url: str) -> dict:
     html = fetch_with_retry(url)
     if not html:
         raise ValueError(f"Failed to connect to {url}")
+    with spider_metrics.timer("parse", stage="album"):
+        return album_parse_metadata(html, url)
+
+@profiled("spider.parse.retail")
+def retail_parse_metadata(html: str, url: str = "") -> dict:
+    """
+    Parse metadata from a retail page.
+
+    Args:
+        html (str): Page HTML.
+        url (str): URL the page was fetched from.
+
+    Returns:
+        dict: A dictionary containing the extracted metadata.
+    """
     soup = BeautifulSoup(html, 'html.parser')
     metadata = video_metadata_template.copy()
 
@@ -210,7 +362,7 @@ def retail_extract_metadata(url: str) -> dict:
     return metadata
 
 @log_call
-def video_extract_metadata(url: str) -> dict:
+def retail_extract_metadata(url: str) -> dict:
     """
     Extract metadata from a retail URL.
 
@@ -223,6 +375,21 @@ def video_extract_metadata(url: str) -> dict:
     html = fetch_with_retry(url)
     if not html:
         raise ValueError(f"Failed to connect to {url}")
+    with spider_metrics.timer("parse", stage="retail"):
+        return retail_parse_metadata(html, url)
+
+@profiled("spider.parse.video")
+def video_parse_metadata(html: str, url: str = "") -> dict:
+    """
+    Parse metadata from a video page.
+
+    Args:
+        html (str): Page HTML.
+        url (str): URL the page was fetched from.
+
+    Returns:
+        dict: A dictionary containing the extracted metadata.
+    """
     soup = BeautifulSoup(html, 'html.parser')
     metadata = video_metadata_template.copy()
 
@@ -275,12 +442,12 @@ def video_extract_metadata(url: str) -> dict:
     return metadata
 
 @log_call
-def model_extract_metadata(url: str) -> dict:
+def video_extract_metadata(url: str) -> dict:
     """
-    Extract metadata from a model URL.
+    Extract metadata from a retail URL.
 
     Args:
-        url (str): The model URL to extract metadata from.
+        url (str): The retail URL to extract metadata from.
 
     Returns:
         dict: A dictionary containing the extracted metadata.
@@ -288,6 +455,21 @@ def model_extract_metadata(url: str) -> dict:
     html = fetch_with_retry(url)
     if not html:
         raise ValueError(f"Failed to connect to {url}")
+    with spider_metrics.timer("parse", stage="video"):
+        return video_parse_metadata(html, url)
+
+@profiled("spider.parse.model")
+def model_parse_metadata(html: str, url: str = "") -> dict:
+    """
+    Parse metadata from a model page.
+
+    Args:
+        html (str): Page HTML.
+        url (str): URL the page was fetched from.
+
+    Returns:
+        dict: A dictionary containing the extracted metadata.
+    """
     soup = BeautifulSoup(html, 'html.parser')
 
     info = model_metadata_template.copy()
@@ -320,15 +502,204 @@ def model_extract_metadata(url: str) -> dict:
         
         return info
 
+@log_call
+def model_extract_metadata(url: str) -> dict:
+    """
+    Extract metadata from a model URL.
+
+    Args:
+        url (str): The model URL to extract metadata from.
+
+    Returns:
+        dict: A dictionary containing the extracted metadata.
+    """
+    html = fetch_with_retry(url)
+    if not html:
+        raise ValueError(f"Failed to connect to {url}")
+    with spider_metrics.timer("parse", stage="model"):
+        return model_parse_metadata(html, url)
+
+def entry_path(url: str) -> str:
+    """
+    Normalize an entry URL or href to a comparable path.
+
+    Args:
+        url (str): Absolute URL or site-relative href, e.g. "/video/ab123".
+
+    Returns:
+        str: Lower-case path without duplicate or trailing slashes, e.g. "/video/ab123".
+    """
+    path = urlparse(url).path if "://" in url else url.split("?")[0]
+    path = re.sub(r'/+', '/', "/" + path.strip())
+    return path.rstrip("/").lower()
+
+def catalog_lookup(catalog: dict) -> dict:
+    """
+    Index an existing catalog by entry code and source URL.
+
+    Args:
+        catalog (dict): Catalog loaded with `load_metadata`.
+
+    Returns:
+        dict: Maps upper-case codes and normalized entry paths to their catalog key.
+    """
+    lookup = {}
+    for key, metadata in catalog.items():
+        if not isinstance(metadata, dict):
+            continue
+        code = metadata.get("code")
+        if isinstance(code, str) and code.strip():
+            lookup[code.strip().upper()] = key
+        url = metadata.get("url")
+        if isinstance(url, str) and url.strip():
+            lookup[entry_path(url)] = key
+    return lookup
+
+def catalog_find(lookup: dict, entry: str) -> Optional[str]:
+    """
+    Find the catalog key of a listing entry.
+
+    The entry is matched by its path first, then by the code guessed from the
+    last path segment (tyingart detail pages expose the code in og:url).
+
+    Args:
+        lookup (dict): Index built by `catalog_lookup`.
+        entry (str): Entry href or URL.
+
+    Returns:
+        str or None: Catalog key if the entry is already known.
+    """
+    path = entry_path(entry)
+    if path in lookup:
+        return lookup[path]
+    code = path.split("/")[-1].upper()
+    return lookup.get(code)
+
+def catalog_merge(catalog: dict, lookup: dict, metadata: dict) -> str:
+    """
+    Merge freshly extracted metadata into a catalog.
+
+    Known entries are updated in place and keep every field the new metadata
+    leaves empty (local paths, curated posters, ...). New entries are appended
+    under the next numeric key, or under their code when the catalog is keyed
+    by code.
+
+    Args:
+        catalog (dict): Catalog to update.
+        lookup (dict): Index built by `catalog_lookup`, updated with the new entry.
+        metadata (dict): Extracted metadata, including its "url".
+
+    Returns:
+        str: Catalog key the metadata was stored under.
+    """
+    key = catalog_find(lookup, metadata.get("url", ""))
+    code = metadata.get("code") or ""
+    if key is None and code:
+        key = lookup.get(code.upper())
+
+    if key is not None:
+        merged = dict(catalog[key])
+        for field, value in metadata.items():
+            if value not in ("", [], {}, None):
+                merged[field] = value
+        catalog[key] = merged
+    else:
+        numeric = [int(k) for k in catalog if str(k).isdigit()]
+        if code and code not in catalog and len(numeric) < len(catalog):
+            key = code
+        else:
+            key = str(max(numeric, default=0) + 1)
+        catalog[key] = metadata
+
+    if code:
+        lookup[code.upper()] = key
+    if metadata.get("url"):
+        lookup[entry_path(metadata["url"])] = key
+    return key
+
+PARSERS = {
+    "video": video_parse_metadata,
+    "album": album_parse_metadata,
+    "model": model_parse_metadata,
+    "retail": retail_parse_metadata,
+}
+
+class CatalogWriter:
+    """
+    Collects extracted metadata and flushes it to disk while the crawl runs.
+
+    In incremental mode entries are merged into the catalog and every flush
+    writes `output_file`. Otherwise entries are numbered by URL, and flushes
+    during the crawl go to `<output_file>.partial`; only `flush(final=True)`
+    replaces `output_file`.
+
+    Args:
+        output_file (str): JSON file to write.
+        catalog (dict, optional): Existing catalog to merge into (incremental mode).
+        flush_every (int): Flush after this many new entries.
+        flush_interval (float): Flush at least this often while entries arrive (seconds).
+    """
+
+    def __init__(self, output_file: str, catalog: Optional[dict] = None, flush_every: int = 50, flush_interval: float = 30.0):
+        self.output_file = output_file
+        self.partial_file = f"{output_file}.partial"
+        self.catalog = catalog
+        self.lookup = catalog_lookup(catalog) if catalog is not None else None
+        self.data = {}
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, metadata: dict) -> None:
+        if self.catalog is not None:
+            catalog_merge(self.catalog, self.lookup, metadata)
+        else:
+            self.data[metadata.get("url") or f"#{len(self.data)}"] = metadata
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, final: bool = False) -> None:
+        if self.catalog is not None:
+            save_metadata(self.catalog, self.output_file)
+        else:
+            # Numbered by URL so keys do not depend on completion order
+            data = {i: self.data[key] for i, key in enumerate(sorted(self.data), 1)}
+            if final:
+                save_metadata(data, self.output_file)
+                if os.path.exists(self.partial_file):
+                    os.remove(self.partial_file)
+            else:
+                save_metadata(data, self.partial_file)
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
 def workflow_spider_tyingart(website: str,
                     category: str,
                     max_page: int = 50,
                     keywords: list = [],
                     etype: str = "video",
-                    output_file: str = "metadata.json"
-                    ) -> None:
+                    output_file: str = "metadata.json",
+                    catalog_file: Optional[str] = None,
+                    refresh: Optional[list] = None,
+                    metrics_file: Optional[str] = None,
+                    listing_workers: int = 2,
+                    fetch_workers: int = 4,
+                    parse_workers: int = 2,
+                    flush_every: int = 50
+                    ) -> dict:
     """
     Main workflow for the spider to extract entries and metadata.
+
+    The crawl is a streaming pipeline: discover (listing pages) -> fetch
+    (detail pages) -> parse -> write. Stages are connected by bounded queues,
+    so detail pages are fetched as soon as the first listing page is parsed
+    and results are flushed to `output_file` while the crawl is running.
+
+    When `catalog_file` is given the crawl is incremental: listing pages are
+    still scanned, but detail pages are only fetched for entries missing from
+    the catalog or listed in `refresh`, and the results are merged into it.
     
     Args:
         website (str): The base website URL. (Must include http:// or https://)
@@ -336,56 +707,142 @@ def workflow_spider_tyingart(website: str,
         max_page (int): Maximum number of pages to scrape.
         keywords (list): List of keywords to filter entries. For example, ["/video/"], ["/gallery/], ["product", "retail"].
         etype (str): Type of entry to extract metadata for ('video', 'album', 'model').
+        output_file (str): Path of the JSON file to write. May be the same as `catalog_file`.
+        catalog_file (str, optional): Existing catalog to update incrementally.
+        refresh (list, optional): Codes or entry URLs to re-fetch even if already in the catalog.
+        metrics_file (str, optional): Dump request and parse metrics to this JSON file when done.
+        listing_workers (int): Threads fetching listing pages.
+        fetch_workers (int): Threads fetching detail pages.
+        parse_workers (int): Threads parsing detail pages.
+        flush_every (int): Write the output file after this many new entries.
     
     Returns:
-        None
+        dict: Per-stage pipeline statistics.
     
     """
+    if etype not in PARSERS:
+        raise ValueError(f"Unsupported entry type: {etype}")
     if website[-1] == "/":
         website = website[:-1]
     url = f"{website}/{category}"
-    # Step 1: Extract entries from pages
-    entries = entry_extract_from_page(
-        url=url,
-        keywords=keywords,
-        max_page=max_page
-    )
-    entries = set(entries)  # Remove duplicates
-    entries = list(entries)
-    
-    filter_entries = []
-    for entry in entries:
-        for keyword in keywords:
-            if entry.strip() == keyword:
-                filter_entries.append(entry)
-    filter_entries = set(filter_entries)  # Remove duplicates
-    entries = set(entries) - set(filter_entries)  # Remove filtered entries
-    entries = list(entries)
-
-    data = {}
-    i = 0
-    for entry in entries:
-        entry_url = f"{website}/{entry}"
+
+    catalog = None
+    lookup = {}
+    stale = set()
+    if catalog_file is not None:
+        catalog = load_metadata(catalog_file) if os.path.exists(catalog_file) else {}
+        lookup = catalog_lookup(catalog)
+        for item in refresh or []:
+            stale.add(entry_path(item) if "/" in item else item.strip().upper())
+    writer = CatalogWriter(output_file, catalog, flush_every=flush_every)
+
+    seen = set()
+    seen_lock = threading.Lock()
+    counts = {"listed": 0, "known": 0}
+
+    # Step 1: Extract entries from listing pages
+    def discover(page):
+        page_url = f"{url}?page={page}"
+        html = fetch_with_retry(page_url)
+        if not html:
+            raise ValueError(f"Failed to connect to {page_url}")
+        with spider_metrics.timer("parse", stage="listing"):
+            found = entry_parse_page(html, keywords)
+        for entry in found:
+            if entry.strip() in keywords:
+                continue
+            with seen_lock:
+                if entry in seen:  # Remove duplicates
+                    continue
+                seen.add(entry)
+                counts["listed"] += 1
+            if catalog is not None:
+                path = entry_path(entry)
+                if catalog_find(lookup, entry) is not None and path not in stale and path.split("/")[-1].upper() not in stale:
+                    with seen_lock:
+                        counts["known"] += 1
+                    continue
+            yield f"{website}/{entry.lstrip('/')}"
+
+    # Step 2: Fetch detail pages
+    def fetch(entry_url):
         print(f"Processing entry: {entry_url}")
+        html = fetch_with_retry(entry_url)
+        if not html:
+            raise ValueError(f"Failed to connect to {entry_url}")
+        yield entry_url, html
+
+    # Step 3: Parse metadata based on type
+    def parse(item):
+        entry_url, html = item
+        with spider_metrics.timer("parse", stage=etype):
+            metadata = PARSERS[etype](html, entry_url)
+        if not metadata:
+            print(f"No metadata extracted from {entry_url}")
+            return
+        metadata["url"] = entry_url
+        yield metadata
+
+    # Step 4: Save metadata to file as it arrives
+    def write(metadata):
+        writer.add(metadata)
+
+    pipeline = Pipeline()
+    pipeline.stage("discover", discover, workers=listing_workers)
+    pipeline.stage("fetch", fetch, workers=fetch_workers)
+    pipeline.stage("parse", parse, workers=parse_workers)
+    pipeline.stage("write", write, workers=1)
+    stats = pipeline.run(range(max_page))
+
+    failed_pages = [item for stage_name, item, _ in stats["failures"] if stage_name == "discover"]
+    if failed_pages and catalog is None:
+        # Entries of the failed listing pages are missing: keep the previous output
+        writer.flush()
+        raise RuntimeError(f"{len(failed_pages)} listing page(s) failed {sorted(failed_pages)}; "
+                           f"{output_file} not replaced, partial results in {writer.partial_file}")
+    writer.flush(final=True)
+    if failed_pages:
+        # Incremental results are merged into the catalog, so they are kept; still fail the run
+        raise RuntimeError(f"{len(failed_pages)} listing page(s) failed {sorted(failed_pages)}; "
+                           f"merged what was found into {output_file}")
+    if catalog is not None:
+        print(f"Incremental crawl: {counts['listed']} listed, {counts['known']} known, {stats['write']['processed']} fetched")
+    print(f"Metadata saved to {output_file}") 
 
-        # Step 2: Extract metadata based on type
-        if etype == "video":
-            metadata = video_extract_metadata(entry_url)
-        elif etype == "album":
-            metadata = album_extract_metadata(entry_url)
-        elif etype == "model":
-            metadata = model_extract_metadata(entry_url)
-        elif etype == "retail":
-            metadata = retail_extract_metadata(entry_url)
-        else:
-            raise ValueError(f"Unsupported entry type: {etype}")
-        data[i+1] = metadata
-        i += 1
-        
+    if metrics_file is not None:
+        spider_metrics.dump_json(metrics_file)
+        print(f"Metrics saved to {metrics_file}")
+    return stats
 
-    # Step 3: Save metadata to file
-    save_metadata(metadata_sorted(data), output_file)
-    print(f"Metadata saved to {output_file}") 
+VIDEO_DATA_PATTERN = re.compile(r'video_data\s*=\s*(\[\{.*?\}\]);', re.S)
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+
+@profiled("spider.parse.syclub")
+def syclub_parse_page(html: str) -> tuple:
+    """
+    Extract the page title and video URL from a syclub post.
+
+    The `video_data` JSON is read straight from the raw HTML, so no DOM or
+    JavaScript engine is needed when the player config is server-rendered.
+
+    Args:
+        html (str): Page HTML.
+
+    Returns:
+        tuple: (title, video_url); either may be empty/None when not found.
+    """
+    video_url = None
+    for match in VIDEO_DATA_PATTERN.finditer(html):
+        try:
+            video_data = json.loads(match.group(1))
+            video_url = video_data[0].get("src")
+            break
+        except Exception as e:
+            print("⚠️ JSON parse error:", e)
+
+    title_match = TITLE_PATTERN.search(html)
+    title_text = unescape(title_match.group(1)).strip() if title_match else ""
+    return title_text, video_url
 
 def workflow_spider_syclub(page_url: str,
                             page_start: int = 1,
@@ -395,126 +852,132 @@ def workflow_spider_syclub(page_url: str,
                             value: str = 'eagleheart%7C1755602633%7CLDmHswPkRr60fMlNDZ6a7q4nldLbz5Esx54SVNhoqhQ%7C3cd1281000f77ea9ce3247d39516171cce7c6686285b9bcff9602310f9c22780',
                             connection_failed_file: str = "woods_connection_failures.txt",
                             failed_pages_file: str = "woods_failed_pages.txt",
-                            metadata_file: str = "woods_video_metadata.json"):
-        """_summary_
+                            metadata_file: str = "woods_video_metadata.json",
+                            site: str = "https://www.syclub.club",
+                            workers: int = 4,
+                            drivers: int = 2):
+        """
+        Collect video URLs from syclub posts.
+
+        Post pages are fetched over a pooled HTTP session carrying the login
+        cookie and `video_data` is parsed from the raw HTML. Only pages where
+        that fails are loaded in a headless browser from a small driver pool.
 
         Args:
-            page_url (str): _description_
-            page_start (int, optional): _description_. Defaults to 1.
-            page_end (int, optional): _description_. Defaults to 12.
-            page_list_file (str, optional): _description_. Defaults to "woods_page_list.txt".
-            name (str, optional): _description_. Defaults to 'wordpress_logged_in_2a29f1f47c6d4e333e26cab932bdbf62'.
-            value (str, optional): _description_. Defaults to 'eagleheart%7C1755602633%7CLDmHswPkRr60fMlNDZ6a7q4nldLbz5Esx54SVNhoqhQ%7C3cd1281000f77ea9ce3247d39516171cce7c6686285b9bcff9602310f9c22780'.
-            connection_failed_file (str, optional): _description_. Defaults to "woods_connection_failures.txt".
-            failed_pages_file (str, optional): _description_. Defaults to "woods_failed_pages.txt".
-            metadata_file (str, optional): _description_. Defaults to "woods_video_metadata.json".
+            page_url (str): Listing page URL. May contain "{p}" for the page number.
+            page_start (int, optional): First listing page. Defaults to 1.
+            page_end (int, optional): Listing page to stop at (exclusive). Defaults to 12.
+            page_list_file (str, optional): File the discovered post URLs are written to. Defaults to "woods_page_list.txt".
+            name (str, optional): Login cookie name.
+            value (str, optional): Login cookie value.
+            connection_failed_file (str, optional): File listing pages that failed to load. Defaults to "woods_connection_failures.txt".
+            failed_pages_file (str, optional): File listing pages without a video URL. Defaults to "woods_failed_pages.txt".
+            metadata_file (str, optional): Output JSON mapping titles to video URLs. Defaults to "woods_video_metadata.json".
+            site (str, optional): Site root used for the login cookie. Defaults to "https://www.syclub.club".
+            workers (int, optional): Concurrent post fetches. Defaults to 4.
+            drivers (int, optional): Maximum number of browsers for the fallback path. Defaults to 2.
 
         Raises:
-            ValueError: _description_
+            ValueError: If a listing page cannot be fetched.
         """
+        from concurrent.futures import ThreadPoolExecutor
+        from browser import DriverPool
+
+        session = make_session(cookies={name: value}, pool_size=max(workers, 1))
+
         page_list = []
         for p in range(page_start,page_end):
-            # page_url = f"https://www.syclub.club/category/uncategorized/%e9%98%bf%e6%9c%a8%e4%bd%9c%e5%93%81/page/{p}"
-            html = fetch_with_retry(page_url)
+            list_url = page_url.format(p=p) if "{p}" in page_url else page_url
+            html = fetch_with_retry(list_url, session=session)
             if not html:
-                raise ValueError(f"Failed to connect to {page_url}")
+                raise ValueError(f"Failed to connect to {list_url}")
             soup = BeautifulSoup(html, 'html.parser')
 
             for link in soup.find_all("a"):
                 href = link.get('href')
-                txt = link.text
 
                 if str(href).endswith(".html"):
                     print(f"Found url: {href}")
                     page_list.append(href)
 
-        page_list = list(set(page_list))  # Remove duplicates
+        page_list = sorted(set(page_list))  # Remove duplicates
 
         with open(page_list_file, "w") as f:
             for page in page_list:
                 f.write(f"{page}\n")
 
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
-        with open(page_list_file, "r") as f:
-            page_list = f.readlines()
-        page_list = [page.strip() for page in page_list if page.strip()]
-
         print(f"Total pages to process: {len(page_list)}")
 
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-
-        driver = webdriver.Chrome(options=options)
-
-        from selenium.webdriver.common.by import By
-        from selenium.webdriver.support.ui import WebDriverWait
-        from selenium.webdriver.support import expected_conditions as EC
-
         record = {}
         failed_pages = []
         connection_failures = []
-        # 设置登录用 Cookie（注意：必须先访问一个同域页面）
-        driver.get("https://www.syclub.club")
-        driver.add_cookie({
-            'name': 'wordpress_logged_in_2a29f1f47c6d4e333e26cab932bdbf62',
-            'value': 'eagleheart%7C1755602633%7CLDmHswPkRr60fMlNDZ6a7q4nldLbz5Esx54SVNhoqhQ%7C3cd1281000f77ea9ce3247d39516171cce7c6686285b9bcff9602310f9c22780',
-            'domain': 'www.syclub.club'
-        })
-        for page_url in page_list:
-            try:
-                driver.get(page_url)
-                html = driver.page_source
-                soup = BeautifulSoup(html, "html.parser")
-            except Exception as e:
-                print(f"❌ Failed to load page: {page_url} -> {e}")
-                connection_failures.append(page_url)
-                continue
-
-            video_url = None
-            script_tags = soup.find_all("script")
-            for script in script_tags:
-                if script.string and "video_data" in script.string:
-                    match = re.search(r'video_data\s*=\s*(\[\{.*?\}\]);', script.string)
-                    if match:
-                        try:
-                            video_data = json.loads(match.group(1))
-                            video_url = video_data[0].get("src")
-                            break
-                        except Exception as e:
-                            print("⚠️ JSON parse error:", e)
-
-            title_tag = soup.find("title")
-            title_text = title_tag.text if title_tag else ""
-
-            if video_url:
-                print("🎯 Video URL:", video_url)
-            else:
-                print("⚠️ Video URL not found.")
-                failed_pages.append(page_url)
+        pool = DriverPool(size=drivers, cookie_url=site, cookies=[{"name": name, "value": value}])
 
-            if title_text:
-                print("📝 Page Title:", title_text)
-
-            if video_url and title_text:
-                record[title_text] = video_url
-                time.sleep(random.uniform(3, 8))
-
-        driver.quit()
-        save_metadata(record, "woods_video_metadata.json")
+        def render(url):
+            # Fallback for pages whose player config is injected by JavaScript
+            host = default_limiter.host(url)
+            host.acquire()
+            try:
+                with pool.driver() as driver:
+                    driver.get(url)
+                    html = driver.page_source
+            except Exception:
+                host.release(None)
+                raise
+            host.release(200)
+            return html
+
+        def process(url):
+            html = fetch_with_retry(url, session=session)
+            title_text, video_url = syclub_parse_page(html) if html else ("", None)
+            if not video_url:
+                try:
+                    title_text, video_url = syclub_parse_page(render(url))
+                except Exception as e:
+                    print(f"❌ Failed to load page: {url} -> {e}")
+                    return url, None, None, False
+            return url, title_text, video_url, True
 
-        with open("woods_failed_pages.txt", "w") as f:
+        try:
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                for url, title_text, video_url, loaded in executor.map(process, page_list):
+                    if not loaded:
+                        connection_failures.append(url)
+                        continue
+
+                    if video_url:
+                        print("🎯 Video URL:", video_url)
+                    else:
+                        print(f"⚠️ Video URL not found: {url}")
+                        failed_pages.append(url)
+
+                    if title_text:
+                        print("📝 Page Title:", title_text)
+
+                    if video_url and title_text:
+                        record[title_text] = video_url
+        finally:
+            pool.close()
+            session.close()
+
+        save_metadata(record, metadata_file)
+
+        with open(failed_pages_file, "w") as f:
             for url in failed_pages:
                 f.write(url + "\n")
 
-        with open("woods_connection_failures.txt", "w") as f:
+        with open(connection_failed_file, "w") as f:
             for url in connection_failures:
                 f.write(url + "\n")
 
 if __name__ == "__main__":
+    # METRICS_PORT=9108 python utils/spider.py 抓取时可查看实时指标: curl http://127.0.0.1:9108/metrics
+    if os.environ.get("METRICS_PORT"):
+        serve_metrics(spider_metrics, port=int(os.environ["METRICS_PORT"]))
+        print(f"📈 metrics: http://127.0.0.1:{os.environ['METRICS_PORT']}/metrics")
+
     # Example usage
-    # workflow_spider(
+    # workflow_spider_tyingart(
     #     website="https://tyingart.com/",
     #     category="gallery",
     #     max_page= 35,
@@ -523,103 +986,10 @@ if __name__ == "__main__":
     #     output_file="album_metadata.json"
     # )
 
-
-    page_list = []
-    for p in range(1,13):
-        page_url = f"https://www.syclub.club/category/uncategorized/%e9%98%bf%e6%9c%a8%e4%bd%9c%e5%93%81/page/{p}"
-        html = fetch_with_retry(page_url)
-        if not html:
-            raise ValueError(f"Failed to connect to {page_url}")
-        soup = BeautifulSoup(html, 'html.parser')
-
-        for link in soup.find_all("a"):
-            href = link.get('href')
-            txt = link.text
-
-            if str(href).endswith(".html"):
-                print(f"Found url: {href}")
-                page_list.append(href)
-
-    page_list = list(set(page_list))  # Remove duplicates
-
-    with open("woods_page_list.txt", "w") as f:
-        for page in page_list:
-            f.write(f"{page}\n")
-
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    with open("woods_page_list.txt", "r") as f:
-        page_list = f.readlines()
-    page_list = [page.strip() for page in page_list if page.strip()]
-
-    print(f"Total pages to process: {len(page_list)}")
-
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-
-    driver = webdriver.Chrome(options=options)
-
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-
-record = {}
-failed_pages = []
-connection_failures = []
-# 设置登录用 Cookie（注意：必须先访问一个同域页面）
-driver.get("https://www.syclub.club")
-driver.add_cookie({
-    'name': 'wordpress_logged_in_2a29f1f47c6d4e333e26cab932bdbf62',
-    'value': 'eagleheart%7C1755602633%7CLDmHswPkRr60fMlNDZ6a7q4nldLbz5Esx54SVNhoqhQ%7C3cd1281000f77ea9ce3247d39516171cce7c6686285b9bcff9602310f9c22780',
-    'domain': 'www.syclub.club'
-})
-for page_url in page_list:
-    try:
-        driver.get(page_url)
-        html = driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-    except Exception as e:
-        print(f"❌ Failed to load page: {page_url} -> {e}")
-        connection_failures.append(page_url)
-        continue
-
-    video_url = None
-    script_tags = soup.find_all("script")
-    for script in script_tags:
-        if script.string and "video_data" in script.string:
-            match = re.search(r'video_data\s*=\s*(\[\{.*?\}\]);', script.string)
-            if match:
-                try:
-                    video_data = json.loads(match.group(1))
-                    video_url = video_data[0].get("src")
-                    break
-                except Exception as e:
-                    print("⚠️ JSON parse error:", e)
-
-    title_tag = soup.find("title")
-    title_text = title_tag.text if title_tag else ""
-
-    if video_url:
-        print("🎯 Video URL:", video_url)
-    else:
-        print("⚠️ Video URL not found.")
-        failed_pages.append(page_url)
-
-    if title_text:
-        print("📝 Page Title:", title_text)
-
-    if video_url and title_text:
-        record[title_text] = video_url
-        time.sleep(random.uniform(3, 8))
-
-driver.quit()
-save_metadata(record, "woods_video_metadata.json")
-
-with open("woods_failed_pages.txt", "w") as f:
-    for url in failed_pages:
-        f.write(url + "\n")
-
-with open("woods_connection_failures.txt", "w") as f:
-    for url in connection_failures:
-        f.write(url + "\n")
\ No newline at end of file
+    # PROFILE=spider_profile python utils/spider.py 输出抓取/解析/写入各阶段耗时
+    with profile_session(os.environ.get("PROFILE")):
+        workflow_spider_syclub(
+            page_url="https://www.syclub.club/category/uncategorized/%e9%98%bf%e6%9c%a8%e4%bd%9c%e5%93%81/page/{p}",
+            page_start=1,
+            page_end=13,
+        )
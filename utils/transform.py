@@ -0,0 +1,231 @@
+"""
+This module provides declarative bulk transforms over metadata catalogs
+
+Example (assign fields and BB-### codes, then key the catalog by code):
+
+    Transform() \\
+        .set("series", "耿爽爽") \\
+        .set("description", lambda key, entry: entry["title"]) \\
+        .allocate("code", Sequence("BB-", width=3, start=235)) \\
+        .rekey("code") \\
+        .run("gss_video_metadata.json")
+
+All steps are applied to every entry in one pass over the catalog, which is
+read once and written once (atomically, and only when something changed).
+"""
+
+import copy
+import re
+from typing import Callable, Iterable, Optional, Union
+
+from metadata import load_metadata, metadata_sorted, save_metadata
+from profiling import profiled
+
+# Returned by a setter to leave the field as it is
+KEEP = object()
+
+class Sequence:
+    """
+    Allocator of sequential codes: <prefix><number zero-padded to width>.
+
+    Numbers already used by codes of the same form are skipped.
+
+    Args:
+        prefix (str): Code prefix, e.g. "BB-".
+        width (int): Minimum number of digits.
+        start (int, optional): First number to try; defaults to one past the
+            highest number in use.
+    """
+
+    def __init__(self, prefix: str, width: int = 3, start: Optional[int] = None):
+        self.prefix = prefix
+        self.width = width
+        self.start = start
+        self.pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+
+    def format(self, number: int) -> str:
+        return f"{self.prefix}{number:0{self.width}d}"
+
+    def number(self, code) -> Optional[int]:
+        """Number of a code of this form, or None."""
+        if not isinstance(code, str):
+            return None
+        match = self.pattern.match(code.strip())
+        return int(match.group(1)) if match else None
+
+    def allocator(self, used: set) -> Iterable[str]:
+        """Yield free codes in increasing order, never one in `used`."""
+        numbers = {n for n in (self.number(code) for code in used) if n is not None}
+        n = self.start if self.start is not None else max(numbers, default=0) + 1
+        while True:
+            code = self.format(n)
+            if n not in numbers and code not in used:
+                yield code
+            n += 1
+
+class Transform:
+    """
+    Bulk transform of a catalog.
+
+    Steps are recorded with `set`, `allocate` and `rekey` and applied in that
+    order to each entry. Setters receive (key, entry) with the entry as
+    updated by the previous steps.
+
+    Args:
+        where (Callable, optional): (key, entry) -> bool; only matching entries
+            are transformed, the others are kept as they are.
+        order (Callable, optional): Sort key of (key, entry) deciding the order
+            codes are allocated in; defaults to the catalog key.
+    """
+
+    def __init__(self, where: Optional[Callable] = None, order: Optional[Callable] = None):
+        self.where = where
+        self.order = order
+        self.steps = []
+        self.key_func = None
+
+    def set(self, field: str, value) -> "Transform":
+        """
+        Set a field to `value`, or to `value(key, entry)` if it is callable;
+        a callable may return KEEP to leave the field untouched.
+        """
+        self.steps.append(("set", field, value))
+        return self
+
+    def allocate(self, field: str, sequence: Sequence, overwrite: bool = False,
+                 reserved: Optional[Iterable[str]] = None) -> "Transform":
+        """
+        Give entries a code from `sequence`.
+
+        Codes never collide with codes already in the catalog, including
+        those of entries outside `where`, nor with `reserved` (e.g. codes of
+        other catalogs).
+
+        Args:
+            field (str): Field holding the code.
+            sequence (Sequence): Code allocator.
+            overwrite (bool): Re-allocate entries that already have a code;
+                by default they keep it, so reruns are stable.
+            reserved (Iterable[str], optional): Codes that must not be used.
+        """
+        self.steps.append(("allocate", field, (sequence, overwrite, set(reserved or ()))))
+        return self
+
+    def rekey(self, key: Union[str, Callable]) -> "Transform":
+        """Key the result by a field, or by `key(old_key, entry)` if callable."""
+        self.key_func = key if callable(key) else (lambda _, entry, field=key: entry.get(field))
+        return self
+
+    def _allocators(self, catalog: dict, selected: set) -> dict:
+        allocators = {}
+        for i, (kind, field, args) in enumerate(self.steps):
+            if kind != "allocate":
+                continue
+            sequence, overwrite, reserved = args
+            used = set(reserved)
+            seen = {}
+            for key, entry in catalog.items():
+                code = entry.get(field)
+                if not isinstance(code, str) or not code.strip():
+                    continue
+                if overwrite and key in selected:
+                    continue
+                if code in seen:
+                    print(f"⚠️ {field} 重复: {code}（{seen[code]} / {key}）")
+                seen[code] = key
+                used.add(code)
+            allocators[i] = sequence.allocator(used)
+        return allocators
+
+    @profiled("transform.apply")
+    def apply(self, catalog: dict) -> tuple:
+        """
+        Apply the transform to a catalog in memory.
+
+        Returns:
+            tuple: (new catalog, report) where report is
+                {"entries", "selected", "changed", "allocated": {key: code}, "rekeyed"}
+
+        Raises:
+            ValueError: If rekeying maps two entries to the same key, or an
+                entry to an empty key.
+        """
+        items = list(catalog.items())
+        if self.where is not None:
+            selected = {key for key, entry in items if self.where(key, entry)}
+        else:
+            selected = {key for key, _ in items}
+        if self.order is not None:
+            items.sort(key=lambda item: self.order(*item))
+        else:
+            items.sort(key=lambda item: item[0])
+        allocators = self._allocators(catalog, selected)
+
+        result = {}
+        report = {"entries": len(items), "selected": len(selected), "changed": 0, "allocated": {}, "rekeyed": 0}
+        for key, entry in items:
+            if key not in selected:
+                new_key, new_entry = key, entry
+            else:
+                new_entry = dict(entry)
+                for i, (kind, field, value) in enumerate(self.steps):
+                    if kind == "set":
+                        if callable(value):
+                            value = value(key, new_entry)
+                            if value is KEEP:
+                                continue
+                        else:
+                            # Entries must not share one list or dict
+                            value = copy.deepcopy(value)
+                        new_entry[field] = value
+                    else:
+                        overwrite = value[1]
+                        code = new_entry.get(field)
+                        if overwrite or not isinstance(code, str) or not code.strip():
+                            new_entry[field] = next(allocators[i])
+                            report["allocated"][key] = new_entry[field]
+                if new_entry != entry:
+                    report["changed"] += 1
+                new_key = self.key_func(key, new_entry) if self.key_func else key
+                if not new_key:
+                    raise ValueError(f"Entry {key!r} has no key after rekeying")
+            if new_key in result:
+                raise ValueError(f"Duplicate key {new_key!r} after rekeying")
+            if new_key != key:
+                report["rekeyed"] += 1
+            result[new_key] = new_entry
+        return result, report
+
+    def run(self, file_path: str, output_file: Optional[str] = None, dry_run: bool = False,
+            catalog: Optional[dict] = None) -> dict:
+        """
+        Load a catalog, apply the transform and write it back once.
+
+        Args:
+            file_path (str): Catalog JSON.
+            output_file (str, optional): Where to write; defaults to `file_path`.
+            dry_run (bool): Only report what would change.
+            catalog (dict, optional): Catalog already in memory (e.g. from
+                `act.inspect`); `file_path` is then only written, not read.
+
+        Returns:
+            dict: Report of `apply`, plus "written".
+        """
+        loaded = catalog is None
+        if loaded:
+            catalog = load_metadata(file_path)
+        result, report = self.apply(catalog)
+        result = metadata_sorted(result)
+        report["written"] = False
+        if dry_run:
+            print(f"🔍 {report['changed']} 个条目将被修改，分配 {len(report['allocated'])} 个编号，"
+                  f"重命名 {report['rekeyed']} 个键")
+            return report
+        if loaded and result == catalog and list(result) == list(catalog) and output_file in (None, file_path):
+            print(f"⏸️ catalog 未变化: {file_path}")
+            return report
+        save_metadata(result, output_file or file_path)
+        report["written"] = True
+        print(f"💾 已写入 {output_file or file_path}：修改 {report['changed']} 个条目，"
+              f"分配 {len(report['allocated'])} 个编号，重命名 {report['rekeyed']} 个键")
+        return report